@@ -1,43 +1,255 @@
-import pyautogui
-import screen_brightness_control as sbc
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from metrics import ACTION_SECONDS, ACTION_QUEUE_SECONDS, ERRORS
+
+# What each action does, as (kind, argument):
+#   press       key name, pressed `count` times in one call
+#   scroll      clicks per step, multiplied by `count`
+#   brightness  percent per step, applied to a cached level
+#   hotkey      key combination, repeated `count` times
+ACTIONS = {
+    "pause": ("press", "playpause"),
+    "next_tab": ("hotkey", ("ctrl", "tab")),
+    "prev_tab": ("hotkey", ("ctrl", "shift", "tab")),
+    "volume_up": ("press", "volumeup"),
+    "volume_down": ("press", "volumedown"),
+    "scroll_up": ("scroll", 300),
+    "scroll_down": ("scroll", -300),
+    "brightness_up": ("brightness", 10),
+    "brightness_down": ("brightness", -10),
+    "next_app": ("hotkey", ("alt", "tab")),
+}
+
+# Minimum seconds between two dispatches of the same action. Requests that
+# arrive in between are coalesced into the next dispatch.
+RATE_LIMITS = {
+    "brightness_up": 0.25,
+    "brightness_down": 0.25,
+    "next_tab": 0.15,
+    "prev_tab": 0.15,
+    "next_app": 0.3,
+    "pause": 0.3,
+}
+DEFAULT_RATE_LIMIT = 0.02
+
+
+class PyAutoGuiBackend:
+    """Real input: keys and scrolling through pyautogui, brightness through
+    screen_brightness_control."""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        import screen_brightness_control as sbc
+        self.gui = pyautogui
+        self.sbc = sbc
+
+    def press(self, key, presses=1):
+        self.gui.press(key, presses=presses)
+
+    def hotkey(self, *keys):
+        self.gui.hotkey(*keys)
+
+    def scroll(self, clicks):
+        self.gui.scroll(clicks)
+
+    def get_brightness(self):
+        return self.sbc.get_brightness()[0]
+
+    def set_brightness(self, level):
+        self.sbc.set_brightness(level)
+
+
+class FakeBackend:
+    """Records calls instead of sending input, for headless machines and
+    benchmarks. `delay` simulates a slow driver."""
+
+    name = "fake"
+
+    def __init__(self, delay=0.0, brightness=50):
+        self.delay = delay
+        self.brightness = brightness
+        self.calls = []
+
+    def record(self, *call):
+        if self.delay:
+            time.sleep(self.delay)
+        self.calls.append(call)
+
+    def press(self, key, presses=1):
+        self.record("press", key, presses)
+
+    def hotkey(self, *keys):
+        self.record("hotkey", keys)
+
+    def scroll(self, clicks):
+        self.record("scroll", clicks)
+
+    def get_brightness(self):
+        self.record("get_brightness")
+        return self.brightness
+
+    def set_brightness(self, level):
+        self.record("set_brightness", level)
+        self.brightness = level
+
+
+BACKENDS = {"pyautogui": PyAutoGuiBackend, "fake": FakeBackend}
+
+
+def make_backend(name=None):
+    # GESTURE_ACTION_BACKEND=fake runs the detector without touching the desktop.
+    name = name or os.environ.get("GESTURE_ACTION_BACKEND", "pyautogui")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown action backend: {name}")
+    return BACKENDS[name]()
+
+
+class ActionRunner:
+    """Executes one (possibly coalesced) action on a backend. The brightness
+    level is read once and then tracked locally; a failed set forgets it."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.brightness = None
+
+    def run(self, action, count=1):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        kind, arg = ACTIONS[action]
+        backend = self.backend
+
+        if kind == "press":
+            backend.press(arg, presses=count)
+        elif kind == "scroll":
+            backend.scroll(arg * count)
+        elif kind == "hotkey":
+            for _ in range(count):
+                backend.hotkey(*arg)
+        elif kind == "brightness":
+            if self.brightness is None:
+                self.brightness = backend.get_brightness()
+            level = min(max(self.brightness + arg * count, 0), 100)
+            try:
+                backend.set_brightness(level)
+            except Exception:
+                self.brightness = None
+                raise
+            self.brightness = level
+
+
+class ActionExecutor(threading.Thread):
+    """Runs actions on a worker thread so the detector never waits on the OS.
+
+    submit() only records the request. Pending requests for the same action
+    are merged, so ten volume_up queued while the worker was busy (or
+    rate-limited) become a single press of ten. Every dispatch is timed:
+    queue wait from the first request and execution time, kept in `history`
+    and summarised per action by stats()."""
+
+    def __init__(self, backend=None, rate_limits=None, history=100):
+        super().__init__(name="action-executor", daemon=True)
+        self.backend = backend if backend is not None else make_backend()
+        self.runner = ActionRunner(self.backend)
+        self.rate_limits = dict(RATE_LIMITS, **(rate_limits or {}))
+        self.pending = OrderedDict()
+        self.cond = threading.Condition()
+        self.running = True
+        self.last_run = {}
+        self.history = deque(maxlen=history)
+        self.totals = {}
+
+    def submit(self, action):
+        with self.cond:
+            if action in self.pending:
+                self.pending[action]["count"] += 1
+            else:
+                self.pending[action] = {"count": 1, "queued_at": time.perf_counter()}
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def next_ready(self):
+        # Oldest pending action whose rate limit has passed, or the time to wait.
+        now = time.perf_counter()
+        wait = None
+        for action in self.pending:
+            ready_at = self.last_run.get(action, -1e9) + self.rate_limits.get(action, DEFAULT_RATE_LIMIT)
+            if ready_at <= now:
+                return action, None
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return None, wait
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    action, wait = self.next_ready()
+                    if action is not None:
+                        break
+                    self.cond.wait(wait)
+                if not self.running:
+                    return
+                request = self.pending.pop(action)
+                self.last_run[action] = time.perf_counter()
+            self.dispatch(action, request)
+
+    def dispatch(self, action, request):
+        start = time.perf_counter()
+        error = None
+        try:
+            self.runner.run(action, request["count"])
+        except Exception as e:
+            error = str(e)
+            ERRORS.labels(site="action").inc()
+            logging.warning(f"Action {action} x{request['count']} failed: {e}")
+        end = time.perf_counter()
+        ACTION_SECONDS.labels(action=action).observe(end - start)
+        ACTION_QUEUE_SECONDS.observe(start - request["queued_at"])
+
+        record = {
+            "action": action,
+            "count": request["count"],
+            "queued_ms": round((start - request["queued_at"]) * 1000, 3),
+            "exec_ms": round((end - start) * 1000, 3),
+            "error": error,
+            "time": time.time(),
+        }
+        self.history.append(record)
+        totals = self.totals.setdefault(action, {"dispatches": 0, "requests": 0, "errors": 0,
+                                                 "exec_ms_total": 0.0, "exec_ms_max": 0.0})
+        totals["dispatches"] += 1
+        totals["requests"] += request["count"]
+        totals["errors"] += error is not None
+        totals["exec_ms_total"] += record["exec_ms"]
+        totals["exec_ms_max"] = max(totals["exec_ms_max"], record["exec_ms"])
+        logging.info(f"Action {action} x{record['count']}: queued {record['queued_ms']} ms, "
+                     f"ran {record['exec_ms']} ms" + (f", error: {error}" if error else ""))
+
+    def stats(self):
+        return {action: dict(t, exec_ms_mean=round(t["exec_ms_total"] / t["dispatches"], 3))
+                for action, t in self.totals.items()}
+
+
+_runner = None
+
 
 def perform_action(action):
+    """Runs one action synchronously on the default backend. The detector
+    queues actions on an ActionExecutor instead."""
+    global _runner
     try:
-        if action == "pause":
-            pyautogui.press("playpause") 
-        
-        elif action == "next_tab":
-            pyautogui.hotkey("ctrl", "tab")
-        
-        elif action == "prev_tab":
-            pyautogui.hotkey("ctrl", "shift", "tab")
-        
-        elif action == "volume_up":
-            pyautogui.press("volumeup")
-            
-        elif action == "volume_down":
-            pyautogui.press("volumedown")
-            
-        elif action == "scroll_up":
-            pyautogui.scroll(300)
-            
-        elif action == "scroll_down":
-            pyautogui.scroll(-300)
-
-        elif action == "brightness_up":
-            current = sbc.get_brightness()
-            new_level = min(current[0] + 10, 100)
-            sbc.set_brightness(new_level)
-            
-        elif action == "brightness_down":
-            current = sbc.get_brightness()
-            new_level = max(current[0] - 10, 0)
-            sbc.set_brightness(new_level)
-            
-        elif action == "next_app":
-            pyautogui.hotkey('alt', 'tab')
-            
+        if _runner is None:
+            _runner = ActionRunner(make_backend())
+        _runner.run(action)
         print(f"Executed: {action}")
-        
     except Exception as e:
         print(f"Error executing action {action}: {e}")
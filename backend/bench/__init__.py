@@ -0,0 +1,2 @@
+# Headless benchmarks for the gesture recognition loop.
+# Run from the backend folder: python -m bench --help
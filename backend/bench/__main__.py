@@ -0,0 +1,172 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+
+from bench import stubs
+
+stubs.install()
+
+import joblib
+
+from bench import scenarios
+from bench.timing import compare
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bench",
+                                     description="Benchmark the gesture recognition loop headlessly.")
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--gesture-map", default="gesture_map.json")
+    parser.add_argument("--samples", type=int, default=500, help="landmark rows used for predict timings")
+    parser.add_argument("--frames", type=int, default=50, help="synthetic frames for extract_landmarks")
+    parser.add_argument("--frame-source", default=None,
+                        help="read extract_landmarks frames from a source spec (video:..., images:...) instead")
+    parser.add_argument("--skip", nargs="*", default=[],
+                        choices=["landmarks", "predict", "status", "actions", "sequences", "pipeline"])
+    parser.add_argument("--out", default="bench_result.json")
+    parser.add_argument("--baseline", help="compare against a stored result and exit 1 on regression")
+    parser.add_argument("--save-baseline", help="also write this run to the given baseline path")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed fractional slowdown before a timing counts as a regression")
+    parser.add_argument("--verbose", action="store_true", help="keep detector/action prints on stdout")
+    return parser.parse_args()
+
+
+def run(args):
+    result = {
+        "meta": {
+            "created_at": str(datetime.datetime.now()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "timings": {},
+        "throughput": {},
+        "skipped": {},
+        "checks": {},
+    }
+    timings = result["timings"]
+
+    model = joblib.load(args.model) if os.path.exists(args.model) else None
+    rows = scenarios.load_dataset_rows(args.dataset, args.samples)
+    result["meta"]["samples"] = int(len(rows))
+
+    if "landmarks" not in args.skip:
+        try:
+            if args.frame_source:
+                frames = scenarios.source_frames(args.frame_source, args.frames)
+            else:
+                frames = scenarios.synthetic_frames(args.frames)
+            timings["extract_landmarks"] = scenarios.bench_extract_landmarks(frames)
+            timings["hand_tracker.full"] = scenarios.bench_hand_tracker(frames, adaptive=False)
+            timings["hand_tracker.adaptive"] = scenarios.bench_hand_tracker(frames, adaptive=True)
+        except ImportError as e:
+            result["skipped"]["extract_landmarks"] = str(e)
+
+    if "predict" not in args.skip:
+        if model is None or len(rows) == 0:
+            result["skipped"]["predict"] = "no model or dataset"
+        else:
+            timings["featurize"] = scenarios.bench_featurize(model, rows)
+            timings["predict_proba"] = scenarios.bench_predict(model, rows)
+            timings["predict+predict_proba"] = scenarios.bench_predict_and_proba(model, rows)
+            timings["classify"] = scenarios.bench_classify(model, rows, compiled=False)
+            timings["classify.compiled"] = scenarios.bench_classify(model, rows, compiled=True)
+            result["meta"]["compiled_max_error"] = scenarios.compiled_max_error(model, rows)
+
+    if "status" not in args.skip:
+        try:
+            timings["write_status"] = scenarios.bench_status(200)
+        except ImportError as e:
+            result["skipped"]["write_status"] = str(e)
+
+    if "actions" not in args.skip:
+        gesture_map = {}
+        if os.path.exists(args.gesture_map):
+            with open(args.gesture_map, "r") as f:
+                gesture_map = json.load(f)
+        for name, stats in scenarios.bench_actions(gesture_map, 20).items():
+            timings[f"perform_action.{name}"] = stats
+        burst = ["volume_up"] * 10 + ["brightness_up"] * 5 + ["next_tab"] * 3
+        executor = scenarios.bench_executor(burst)
+        timings["executor.submit"] = executor.pop("submit")
+        result["meta"]["executor"] = executor
+
+    if "sequences" not in args.skip:
+        if len(rows) == 0:
+            result["skipped"]["sequences"] = "no dataset"
+        else:
+            result["checks"]["sequences"] = scenarios.sequence_checks(rows[0])
+
+    if "pipeline" not in args.skip:
+        if model is None:
+            result["skipped"]["pipeline"] = "no model"
+        else:
+            try:
+                e2e = scenarios.bench_pipeline(model, args.dataset)
+            except ImportError as e:
+                e2e = None
+                result["skipped"]["pipeline"] = str(e)
+            if e2e is not None:
+                result["pipeline"] = e2e
+                result["throughput"]["pipeline_fps"] = e2e["fps"]
+                timings["pipeline.frame_latency"] = e2e["frame_latency"]
+                timings["pipeline.gesture_to_action"] = e2e["gesture_to_action"]
+
+    return result
+
+
+def print_table(result):
+    print(f"{'timing':34} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in result["timings"].items():
+        if stats.get("n"):
+            print(f"{name:34} {stats['n']:>6} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['p99_ms']:>10.3f}")
+    for name, value in result["throughput"].items():
+        print(f"{name}: {value}")
+    for name, reason in result["skipped"].items():
+        print(f"skipped {name}: {reason}")
+    for name, failures in result["checks"].items():
+        for case, failure in failures.items():
+            print(f"check {name}.{case} failed: expected {failure['expected']}, fired {failure['fired']}")
+
+
+def main():
+    args = parse_args()
+    if args.verbose:
+        result = run(args)
+    else:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = run(args)
+    print_table(result)
+
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if any(result["checks"].values()):
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import os
+import time
+import contextlib
+import tempfile
+import numpy as np
+
+from bench.timing import summarize, time_calls
+from recordings import list_recordings, load_recording
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    # Status files written during a benchmark must not clobber the real ones.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+
+def load_dataset_rows(dataset, limit):
+    rows = []
+    for rec in list_recordings(dataset):
+        landmarks, _ = load_recording(rec)
+        rows.extend(landmarks)
+        if len(rows) >= limit:
+            break
+    return np.asarray(rows[:limit])
+
+
+def synthetic_frames(count, width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = [np.zeros((height, width, 3), dtype=np.uint8)]
+    while len(frames) < count:
+        frames.append(rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8))
+    return frames
+
+
+def source_frames(spec, count):
+    from frame_source import make_source
+
+    source = make_source(spec, realtime=False)
+    frames = []
+    if source.open():
+        try:
+            while len(frames) < count:
+                packet = source.read_packet()
+                if packet is not None and packet["frame"] is not None:
+                    frames.append(packet["frame"])
+        except StopIteration:
+            pass
+    source.release()
+    return frames
+
+
+def bench_extract_landmarks(frames):
+    from gesture_model import extract_landmarks
+
+    return time_calls(extract_landmarks, [(f,) for f in frames])
+
+
+def model_inputs(model, rows):
+    # Raw landmark rows -> what model.predict_proba expects.
+    from features import featurize, LEGACY_FEATURES
+
+    return featurize(rows, getattr(model, "feature_spec_", LEGACY_FEATURES))
+
+
+def bench_featurize(model, rows):
+    from features import featurize, LEGACY_FEATURES
+
+    spec = getattr(model, "feature_spec_", LEGACY_FEATURES)
+    return time_calls(lambda lm: featurize(lm, spec), [(r,) for r in rows])
+
+
+def bench_hand_tracker(frames, adaptive):
+    # The detector's hand stage: the old path when adaptive=False.
+    import mediapipe as mp
+    from hand_tracker import HandTracker
+
+    with mp.solutions.hands.Hands(max_num_hands=1) as hands:
+        tracker = HandTracker(hands, adaptive=adaptive)
+        timing = time_calls(tracker.process, [(f,) for f in frames])
+    timing["modes"] = dict(tracker.counts)
+    return timing
+
+
+def bench_predict(model, rows):
+    rows = model_inputs(model, rows)
+    return time_calls(lambda lm: model.predict_proba([lm]), [(r,) for r in rows])
+
+
+def bench_classify(model, rows, compiled):
+    from inference import GestureClassifier
+
+    classifier = GestureClassifier(model, compiled=compiled)
+    return time_calls(classifier.classify, [(r,) for r in rows])
+
+
+def compiled_max_error(model, rows):
+    # Largest probability difference between the compiled forest and sklearn.
+    from inference import GestureClassifier
+
+    classifier = GestureClassifier(model)
+    if classifier.forest is None:
+        return None
+    ref = model.predict_proba(model_inputs(model, rows))
+    mine = np.array([classifier.predict_proba(r) for r in rows])
+    return float(np.abs(ref - mine).max())
+
+
+def bench_predict_and_proba(model, rows):
+    # What the detector did per frame before a single-pass API existed.
+    def both(lm):
+        model.predict([lm])
+        model.predict_proba([lm])
+
+    return time_calls(both, [(r,) for r in model_inputs(model, rows)])
+
+
+@contextlib.contextmanager
+def private_status_block():
+    # A throwaway shared-memory block so a running detector is not disturbed.
+    import run_detector
+    from ipc import StatusBlock
+
+    block = StatusBlock(f"gesture_bench_{os.getpid()}", create=True)
+    previous = run_detector.status_block
+    run_detector.status_block = block
+    try:
+        yield block
+    finally:
+        run_detector.status_block = previous
+        block.close()
+
+
+def bench_status(count):
+    import run_detector
+
+    with private_status_block():
+        return time_calls(lambda: run_detector.write_status("palm", 0.9, force=True), [()] * count)
+
+
+def bench_actions(gesture_map, repeats):
+    from actions import perform_action
+    from mapping import action_name
+
+    names = sorted(set(action_name(e) for e in gesture_map.values() if action_name(e)))
+    result = {}
+    for name in names:
+        result[name] = time_calls(perform_action, [(name,)] * repeats, warmup=1)
+    return result
+
+
+def bench_executor(actions, delay=0.005):
+    """Submits a burst of actions to an ActionExecutor over a fake driver that
+    takes `delay` per call, and reports how many OS calls coalescing saved."""
+    from actions import ActionExecutor, FakeBackend
+
+    backend = FakeBackend(delay=delay)
+    executor = ActionExecutor(backend)
+    executor.start()
+    submit = time_calls(executor.submit, [(a,) for a in actions], warmup=0)
+    deadline = time.time() + 5
+    while time.time() < deadline and sum(t["requests"] for t in executor.stats().values()) < len(actions):
+        time.sleep(0.01)
+    executor.stop()
+    return {
+        "submit": submit,
+        "requests": len(actions),
+        "driver_calls": len(backend.calls),
+        "per_action": executor.stats(),
+    }
+
+
+# Wrist x offsets per frame (at SEQ_RATE) after a still hand, and the motion
+# gestures each must produce. A single jump or glitch is never a swipe.
+SEQUENCE_CASES = {
+    "jump": ([0.027] * 20, []),
+    "glitch": ([0.08] + [0.0] * 20, []),
+    "step": ([0.35] * 20, []),
+    "drift": (list(np.linspace(0, 0.3, 46)[1:]), []),
+    "swipe_right": (list(np.linspace(0, 0.4, 9)[1:]) + [0.4] * 20, ["swipe right"]),
+    "swipe_left": (list(np.linspace(0, -0.4, 9)[1:]) + [-0.4] * 20, ["swipe left"]),
+}
+
+
+def sequence_checks(row):
+    """Replays synthetic wrist movements of one landmark row through the
+    built-in motion templates. Returns the cases that fired the wrong gestures."""
+    from sequences import SequenceRecognizer, builtin_templates, SEQ_RATE
+
+    points = np.asarray(row, dtype=np.float32).reshape(21, -1)
+    failures = {}
+    for name, (offsets, expected) in SEQUENCE_CASES.items():
+        recognizer = SequenceRecognizer(builtin_templates())
+        fired = []
+        for i, dx in enumerate([0.0] * 20 + offsets):
+            moved = points.copy()
+            moved[:, 0] += dx
+            fired += [d[0] for d in recognizer.push(moved.reshape(-1), i / SEQ_RATE)]
+        if fired != expected:
+            failures[name] = {"expected": expected, "fired": fired}
+    return failures
+
+
+def bench_pipeline(model, dataset):
+    """Drives the real detector stages with a lossless landmark replay and
+    measures throughput and capture-to-action latency."""
+    import run_detector as rd
+    from actions import ActionExecutor, FakeBackend
+    from frame_source import LandmarkReplaySource
+    from inference import GestureClassifier
+
+    dataset = os.path.abspath(dataset)
+    rd.load_mapping()
+    rd.model = model
+    rd.classifier = GestureClassifier(model)
+    rd.CONTROL_ACTIVE = True
+
+    action_latency = []
+    current = {}
+    original_handle = rd.handle_frame
+    original_perform = rd.perform_action
+
+    def handle(packet):
+        current["t0"] = packet["t0"]
+        return original_handle(packet)
+
+    def perform(action):
+        action_latency.append(time.perf_counter() - current["t0"])
+        original_perform(action)
+
+    rd.handle_frame = handle
+    rd.perform_action = perform
+    rd.executor = ActionExecutor(FakeBackend())
+    rd.executor.start()
+    try:
+        with scratch_dir(), private_status_block():
+            source = LandmarkReplaySource(dataset, realtime=False)
+            if not source.open():
+                return None
+            t0 = time.perf_counter()
+            rd.start_pipeline(source, lossless=True)
+            frame_latency = []
+            while not rd.pipeline.finished():
+                packet = rd.pipeline.get_output(timeout=0.05)
+                if packet is not None:
+                    frame_latency.append(time.perf_counter() - packet["t0"])
+            elapsed = time.perf_counter() - t0
+            stats = rd.pipeline.stats()
+            rd.stop_pipeline()
+    finally:
+        rd.handle_frame = original_handle
+        rd.perform_action = original_perform
+        rd.CONTROL_ACTIVE = False
+        rd.executor.stop()
+        rd.executor = None
+
+    return {
+        "frames": len(frame_latency),
+        "fps": round(len(frame_latency) / elapsed, 2) if elapsed > 0 else 0.0,
+        "frame_latency": summarize(frame_latency),
+        "gesture_to_action": summarize(action_latency),
+        "actions_fired": len(action_latency),
+        "stages": stats,
+    }
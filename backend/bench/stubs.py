@@ -0,0 +1,27 @@
+import sys
+import types
+
+calls = []
+
+
+def install():
+    """Replace pyautogui and screen_brightness_control with recorders so
+    benchmarks never press real keys or touch the display. Must run before
+    `actions` is imported."""
+    pyautogui = types.ModuleType("pyautogui")
+    pyautogui.press = lambda *a, **k: calls.append(("press", a))
+    pyautogui.hotkey = lambda *a, **k: calls.append(("hotkey", a))
+    pyautogui.scroll = lambda *a, **k: calls.append(("scroll", a))
+
+    brightness = [50]
+    sbc = types.ModuleType("screen_brightness_control")
+    sbc.get_brightness = lambda *a, **k: list(brightness)
+
+    def set_brightness(value, *a, **k):
+        brightness[0] = value
+        calls.append(("set_brightness", (value,)))
+
+    sbc.set_brightness = set_brightness
+
+    sys.modules["pyautogui"] = pyautogui
+    sys.modules["screen_brightness_control"] = sbc
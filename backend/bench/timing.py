@@ -0,0 +1,51 @@
+import time
+import numpy as np
+
+
+def summarize(samples_s):
+    # Latency summary in milliseconds.
+    if len(samples_s) == 0:
+        return {"n": 0}
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def time_calls(fn, args_list, warmup=5):
+    # Times fn(*args) for each entry, after a few untimed warm-up calls.
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def compare(result, baseline, tolerance=0.25, metric="p95_ms", min_delta_ms=0.05):
+    """Returns a list of regressions: timings whose `metric` grew by more than
+    `tolerance` (fractional) and by at least `min_delta_ms` over the baseline,
+    and throughputs that fell by more than `tolerance`. The absolute floor keeps
+    microsecond-scale timings from flagging on scheduler noise."""
+    regressions = []
+    for name, stats in result.get("timings", {}).items():
+        base = baseline.get("timings", {}).get(name)
+        if not base or metric not in base or metric not in stats:
+            continue
+        if (stats[metric] > base[metric] * (1 + tolerance)
+                and stats[metric] - base[metric] >= min_delta_ms):
+            regressions.append(f"{name}: {metric} {base[metric]} -> {stats[metric]}")
+
+    for name, value in result.get("throughput", {}).items():
+        base = baseline.get("throughput", {}).get(name)
+        if base and value < base * (1 - tolerance):
+            regressions.append(f"{name}: {base} -> {value}")
+    return regressions
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from actions import ActionRunner, FakeBackend
+from inference import GestureClassifier
+from mapping import DEFAULT_SETTINGS
+from recordings import list_recordings, load_recording, DATASET_DIR
+from sequences import SequenceRecognizer, build_templates
+from smoothing import GestureEngine
+
+# Replays every recording under dataset/ through the detector's decision
+# path (classifier and rejection layer, smoothing, motion matching, action
+# firing) without a camera, and reports how it went. Run from backend/:
+#
+#   python -m evaluate
+#   python -m evaluate --set enter=0.6 --set cooldown=0.5
+#   python -m evaluate --sweep enter=0.5,0.6,0.7,0.8
+#
+# Each recording is replayed as its own stream, as if the hand had just
+# appeared, on its recorded timestamps. Classification runs once, batched,
+# so a sweep only repeats the (cheap) decision loop. Actions go to a
+# FakeBackend. Motion recordings are matched without their own template.
+# Recordings the model was trained on score optimistically; point --dataset
+# at recordings kept out of training for an honest number.
+
+UNKNOWN = "unknown"
+# Settings that are not per gesture but of the smoothing itself.
+ENGINE_OPTIONS = {"method": str, "alpha": float, "window": int}
+
+
+def load_data(root):
+    data = []
+    for rec in list_recordings(root):
+        landmarks, timestamps = load_recording(rec, augmented=False)
+        if len(landmarks) == 0:
+            continue
+        data.append({"gesture": rec["gesture"], "path": rec["path"],
+                     "lm": np.asarray(landmarks, dtype=np.float32), "t": np.asarray(timestamps, dtype=np.float64)})
+    return data
+
+
+def classify(classifier, data, rejection=True):
+    # One predict_proba call per landmark width (older recordings have no z).
+    start = time.perf_counter()
+    widths = sorted(set(item["lm"].shape[1] for item in data))
+    for width in widths:
+        items = [item for item in data if item["lm"].shape[1] == width]
+        probs, rejected = classifier.predict_batch(np.concatenate([item["lm"] for item in items]))
+        if not rejection:
+            rejected[:] = False
+        offsets = np.cumsum([0] + [len(item["lm"]) for item in items])
+        for item, a, b in zip(items, offsets[:-1], offsets[1:]):
+            item["probs"], item["rejected"] = probs[a:b], rejected[a:b]
+    return time.perf_counter() - start
+
+
+def with_settings(gesture_map, settings):
+    result = {}
+    for name, entry in gesture_map.items():
+        entry = dict(entry) if isinstance(entry, dict) else {"action": entry}
+        entry.update(settings)
+        result[name] = entry
+    return result
+
+
+def replay(item, classes, gesture_map, templates, engine_options, runner):
+    """One recording through what run_detector.handle_hand does per frame.
+    Returns the actions fired and the first frame its gesture was recognized."""
+    label = item["gesture"]
+    engine = GestureEngine(gesture_map, **engine_options)
+    sequencer = SequenceRecognizer([t for t in templates if t.source != item["path"]], gesture_map)
+    fired = []
+    first = None
+    for i, (lm, t) in enumerate(zip(item["lm"], item["t"])):
+        detections = sequencer.push(lm, t)
+        if detections:
+            recognized = min(detections, key=lambda d: d[1])[0]
+            fire = sequencer.action_for(recognized)
+            engine.reset()
+        elif classes is None:
+            continue
+        elif item["rejected"][i]:
+            engine.update(classes, None, t)
+            continue
+        else:
+            _, _, fire = engine.update(classes, item["probs"][i], t)
+            recognized = engine.active
+
+        if recognized == label and first is None:
+            first = i
+        if fire:
+            runner.run(fire)
+            fired.append({"frame": i, "gesture": recognized, "action": fire, "correct": recognized == label})
+    return {"fired": fired, "first": first}
+
+
+def confusion(data, classes):
+    # Frame level, for recordings of gestures the classifier knows.
+    columns = list(classes) + [UNKNOWN]
+    matrix = np.zeros((len(classes), len(columns)), dtype=np.int64)
+    for item in data:
+        if item["gesture"] not in classes:
+            continue
+        predicted = np.where(item["rejected"], len(classes), item["probs"].argmax(axis=1))
+        np.add.at(matrix[classes.index(item["gesture"])], predicted, 1)
+    return columns, matrix
+
+
+def evaluate(data, classes, gesture_map, templates, engine_options):
+    runner = ActionRunner(FakeBackend())
+    start = time.perf_counter()
+    results = [replay(item, classes, gesture_map, templates, engine_options, runner) for item in data]
+    seconds = time.perf_counter() - start
+
+    gestures = {}
+    for item, result in zip(data, results):
+        g = gestures.setdefault(item["gesture"], {"recordings": 0, "detected": 0, "latency_frames": [],
+                                                 "latency_ms": [], "actions": 0, "false_actions": 0})
+        g["recordings"] += 1
+        g["actions"] += len(result["fired"])
+        g["false_actions"] += sum(not f["correct"] for f in result["fired"])
+        if result["first"] is not None:
+            g["detected"] += 1
+            g["latency_frames"].append(result["first"])
+            g["latency_ms"].append((item["t"][result["first"]] - item["t"][0]) * 1000)
+
+    for g in gestures.values():
+        frames, ms = g.pop("latency_frames"), g.pop("latency_ms")
+        g["latency_frames"] = float(np.median(frames)) if frames else None
+        g["latency_ms"] = round(float(np.median(ms)), 1) if ms else None
+
+    actions = sum(g["actions"] for g in gestures.values())
+    false_actions = sum(g["false_actions"] for g in gestures.values())
+    minutes = sum(item["t"][-1] - item["t"][0] for item in data) / 60
+    return {
+        "gestures": gestures,
+        "actions": actions,
+        "false_actions": false_actions,
+        "false_action_rate": round(false_actions / actions, 4) if actions else 0.0,
+        "false_actions_per_minute": round(false_actions / minutes, 3) if minutes else None,
+        "detected": round(sum(g["detected"] for g in gestures.values()) / max(len(data), 1), 4),
+        "backend_calls": len(runner.backend.calls),
+        "replay_seconds": round(seconds, 3),
+    }
+
+
+def parse_value(key, value):
+    if key in ENGINE_OPTIONS:
+        return ENGINE_OPTIONS[key](value)
+    if key not in DEFAULT_SETTINGS:
+        raise argparse.ArgumentTypeError(
+            f"unknown setting {key} (use one of {', '.join(list(DEFAULT_SETTINGS) + list(ENGINE_OPTIONS))})")
+    return float(value)
+
+
+def parse_assignment(text):
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected key=value, got {text}")
+    return key, parse_value(key, value)
+
+
+def parse_sweep(text):
+    key, sep, values = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected key=v1,v2,..., got {text}")
+    return key, [parse_value(key, value) for value in values.split(",")]
+
+
+def split_settings(settings):
+    engine = {k: v for k, v in settings.items() if k in ENGINE_OPTIONS}
+    return engine, {k: v for k, v in settings.items() if k not in ENGINE_OPTIONS}
+
+
+def print_report(report):
+    print(f"\n{'gesture':<18} {'recs':>5} {'detected':>9} {'latency':>16} {'actions':>8} {'false':>6}")
+    for name, g in sorted(report["gestures"].items()):
+        latency = "-" if g["latency_ms"] is None else f"{g['latency_frames']:.0f} fr / {g['latency_ms']:.0f} ms"
+        print(f"{name:<18} {g['recordings']:>5} {g['detected']:>9} {latency:>16} {g['actions']:>8} {g['false_actions']:>6}")
+    print(f"\nActions {report['actions']}, false {report['false_actions']} "
+          f"(rate {report['false_action_rate']:.1%}, {report['false_actions_per_minute']} per minute)")
+
+
+def print_confusion(columns, matrix, classes):
+    if not len(matrix):
+        return
+    width = max(len(c) for c in columns) + 1
+    print("\nFrames (rows: recorded gesture, columns: classified as)")
+    print(" " * width + "".join(f"{c[:8]:>9}" for c in columns))
+    for name, row in zip(classes, matrix):
+        print(f"{name:<{width}}" + "".join(f"{n:>9}" for n in row))
+    total = matrix.sum()
+    print(f"Frame accuracy {np.trace(matrix) / total:.1%}, rejected {matrix[:, -1].sum() / total:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m evaluate",
+                                     description="Replay the dataset through the gesture decision path.")
+    parser.add_argument("--dataset", default=DATASET_DIR)
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--gesture-map", default="gesture_map.json")
+    parser.add_argument("--set", type=parse_assignment, action="append", default=[], metavar="KEY=VALUE",
+                        help="override a gesture setting for every gesture (enter, exit, cooldown, ...) "
+                             "or a smoothing option (method, alpha, window)")
+    parser.add_argument("--sweep", type=parse_sweep, metavar="KEY=V1,V2,...",
+                        help="evaluate once per value and print one summary line each")
+    parser.add_argument("--no-rejection", action="store_true", help="ignore the model's rejection layer")
+    parser.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    data = load_data(args.dataset)
+    if not data:
+        print(f"No recordings under {args.dataset}")
+        return 1
+    gesture_map = {}
+    if os.path.exists(args.gesture_map):
+        with open(args.gesture_map, "r") as f:
+            gesture_map = json.load(f)
+
+    classifier = None
+    if os.path.exists(args.model):
+        import joblib
+        classifier = GestureClassifier(joblib.load(args.model))
+    else:
+        print(f"No model at {args.model}; only motion gestures are evaluated")
+    classes = [str(c) for c in classifier.classes] if classifier is not None else None
+
+    inference_seconds = 0.0
+    if classifier is not None:
+        inference_seconds = classify(classifier, data, rejection=not args.no_rejection)
+    templates = build_templates(gesture_map, args.dataset)
+    frames = sum(len(item["lm"]) for item in data)
+    print(f"{len(data)} recordings, {frames} frames, {len(templates)} motion templates")
+
+    base = dict(args.set)
+    runs = [(None, base)] if args.sweep is None else [(value, dict(base, **{args.sweep[0]: value}))
+                                                      for value in args.sweep[1]]
+    reports = []
+    for value, settings in runs:
+        engine_options, overrides = split_settings(settings)
+        report = evaluate(data, classes, with_settings(gesture_map, overrides), templates, engine_options)
+        report["settings"] = settings
+        report["frames_per_second"] = round(frames / (inference_seconds + report["replay_seconds"]), 1)
+        reports.append(report)
+        if args.sweep is not None:
+            print(f"{args.sweep[0]}={value:<8} detected {report['detected']:.1%}  actions {report['actions']:>4}  "
+                  f"false {report['false_actions']:>3} ({report['false_action_rate']:.1%})  "
+                  f"{report['frames_per_second']:.0f} frames/s")
+
+    if args.sweep is None:
+        print_report(reports[0])
+        if classifier is not None:
+            columns, matrix = confusion(data, classes)
+            print_confusion(columns, matrix, classes)
+            reports[0]["confusion"] = {"rows": classes, "columns": columns, "matrix": matrix.tolist()}
+    print(f"\nInference {inference_seconds:.3f} s (batched), decisions {reports[-1]['replay_seconds']:.3f} s "
+          f"per run, {reports[-1]['frames_per_second']:.0f} frames/s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(reports if args.sweep is not None else reports[0], f, indent=2)
+        print(f"Report written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
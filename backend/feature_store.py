@@ -0,0 +1,148 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from recordings import list_recordings, load_recording, DATASET_DIR
+from features import featurize, DEFAULT_FEATURES, N_LANDMARKS
+
+STORE_VERSION = 2
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FeatureStore:
+    """All recorded landmark rows, featurized, in one contiguous float32 file.
+
+    dataset/_store/features.f32 holds the rows back to back and
+    dataset/_store/index.json records the feature spec and, per recording
+    file, its mtime, size, content hash, label and row range. update() only
+    reads recordings that are new; a changed or deleted recording, or a
+    different feature spec, re-featurizes everything. load() memory-maps the
+    matrix, so training does not copy it."""
+
+    def __init__(self, root=DATASET_DIR, spec=DEFAULT_FEATURES):
+        self.root = root
+        self.spec = spec
+        self.dir = os.path.join(root, "_store")
+        self.data_path = os.path.join(self.dir, "features.f32")
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.index = self.read_index()
+
+    def empty_index(self):
+        return {"version": STORE_VERSION, "features": self.spec, "width": None, "rows": 0, "files": {}}
+
+    def read_index(self):
+        if os.path.exists(self.index_path) and os.path.exists(self.data_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    index = json.load(f)
+                expected = index["rows"] * (index["width"] or 0) * 4
+                if index.get("version") == STORE_VERSION and os.path.getsize(self.data_path) == expected:
+                    return index
+            except Exception as e:
+                print(f"Feature store index unreadable, rebuilding: {e}")
+        return self.empty_index()
+
+    def write_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def scan(self):
+        changed = self.index.get("features") != self.spec
+        current = {}
+        for rec in list_recordings(self.root):
+            key = os.path.relpath(rec["path"], self.root).replace(os.sep, "/")
+            stat = os.stat(rec["path"])
+            entry = self.index["files"].get(key)
+            if entry is not None and (entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size):
+                # Touched but maybe not modified: compare contents before rebuilding.
+                if entry["size"] == stat.st_size and entry.get("hash") == file_digest(rec["path"]):
+                    entry["mtime"] = stat.st_mtime
+                else:
+                    changed = True
+            current[key] = (rec, stat)
+        if set(self.index["files"]) - set(current):
+            changed = True
+        return current, changed
+
+    def update(self, progress=None):
+        """Bring the store in line with the dataset folder. Returns a dict
+        with the number of files/rows added and whether it was rebuilt."""
+        os.makedirs(self.dir, exist_ok=True)
+        current, changed = self.scan()
+        if changed:
+            self.index = self.empty_index()
+            if os.path.exists(self.data_path):
+                os.remove(self.data_path)
+
+        new = [key for key in current if key not in self.index["files"]]
+        added_files = added_rows = 0
+        with open(self.data_path, "ab") as out:
+            for i, key in enumerate(new):
+                if progress is not None:
+                    progress(i / max(len(new), 1), key)
+                rec, stat = current[key]
+                try:
+                    raw, _ = load_recording(rec)
+                except Exception as e:
+                    print(f"Error loading {key}: {e}")
+                    continue
+                if raw.ndim != 2 or len(raw) == 0:
+                    continue
+                if raw.shape[1] not in (N_LANDMARKS * 2, N_LANDMARKS * 3):
+                    print(f"Skipping {key}: {raw.shape[1]} values per frame is not a landmark row")
+                    continue
+                rows = featurize(raw, self.spec)
+                if self.index["width"] is None:
+                    self.index["width"] = rows.shape[1]
+                if rows.shape[1] != self.index["width"]:
+                    print(f"Skipping {key}: {rows.shape[1]} features, store has {self.index['width']}")
+                    continue
+
+                out.write(np.ascontiguousarray(rows).tobytes())
+                self.index["files"][key] = {
+                    "label": rec["gesture"],
+                    "offset": self.index["rows"],
+                    "rows": len(rows),
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "hash": file_digest(rec["path"]),
+                }
+                self.index["rows"] += len(rows)
+                added_files += 1
+                added_rows += len(rows)
+
+        self.write_index()
+        return {"rebuilt": changed, "files_added": added_files, "rows_added": added_rows,
+                "rows": self.index["rows"]}
+
+    def load(self, gestures=None):
+        """Returns (X, y, groups): the float32 feature matrix (memory-mapped
+        when no filtering is needed), the label of each row and the index of
+        the recording it came from, for grouped cross-validation."""
+        rows, width = self.index["rows"], self.index["width"]
+        if rows == 0:
+            return np.zeros((0, width or 0), dtype=np.float32), np.array([]), np.array([], dtype=np.int32)
+
+        X = np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(rows, width))
+        y = np.empty(rows, dtype=object)
+        groups = np.empty(rows, dtype=np.int32)
+        for group, entry in enumerate(self.index["files"].values()):
+            y[entry["offset"]:entry["offset"] + entry["rows"]] = entry["label"]
+            groups[entry["offset"]:entry["offset"] + entry["rows"]] = group
+
+        y = y.astype(str)
+        if gestures is not None:
+            mask = np.isin(y, list(gestures))
+            if not mask.all():
+                return np.asarray(X[mask]), y[mask], groups[mask]
+        return X, y, groups
@@ -0,0 +1,102 @@
+from operator import attrgetter
+import numpy as np
+
+# Raw landmarks are what recordings store and what the detector passes
+# around: 21 MediaPipe hand points flattened as x,y,z (older recordings
+# have x,y only). Features are what the model sees; their layout is
+# described by a spec dict stored on the model and in the feature store,
+# so a dataset can be re-featurized whenever the spec changes.
+
+N_LANDMARKS = 21
+WRIST = 0
+MIDDLE_MCP = 9
+FINGERTIPS = [4, 8, 12, 16, 20]
+FINGERS = [[0, 1, 2, 3, 4], [0, 5, 6, 7, 8], [0, 9, 10, 11, 12], [0, 13, 14, 15, 16], [0, 17, 18, 19, 20]]
+# MediaPipe's HAND_CONNECTIONS, so drawing a hand does not need mediapipe.
+HAND_CONNECTIONS = [(0, 1), (0, 5), (0, 17), (5, 9), (9, 13), (13, 17)] + [
+    (finger[i], finger[i + 1]) for finger in FINGERS for i in range(1, 4)]
+
+# Bump whenever featurize() changes the meaning of an existing option.
+FEATURE_VERSION = 1
+
+DEFAULT_FEATURES = {
+    "version": FEATURE_VERSION,
+    # wrist origin, wrist->middle MCP length as unit
+    "normalize": True,
+    # rotate the hand upright and append its original direction
+    "rotate": True,
+    "z": False,
+    "distances": True,
+    "angles": True,
+}
+
+# Models trained before features existed: raw x,y image coordinates.
+LEGACY_FEATURES = {"version": 0}
+
+_xyz = attrgetter("x", "y", "z")
+
+_pairs = np.array([(a, b) for i, a in enumerate([WRIST] + FINGERTIPS) for b in ([WRIST] + FINGERTIPS)[i + 1:]])
+_joints = np.array([finger[j - 1:j + 2] for finger in FINGERS for j in range(1, 4)])
+
+
+def landmarks_to_array(landmarks):
+    """MediaPipe landmark list -> float32 array of shape (21, 3)."""
+    return np.fromiter(map(_xyz, landmarks), dtype=(np.float32, 3), count=N_LANDMARKS)
+
+
+def as_points(rows):
+    # (..., 42 | 63) raw rows -> (..., 21, 3) points; missing z is zero.
+    rows = np.asarray(rows, dtype=np.float32)
+    dims = rows.shape[-1] // N_LANDMARKS
+    if dims not in (2, 3) or rows.shape[-1] % N_LANDMARKS:
+        raise ValueError(f"Expected {N_LANDMARKS * 2} or {N_LANDMARKS * 3} landmark values, got {rows.shape[-1]}")
+    points = rows.reshape(rows.shape[:-1] + (N_LANDMARKS, dims))
+    if dims == 2:
+        points = np.concatenate([points, np.zeros(points.shape[:-1] + (1,), dtype=np.float32)], axis=-1)
+    return points
+
+
+def featurize(rows, spec=DEFAULT_FEATURES):
+    """Raw landmark rows (one row or a batch) -> feature rows. A spec of
+    None means the rows are already features and are returned unchanged."""
+    if spec is None:
+        return np.asarray(rows, dtype=np.float32)
+    points = as_points(rows)
+    if spec.get("version", 0) == 0:
+        return points[..., :2].reshape(points.shape[:-2] + (-1,))
+
+    parts = []
+    if spec.get("normalize", True):
+        points = points - points[..., WRIST:WRIST + 1, :]
+        scale = np.linalg.norm(points[..., MIDDLE_MCP, :2], axis=-1)
+        scale = np.where(scale < 1e-6, 1.0, scale)[..., None, None]
+        points = points / scale
+
+    if spec.get("rotate", False):
+        # Rotate in the image plane so wrist->middle MCP points up (-y). The
+        # original direction is kept as a feature: "finger up" and "finger
+        # down" differ mostly in orientation.
+        ref = points[..., MIDDLE_MCP, :2]
+        norm = np.linalg.norm(ref, axis=-1, keepdims=True)
+        u = ref / np.where(norm < 1e-6, 1.0, norm)
+        ux, uy = u[..., 0:1], u[..., 1:2]
+        x, y = points[..., 0], points[..., 1]
+        points = np.stack([-uy * x + ux * y, -ux * x - uy * y, points[..., 2]], axis=-1)
+        parts.append(u)
+
+    dims = 3 if spec.get("z", False) else 2
+    coords = points[..., 1:, :dims]
+    parts.insert(0, coords.reshape(coords.shape[:-2] + (-1,)))
+
+    if spec.get("distances", False):
+        diff = points[..., _pairs[:, 0], :dims] - points[..., _pairs[:, 1], :dims]
+        parts.append(np.linalg.norm(diff, axis=-1))
+
+    if spec.get("angles", False):
+        # Bend at each finger joint: angle between the incoming and outgoing bone.
+        a = points[..., _joints[:, 1], :dims] - points[..., _joints[:, 0], :dims]
+        b = points[..., _joints[:, 2], :dims] - points[..., _joints[:, 1], :dims]
+        cos = (a * b).sum(axis=-1) / np.maximum(np.linalg.norm(a, axis=-1) * np.linalg.norm(b, axis=-1), 1e-6)
+        parts.append(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+    return np.concatenate(parts, axis=-1).astype(np.float32)
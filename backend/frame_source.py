@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import cv2
+
+from recordings import list_recordings, load_recording
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameSource:
+    """Base class for everything the capture stage can read from.
+
+    `read_packet()` returns a dict with at least a "frame" key (may be None
+    for sources that bypass the camera), None on a transient read failure,
+    and raises StopIteration once a finite source is exhausted."""
+
+    name = "source"
+
+    def open(self):
+        return True
+
+    def is_opened(self):
+        return True
+
+    def read(self):
+        return False, None
+
+    def read_packet(self):
+        ret, frame = self.read()
+        if not ret:
+            return None
+        return {"frame": frame}
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    name = "camera"
+
+    def __init__(self, index=None):
+        self.index = index
+        self.cap = None
+
+    def open(self):
+        if self.index is not None:
+            attempts = [(self.index, None)]
+        else:
+            attempts = [(0, cv2.CAP_DSHOW), (0, None), (1, None)]
+
+        for index, backend in attempts:
+            label = f"Camera {index}" + (" (DSHOW)" if backend is not None else "")
+            logging.info(f"Attempting to open {label}...")
+            cap = cv2.VideoCapture(index, backend) if backend is not None else cv2.VideoCapture(index)
+            if cap.isOpened():
+                logging.info(f"{label} opened successfully.")
+                self.cap = cap
+                return True
+            cap.release()
+
+        logging.error("Failed to open any camera.")
+        return False
+
+    def is_opened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class VideoFileSource(FrameSource):
+    name = "video"
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.cap = None
+        self.frame_interval = 0
+        self.next_frame_at = 0
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            logging.error(f"Could not open video file {self.path}")
+            return False
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_interval = 1.0 / fps
+        return True
+
+    def is_opened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read_packet(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            if not self.loop:
+                raise StopIteration
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+            if not ret:
+                raise StopIteration
+        if self.realtime:
+            self.next_frame_at = pace(self.next_frame_at, self.frame_interval)
+        return {"frame": frame}
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageDirSource(FrameSource):
+    name = "images"
+
+    def __init__(self, folder, fps=30.0, realtime=True, loop=False):
+        self.folder = folder
+        self.frame_interval = 1.0 / fps
+        self.realtime = realtime
+        self.loop = loop
+        self.files = []
+        self.pos = 0
+        self.next_frame_at = 0
+
+    def open(self):
+        if not os.path.isdir(self.folder):
+            logging.error(f"Image folder {self.folder} not found")
+            return False
+        self.files = sorted(
+            os.path.join(self.folder, f) for f in os.listdir(self.folder)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        return len(self.files) > 0
+
+    def read_packet(self):
+        if self.pos >= len(self.files):
+            if not self.loop:
+                raise StopIteration
+            self.pos = 0
+        frame = cv2.imread(self.files[self.pos])
+        self.pos += 1
+        if frame is None:
+            return None
+        if self.realtime:
+            self.next_frame_at = pace(self.next_frame_at, self.frame_interval)
+        return {"frame": frame}
+
+
+class LandmarkReplaySource(FrameSource):
+    """Feeds recorded dataset landmarks straight into the classifier.
+
+    Packets carry "lm" (so the inference stage skips MediaPipe) and the
+    recorded gesture as "label". With realtime=True frames are released at
+    the cadence of the recorded timestamps, otherwise as fast as possible."""
+
+    name = "replay"
+
+    def __init__(self, root="dataset", realtime=True, loop=False, gestures=None):
+        self.root = root
+        self.realtime = realtime
+        self.loop = loop
+        self.gestures = gestures
+        self.recordings = []
+        self.rec_pos = 0
+        self.frame_pos = 0
+        self.current = None
+        self.next_frame_at = 0
+
+    def open(self):
+        self.recordings = list_recordings(self.root, self.gestures)
+        if not self.recordings:
+            logging.error(f"No recordings found under {self.root}")
+            return False
+        return True
+
+    def load_next(self):
+        if self.rec_pos >= len(self.recordings):
+            if not self.loop:
+                raise StopIteration
+            self.rec_pos = 0
+        rec = self.recordings[self.rec_pos]
+        self.rec_pos += 1
+        landmarks, timestamps = load_recording(rec, augmented=False)
+        self.current = (rec, landmarks, timestamps)
+        self.frame_pos = 0
+        self.next_frame_at = 0
+
+    def read_packet(self):
+        if self.current is None or self.frame_pos >= len(self.current[1]):
+            self.load_next()
+        rec, landmarks, timestamps = self.current
+        i = self.frame_pos
+        self.frame_pos += 1
+
+        if self.realtime and i > 0:
+            self.next_frame_at = pace(self.next_frame_at, timestamps[i] - timestamps[i - 1])
+        elif self.realtime:
+            self.next_frame_at = time.perf_counter()
+
+        return {
+            "frame": None,
+            "lm": landmarks[i],
+            "label": rec["gesture"],
+            "recording": rec["path"],
+            "source_time": float(timestamps[i]),
+        }
+
+
+def pace(next_at, interval):
+    # Sleep until the next frame is due; returns the new due time.
+    now = time.perf_counter()
+    if next_at == 0:
+        return now
+    next_at += interval
+    if next_at > now:
+        time.sleep(next_at - now)
+        return next_at
+    return now
+
+
+def make_source(spec="camera", realtime=True, loop=False):
+    """Build a source from a "kind[:arg]" spec, e.g. camera, camera:1,
+    video:clip.mp4, images:frames/, replay:dataset."""
+    kind, _, arg = spec.partition(":")
+    if kind == "camera":
+        source = CameraSource(int(arg) if arg else None)
+    elif kind == "video":
+        source = VideoFileSource(arg, realtime=realtime, loop=loop)
+    elif kind == "images":
+        source = ImageDirSource(arg, realtime=realtime, loop=loop)
+    elif kind == "replay":
+        source = LandmarkReplaySource(arg or "dataset", realtime=realtime, loop=loop)
+    else:
+        raise ValueError(f"Unknown frame source: {spec}")
+    # Used to tag results when several sources run at once.
+    source.spec = spec
+    return source
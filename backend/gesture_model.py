@@ -1,22 +1,28 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 
-mp_hands = mp.solutions.hands
+from features import landmarks_to_array
 
-hands = mp_hands.Hands(
-    max_num_hands=1,
-    min_detection_confidence=0.7
-)
+# Created on first use, so importing this module neither loads mediapipe nor
+# starts a MediaPipe graph. The detector passes its own per-source instances
+# instead.
+hands = None
 
-def extract_landmarks(frame):
+def get_hands():
+    global hands
+    if hands is None:
+        import mediapipe as mp
+        hands = mp.solutions.hands.Hands(
+            max_num_hands=1,
+            min_detection_confidence=0.7
+        )
+    return hands
+
+def extract_landmarks(frame, hands=None):
     rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    result = hands.process(rgb)
+    result = (hands or get_hands()).process(rgb)
 
     if result.multi_hand_landmarks:
-        lm = []
-        for point in result.multi_hand_landmarks[0].landmark:
-            lm.extend([point.x, point.y])
-        return np.array(lm)
+        return landmarks_to_array(result.multi_hand_landmarks[0].landmark).ravel()
 
     return None
@@ -0,0 +1,163 @@
+import os
+import copy
+import json
+import time
+import logging
+import threading
+
+from mapping import set_action, validate_entry
+
+GESTURE_MAP = "gesture_map.json"
+
+
+class GestureMapStore(threading.Thread):
+    """The API's copy of gesture_map.json.
+
+    Reads are served from memory. Changes are validated against the known
+    actions, passed to `on_change` (the API pushes them to the detector) and
+    written back to the file by this thread once no further change has
+    arrived for `delay` seconds. The file is replaced atomically, so other
+    readers (retrain, a starting detector) never see a partial write.
+
+    `on_change` may block (a socket round trip), so it runs on a notifier
+    thread, never under the store's lock. It gets the whole mapping, so
+    only the newest one still waiting is sent."""
+
+    def __init__(self, path=GESTURE_MAP, on_change=None, delay=0.2):
+        super().__init__(name="gesture-map-writer", daemon=True)
+        self.path = path
+        self.on_change = on_change
+        self.delay = delay
+        self.cond = threading.Condition()
+        self.running = True
+        self.dirty_since = None
+        self.mapping = self.load()
+        self.notify_cond = threading.Condition()
+        self.pending = None
+        # Held while on_change runs, so switch() can wait out a send.
+        self.sending = threading.Lock()
+        self.notifier = threading.Thread(target=self.notify_loop, name="gesture-map-notifier", daemon=True)
+
+    def start(self):
+        super().start()
+        self.notifier.start()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                mapping = json.load(f)
+        except Exception as e:
+            logging.error(f"Could not read {self.path}: {e}")
+            return {}
+        # Entries written before validation existed are kept, but flagged.
+        for name, entry in mapping.items():
+            try:
+                validate_entry(name, entry)
+            except ValueError as e:
+                logging.warning(f"{self.path}: {e}")
+        return mapping
+
+    def get(self):
+        with self.cond:
+            return copy.deepcopy(self.mapping)
+
+    def save(self, name, action, kind=None):
+        with self.cond:
+            entry = set_action(self.mapping.get(name), action, kind)
+            validate_entry(name, entry)
+            self.mapping[name] = entry
+            return self.changed()
+
+    def delete(self, name):
+        with self.cond:
+            if name not in self.mapping:
+                return False
+            del self.mapping[name]
+            self.changed()
+            return True
+
+    def changed(self):
+        # Called with the lock held, so `pending` is always the newest mapping.
+        mapping = copy.deepcopy(self.mapping)
+        if self.dirty_since is None:
+            self.dirty_since = time.monotonic()
+        self.cond.notify()
+        if self.on_change is not None:
+            with self.notify_cond:
+                self.pending = copy.deepcopy(mapping)
+                self.notify_cond.notify()
+        return mapping
+
+    def notify_loop(self):
+        while True:
+            with self.notify_cond:
+                while self.running and self.pending is None:
+                    self.notify_cond.wait()
+                if self.pending is None:
+                    return
+                mapping, self.pending = self.pending, None
+                # Taken before the lock is dropped, so switch() sees it.
+                self.sending.acquire()
+            try:
+                self.on_change(mapping)
+            except Exception as e:
+                logging.warning(f"Gesture map change notification failed: {e}")
+            finally:
+                self.sending.release()
+
+    def switch(self, path):
+        """Moves the store to another file (another profile's gesture map).
+        Pending changes go to the old file first; nothing is pushed, the
+        caller sends the returned mapping along with the profile switch."""
+        with self.cond:
+            # The old profile's mapping must not reach the detector after
+            # the caller's switch: drop it, or wait for it to be sent.
+            with self.notify_cond:
+                self.pending = None
+            with self.sending:
+                pass
+            if self.dirty_since is not None:
+                self.write()
+            self.path = path
+            self.dirty_since = None
+            self.mapping = self.load()
+            return copy.deepcopy(self.mapping)
+
+    def run(self):
+        with self.cond:
+            while self.running:
+                if self.dirty_since is None:
+                    self.cond.wait()
+                    continue
+                wait = self.dirty_since + self.delay - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                self.write()
+
+    def flush(self):
+        with self.cond:
+            if self.dirty_since is not None:
+                self.write()
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.mapping, f)
+            os.replace(tmp_path, self.path)
+            self.dirty_since = None
+        except OSError as e:
+            # Retried a second later, or on the next flush.
+            self.dirty_since = time.monotonic() + 1.0
+            logging.error(f"Could not write {self.path}: {e}")
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        with self.notify_cond:
+            self.notify_cond.notify()
+        self.flush()
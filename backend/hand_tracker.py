@@ -0,0 +1,148 @@
+import cv2
+import numpy as np
+
+from features import landmarks_to_array
+
+# Landmarks are always returned in full-frame normalized coordinates, as a
+# flat x,y,z row, whatever region of the frame MediaPipe actually saw.
+#
+# MediaPipe labels handedness assuming a mirrored (selfie) image; the detector
+# shows the camera unmirrored, so the labels are swapped back.
+HANDEDNESS = {"Left": "Right", "Right": "Left"}
+
+FULL, ROI, SKIP, IDLE, ABSENT = "full", "roi", "skip", "idle", "absent"
+
+
+class HandTracker:
+    """Decides how much of each frame goes through MediaPipe hands.
+
+    - full:  the whole frame, downscaled to `max_width`
+    - roi:   a square crop around the box holding every tracked hand (plus
+             `margin`), scaled to at most `roi_size`, while all of them keep
+             being found
+    - skip:  the ROI looked the same as last time (mean absolute difference of
+             a small grayscale thumbnail below `motion_thresh`), so the last
+             landmarks are reused; at most `max_skip` frames in a row
+    - idle:  no hand for `absent_frames` frames, so only every `idle_every`-th
+             frame is checked; the others return no hand without any work
+    While fewer than `max_hands` hands are tracked, every `search_every`-th
+    frame takes the full path so a new hand can enter. With `adaptive=False`
+    every frame takes the full path.
+
+    `hands` is a MediaPipe Hands instance created with max_num_hands >=
+    `max_hands`; it is kept for the tracker's lifetime."""
+
+    def __init__(self, hands, adaptive=True, max_hands=1, max_width=480, roi_size=256, margin=0.35,
+                 motion_thresh=2.0, max_skip=2, absent_frames=15, idle_every=5, search_every=10):
+        self.hands = hands
+        self.adaptive = adaptive
+        self.max_hands = max_hands
+        self.max_width = max_width
+        self.roi_size = roi_size
+        self.margin = margin
+        self.motion_thresh = motion_thresh
+        self.max_skip = max_skip
+        self.absent_frames = absent_frames
+        self.idle_every = idle_every
+        self.search_every = search_every
+        self.counts = {FULL: 0, ROI: 0, SKIP: 0, IDLE: 0, ABSENT: 0}
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.last_hands = []
+        self.thumb = None
+        self.skipped = 0
+        self.missed = 0
+        self.frame_no = 0
+
+    def process(self, frame):
+        """Returns ([(landmarks, handedness), ...], mode); the list is empty
+        when no hand was found."""
+        self.frame_no += 1
+        if not self.adaptive:
+            return self.detect(frame, None), self.count(FULL)
+
+        if self.box is None and self.missed >= self.absent_frames and self.frame_no % self.idle_every:
+            return [], self.count(IDLE)
+
+        searching = len(self.last_hands) < self.max_hands and self.frame_no % self.search_every == 0
+        if self.box is not None and not searching:
+            thumb = self.thumbnail(frame, self.box)
+            still = self.thumb is not None and np.abs(thumb - self.thumb).mean() < self.motion_thresh
+            if still and self.skipped < self.max_skip:
+                self.skipped += 1
+                return self.last_hands, self.count(SKIP)
+            self.skipped = 0
+            found = self.detect(frame, self.box)
+            # A hand that left the ROI is looked for in the full frame.
+            if found and len(found) >= len(self.last_hands):
+                self.track(found, frame)
+                return found, self.count(ROI)
+
+        found = self.detect(frame, None)
+        if not found:
+            self.box = None
+            self.last_hands = []
+            self.thumb = None
+            self.missed += 1
+            return [], self.count(ABSENT)
+        self.track(found, frame)
+        return found, self.count(FULL)
+
+    def count(self, mode):
+        self.counts[mode] += 1
+        return mode
+
+    def track(self, found, frame):
+        self.missed = 0
+        self.last_hands = found
+        self.box = self.hand_box(np.concatenate([lm for lm, _ in found]), frame.shape)
+        self.thumb = self.thumbnail(frame, self.box) if self.box is not None else None
+
+    def detect(self, frame, box):
+        h, w = frame.shape[:2]
+        if box is None:
+            x0, y0, x1, y1 = 0, 0, w, h
+            target = self.max_width
+        else:
+            x0, y0, x1, y1 = box
+            target = self.roi_size
+        crop = frame[y0:y1, x0:x1]
+        cw, ch = x1 - x0, y1 - y0
+        if cw > target:
+            crop = cv2.resize(crop, (target, max(1, round(ch * target / cw))), interpolation=cv2.INTER_LINEAR)
+
+        results = self.hands.process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        if not results.multi_hand_landmarks:
+            return []
+        handedness = results.multi_handedness or []
+        found = []
+        for i, hand in enumerate(results.multi_hand_landmarks[:self.max_hands]):
+            points = landmarks_to_array(hand.landmark)
+            if box is not None:
+                points[:, 0] = (points[:, 0] * cw + x0) / w
+                points[:, 1] = (points[:, 1] * ch + y0) / h
+                points[:, 2] *= cw / w
+            label = handedness[i].classification[0].label if i < len(handedness) else None
+            found.append((points.ravel(), HANDEDNESS.get(label, label)))
+        return found
+
+    def hand_box(self, lm, shape):
+        # Square pixel box around the landmarks, grown by `margin` on each side.
+        h, w = shape[:2]
+        points = lm.reshape(-1, 3)
+        xs, ys = points[:, 0] * w, points[:, 1] * h
+        cx, cy = (xs.min() + xs.max()) / 2, (ys.min() + ys.max()) / 2
+        half = max(xs.max() - xs.min(), ys.max() - ys.min()) * (0.5 + self.margin)
+        half = max(half, 32)
+        x0, y0 = int(max(cx - half, 0)), int(max(cy - half, 0))
+        x1, y1 = int(min(cx + half, w)), int(min(cy + half, h))
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        return x0, y0, x1, y1
+
+    def thumbnail(self, frame, box):
+        x0, y0, x1, y1 = box
+        small = cv2.resize(frame[y0:y1, x0:x1], (32, 32), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
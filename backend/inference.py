@@ -0,0 +1,192 @@
+import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+from features import featurize, LEGACY_FEATURES
+
+
+class CompiledForest:
+    """A fitted RandomForestClassifier flattened into contiguous node arrays.
+
+    All trees are walked together for one sample: each step is a handful of
+    vectorized NumPy ops over one cursor per tree, so a 100-tree forest costs
+    `max_depth` steps instead of sklearn's per-call validation, joblib dispatch
+    and per-tree Python overhead. Leaves point to themselves, so trees that
+    finish early just stay put until the deepest one is done."""
+
+    def __init__(self, model):
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        n_classes = len(model.classes_)
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            idx = np.arange(n) + offset
+            is_leaf = tree.children_left == -1
+
+            lefts.append(np.where(is_leaf, idx, tree.children_left + offset))
+            rights.append(np.where(is_leaf, idx, tree.children_right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            values.append(value / totals)
+
+            roots.append(offset)
+            depth = max(depth, tree.max_depth)
+            offset += n
+
+        self.left = np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp)
+        self.right = np.ascontiguousarray(np.concatenate(rights), dtype=np.intp)
+        self.feature = np.ascontiguousarray(np.concatenate(features), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64)
+        self.value = np.ascontiguousarray(np.concatenate(values))
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+        self.n_trees = len(roots)
+
+    def predict_proba(self, x):
+        # sklearn trees compare float32 inputs against float64 thresholds.
+        x = np.asarray(x, dtype=np.float32).astype(np.float64).ravel()
+        nodes = self.roots
+        for _ in range(self.depth):
+            go_left = x[self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].sum(axis=0) / self.n_trees
+
+
+class GestureClassifier:
+    """Single-sample inference around a trained model: one pass returns both
+    the label and its confidence. Raw landmarks are featurized with the spec
+    the model was trained on. Random forests are compiled to a
+    CompiledForest unless `compiled=False`; other models fall back to one
+    predict_proba call. predict() also applies the model's rejection layer
+    (see rejection.py) when it has one."""
+
+    def __init__(self, model, compiled=True):
+        self.model = model
+        self.classes = model.classes_
+        self.features = getattr(model, "feature_spec_", LEGACY_FEATURES)
+        self.rejection = getattr(model, "rejection_", None)
+        if self.rejection is not None and self.rejection.classes != [str(c) for c in self.classes]:
+            print("Rejection layer does not match the model's classes; not used")
+            self.rejection = None
+        self.forest = None
+        if compiled and hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+            try:
+                self.forest = CompiledForest(model)
+            except Exception as e:
+                print(f"Could not compile forest, using sklearn path: {e}")
+
+    def predict_proba(self, lm):
+        return self.proba(featurize(lm, self.features))
+
+    def proba(self, x):
+        if self.forest is not None:
+            return self.forest.predict_proba(x)
+        return self.model.predict_proba(x.reshape(1, -1))[0]
+
+    def predict(self, lm):
+        """Returns (probs, rejected): calibrated probabilities, and None or
+        the reason the pose was rejected as none of the known gestures.
+        Without a rejection layer these are the raw probabilities and None."""
+        x = featurize(lm, self.features)
+        probs = self.proba(x)
+        if self.rejection is None:
+            return probs, None
+        probs = self.rejection.calibrate(probs)
+        return probs, self.rejection.check(x, probs)
+
+    def predict_batch(self, rows):
+        """predict() for many raw landmark rows at once: (probs, rejected)
+        with one row of probabilities and one boolean per input row."""
+        X = featurize(rows, self.features)
+        probs = self.model.predict_proba(X)
+        if self.rejection is None:
+            return probs, np.zeros(len(X), dtype=bool)
+        probs = self.rejection.calibrate(probs)
+        return probs, self.rejection.rejects(X, probs)
+
+    def warm_up(self):
+        # One throwaway prediction on a made-up hand, so the first real frame
+        # does not pay for lazy initialization in numpy/scikit-learn.
+        lm = np.random.default_rng(0).uniform(0.2, 0.8, 63)
+        with np.errstate(all="ignore"):
+            self.predict_proba(lm)
+
+    def classify(self, lm):
+        probs, _ = self.predict(lm)
+        best = int(np.argmax(probs))
+        return self.classes[best], float(probs[best])
+
+
+def load_classifier(path, retries=5):
+    """Unpickles a model file into a warmed-up GestureClassifier."""
+    import joblib
+    for attempt in range(retries):
+        try:
+            model = joblib.load(path)
+            break
+        except PermissionError:
+            # Windows: retrain is renaming a new version over the file.
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.1)
+    classifier = GestureClassifier(model)
+    classifier.warm_up()
+    return classifier
+
+
+class ModelCache:
+    """The most recently used `capacity` classifiers, loaded and warmed up,
+    by key (a profile name). An entry is reloaded when its file changed on
+    disk; the least recently used one is dropped when a new one would go
+    over capacity, so memory stays bounded by the cache size."""
+
+    def __init__(self, capacity=3):
+        self.capacity = max(1, capacity)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, path):
+        """Returns the classifier for `path` (None if there is no such
+        file) and whether it came from the cache."""
+        if not os.path.exists(path):
+            with self.lock:
+                self.entries.pop(key, None)
+            return None, False
+        mtime = os.path.getmtime(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == path and entry[1] == mtime:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2], True
+        # Loaded outside the lock, so a slow load does not hold up hits.
+        classifier = load_classifier(path)
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = (path, mtime, classifier)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return classifier, False
+
+    def cached(self, key, path):
+        with self.lock:
+            entry = self.entries.get(key)
+        return (entry is not None and entry[0] == path and os.path.exists(path)
+                and entry[1] == os.path.getmtime(path))
+
+    def stats(self):
+        with self.lock:
+            return {"capacity": self.capacity, "keys": list(reversed(self.entries)), "hits": self.hits,
+                    "misses": self.misses}
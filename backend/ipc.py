@@ -0,0 +1,260 @@
+import os
+import json
+import queue
+import struct
+import secrets
+import threading
+import time
+import logging
+from multiprocessing import shared_memory
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+# Local channel between main.py (API) and run_detector.py (detector):
+#   commands  API -> detector as JSON over an authenticated
+#             multiprocessing.connection socket on localhost
+#   status    detector -> API through a shared-memory block guarded by a seqlock
+#             (likewise the metrics snapshot, the preview JPEG and the
+#             heartbeat the API's supervisor checks)
+
+IPC_HOST = "127.0.0.1"
+IPC_PORT = int(os.environ.get("GESTURE_IPC_PORT", "6001"))
+# The socket's shared secret has no default: the API generates one per run
+# (ensure_authkey) and the detector it starts inherits it through the
+# environment. A detector started by hand needs GESTURE_IPC_KEY set to the
+# same value as the API's.
+IPC_KEY_ENV = "GESTURE_IPC_KEY"
+MAX_COMMAND_BYTES = 1024 * 1024
+STATUS_BLOCK_NAME = os.environ.get("GESTURE_STATUS_SHM", "gesture_status")
+STATUS_BLOCK_SIZE = 64 * 1024
+METRICS_BLOCK_NAME = os.environ.get("GESTURE_METRICS_SHM", "gesture_metrics")
+PREVIEW_BLOCK_NAME = os.environ.get("GESTURE_PREVIEW_SHM", "gesture_preview")
+PREVIEW_BLOCK_SIZE = 1024 * 1024
+HEALTH_BLOCK_NAME = os.environ.get("GESTURE_HEALTH_SHM", "gesture_health")
+HEALTH_BLOCK_SIZE = 4096
+
+# seq (u64), payload length (u32)
+HEADER = struct.Struct("<QI")
+
+
+class DetectorUnavailable(Exception):
+    pass
+
+
+def ipc_authkey():
+    key = os.environ.get(IPC_KEY_ENV)
+    return key.encode() if key else None
+
+
+def ensure_authkey():
+    # Set in os.environ so child processes (the supervised detector) get it.
+    if not os.environ.get(IPC_KEY_ENV):
+        os.environ[IPC_KEY_ENV] = secrets.token_hex(32)
+    return ipc_authkey()
+
+
+class CommandListener(threading.Thread):
+    """Detector side: accepts API connections and queues every received
+    command dict. The detector drains `commands` from its main loop.
+    Raises ValueError when there is no key to authenticate clients with."""
+
+    def __init__(self, address=(IPC_HOST, IPC_PORT), authkey=None):
+        super().__init__(name="command-listener", daemon=True)
+        authkey = authkey or ipc_authkey()
+        if not authkey:
+            raise ValueError(f"{IPC_KEY_ENV} is not set")
+        self.listener = Listener(address, authkey=authkey)
+        self.commands = queue.Queue()
+
+    def run(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break
+            except Exception as e:
+                logging.warning(f"Rejected IPC connection: {e}")
+                continue
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    cmd = json.loads(conn.recv_bytes(MAX_COMMAND_BYTES))
+                except (EOFError, OSError):
+                    return
+                except ValueError as e:
+                    logging.warning(f"Dropped IPC connection after a malformed command: {e}")
+                    return
+                if not isinstance(cmd, dict):
+                    logging.warning("Dropped IPC connection after a command that is not an object")
+                    return
+                self.commands.put(cmd)
+                try:
+                    conn.send_bytes(json.dumps({"ok": True}).encode())
+                except OSError:
+                    return
+
+    def get(self, timeout=None):
+        try:
+            if timeout is None:
+                return self.commands.get_nowait()
+            return self.commands.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.listener.close()
+
+
+class CommandClient:
+    """API side: one persistent connection to the detector, reopened on demand."""
+
+    def __init__(self, address=(IPC_HOST, IPC_PORT), authkey=None):
+        self.address = address
+        self.authkey = authkey or ipc_authkey()
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def send(self, cmd):
+        if not self.authkey:
+            raise DetectorUnavailable(f"{IPC_KEY_ENV} is not set; set it to the detector's key")
+        payload = json.dumps(cmd).encode()
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.conn is None:
+                        self.conn = Client(self.address, authkey=self.authkey)
+                    self.conn.send_bytes(payload)
+                    return json.loads(self.conn.recv_bytes(MAX_COMMAND_BYTES))
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if self.conn is not None:
+                        self.conn.close()
+                    self.conn = None
+                    if attempt == 1:
+                        raise DetectorUnavailable(f"Detector is not running ({e})")
+
+
+class StatusBlock:
+    """Fixed-size shared-memory block holding the latest status as JSON
+    (or any other payload, through write_bytes).
+
+    The detector is the single writer. Writes bump the sequence number to an
+    odd value, copy the payload, then bump it back to even; readers retry
+    when the sequence is odd or changed under them, so they never take a
+    lock and never see a half-written status."""
+
+    def __init__(self, name=STATUS_BLOCK_NAME, create=False, size=STATUS_BLOCK_SIZE):
+        self.name = name
+        self.owner = create
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a detector that did not shut down cleanly.
+                self.shm = shared_memory.SharedMemory(name=name)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            untrack(self.shm)
+        self.buf = self.shm.buf
+        self.seq = HEADER.unpack_from(self.buf, 0)[0] if create else 0
+        if self.seq % 2:
+            self.seq += 1
+
+    def write(self, status):
+        return self.write_bytes(json.dumps(status).encode())
+
+    def write_bytes(self, payload):
+        # An empty payload reads back as "nothing written".
+        if HEADER.size + len(payload) > len(self.buf):
+            logging.warning(f"Payload too large for shared memory block {self.name}; dropped")
+            return False
+        self.seq += 1
+        HEADER.pack_into(self.buf, 0, self.seq, 0)
+        self.buf[HEADER.size:HEADER.size + len(payload)] = payload
+        self.seq += 1
+        HEADER.pack_into(self.buf, 0, self.seq, len(payload))
+        return True
+
+    def read_raw(self, retries=50):
+        # Returns (seq, payload bytes) or (seq, None) if nothing was written yet.
+        for _ in range(retries):
+            seq, length = HEADER.unpack_from(self.buf, 0)
+            if seq % 2:
+                continue
+            payload = bytes(self.buf[HEADER.size:HEADER.size + length])
+            if HEADER.unpack_from(self.buf, 0)[0] == seq:
+                return seq, payload if length else None
+        return None, None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def untrack(shm):
+    # Python's resource tracker unlinks segments when *any* attached process
+    # exits; only the detector (the creator) should do that.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class StatusReader:
+    """API side view of the detector status. Attaches lazily and re-attaches
+    if the detector was restarted (the sequence number stops moving).
+    `decode=None` returns the raw payload bytes."""
+
+    def __init__(self, name=STATUS_BLOCK_NAME, stale_after=2.0, decode=json.loads):
+        self.name = name
+        self.stale_after = stale_after
+        self.decode = decode
+        self.block = None
+        self.last_seq = None
+        self.last_change = 0
+        self.cached = None
+        # Only guards the reader's own attach state between API threads;
+        # the detector (writer) never takes it.
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            return self._read()
+
+    def _read(self):
+        now = time.time()
+        if self.block is not None and self.last_seq is not None and now - self.last_change > self.stale_after:
+            self.detach()
+        if self.block is None:
+            try:
+                self.block = StatusBlock(self.name)
+            except FileNotFoundError:
+                return None
+            self.last_change = now
+
+        seq, payload = self.block.read_raw()
+        if seq is None:
+            return self.cached
+        if seq != self.last_seq:
+            self.last_seq = seq
+            self.last_change = now
+            if payload is None:
+                self.cached = None
+            else:
+                self.cached = self.decode(payload) if self.decode is not None else payload
+        return self.cached
+
+    def detach(self):
+        if self.block is not None:
+            self.block.close()
+        self.block = None
+        self.last_seq = None
+        self.cached = None
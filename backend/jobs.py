@@ -0,0 +1,139 @@
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import RETRAIN_JOBS, RETRAIN_SECONDS
+
+
+def run_training_job(progress, cancel, options):
+    # Runs in a worker process; `progress` and `cancel` are Manager proxies.
+    from retrain import retrain_model, TrainingCancelled
+
+    def report(stage, fraction, message=""):
+        progress.update(stage=stage, progress=round(fraction, 3), message=message)
+
+    try:
+        return {"state": "done", "result": retrain_model(report, cancel.is_set, **options)}
+    except TrainingCancelled:
+        return {"state": "cancelled", "result": None}
+
+
+class TrainingJobs:
+    """Retraining jobs run in a process pool so the API stays responsive.
+
+    Each job has an id, a state (queued, running, done, cancelled, failed),
+    progress shared with the worker through a multiprocessing Manager, and a
+    cancel flag the worker checks between stages."""
+
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+        self.pool = None
+        self.manager = None
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        # Spawned, not forked: the API is multi-threaded by the time the
+        # first job starts, and a forked child can inherit a lock (logging's,
+        # say) held by another thread and deadlock on it.
+        if self.pool is None:
+            context = multiprocessing.get_context("spawn")
+            self.manager = context.Manager()
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def submit(self, kind="retrain", **options):
+        with self.lock:
+            for job in self.jobs.values():
+                if job["state"] in ("queued", "running"):
+                    return job, False
+
+            self.start()
+            job = {
+                "id": uuid.uuid4().hex[:12],
+                "kind": kind,
+                "options": options,
+                "state": "queued",
+                "created_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+                "progress": self.manager.dict(stage="queued", progress=0.0, message=""),
+                "cancel": self.manager.Event(),
+            }
+            job["future"] = self.pool.submit(run_training_job, job["progress"], job["cancel"], options)
+            job["future"].add_done_callback(lambda f, job=job: self.finish(job, f))
+            self.jobs[job["id"]] = job
+            return job, True
+
+    def finish(self, job, future):
+        job["finished_at"] = time.time()
+        if future.cancelled():
+            job["state"] = "cancelled"
+        else:
+            try:
+                outcome = future.result()
+                job["state"] = outcome["state"]
+                job["result"] = outcome["result"]
+            except Exception as e:
+                job["state"] = "failed"
+                job["error"] = str(e)
+        self.record_metrics(job)
+
+    def record_metrics(self, job):
+        RETRAIN_JOBS.labels(state=job["state"]).inc()
+        RETRAIN_SECONDS.labels(stage="total").observe(job["finished_at"] - job["created_at"])
+        for stage, seconds in ((job["result"] or {}).get("timings") or {}).items():
+            RETRAIN_SECONDS.labels(stage=stage).observe(seconds)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job["state"] in ("queued", "running"):
+            job["cancel"].set()
+            if job["future"].cancel():
+                job["state"] = "cancelled"
+        return job
+
+    def describe(self, job):
+        state = job["state"]
+        if state == "queued" and job["future"].running():
+            state = job["state"] = "running"
+        try:
+            progress = dict(job["progress"])
+        except Exception:
+            progress = {}
+        if state == "done":
+            progress.update(stage="done", progress=1.0)
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "options": job["options"],
+            "state": state,
+            "cancel_requested": job["cancel"].is_set() if state in ("queued", "running") else False,
+            "stage": progress.get("stage"),
+            "progress": progress.get("progress", 0.0),
+            "message": progress.get("message", ""),
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "result": job["result"],
+            "error": job["error"],
+        }
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        return self.describe(job) if job is not None else None
+
+    def list(self):
+        return [self.describe(job) for job in sorted(self.jobs.values(), key=lambda j: j["created_at"])]
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            if job["state"] in ("queued", "running"):
+                job["cancel"].set()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.manager is not None:
+            self.manager.shutdown()
@@ -1,10 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import json
+import logging
 import os
-from retrain import retrain_model
+import threading
+from jobs import TrainingJobs
+from gesture_store import GestureMapStore
+from profiles import get_profile, list_profiles, create_profile, delete_profile, set_active_profile, active_profile
+from ipc import CommandClient, StatusReader, DetectorUnavailable, METRICS_BLOCK_NAME, PREVIEW_BLOCK_NAME, \
+    HEALTH_BLOCK_NAME, IPC_KEY_ENV, ensure_authkey, ipc_authkey
+from supervisor import DetectorSupervisor, liveness
+from metrics import api_registry, render
+from profiling import MODES as PROFILER_MODES
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 
 app = FastAPI()
 
@@ -17,7 +27,60 @@ app.add_middleware(
 )
 
 frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../frontend"))
-GESTURE_MAP = "gesture_map.json"
+
+MANAGE_DETECTOR = os.environ.get("GESTURE_MANAGE_DETECTOR", "1") != "0"
+# A detector this process starts inherits a fresh key; one started by hand
+# has to be given the same GESTURE_IPC_KEY.
+if not MANAGE_DETECTOR and not ipc_authkey():
+    logging.warning(f"{IPC_KEY_ENV} is not set; detector commands will fail until it is")
+detector = CommandClient(authkey=ensure_authkey() if MANAGE_DETECTOR else None)
+detector_status = StatusReader()
+detector_metrics = StatusReader(METRICS_BLOCK_NAME)
+detector_preview = StatusReader(PREVIEW_BLOCK_NAME, decode=None)
+detector_health = StatusReader(HEALTH_BLOCK_NAME)
+training_jobs = TrainingJobs()
+
+def push_mapping(mapping):
+    # A detector that is not running reads the file when it starts.
+    try:
+        detector.send({"action": "set_mapping", "mapping": mapping})
+    except DetectorUnavailable:
+        pass
+
+gesture_map = GestureMapStore(get_profile().gesture_map, on_change=push_mapping)
+gesture_map.start()
+# Serializes profile switches: store, active.json and detector stay in step.
+profile_lock = threading.Lock()
+
+def restore_detector(previous):
+    # A restarted detector gets the current mapping, and the camera and
+    # control mode the one before it had.
+    detector.send({"action": "set_mapping", "mapping": gesture_map.get()})
+    if previous and previous.get("camera_on"):
+        detector.send({"action": "start_camera"})
+    if previous and previous.get("control_active"):
+        detector.send({"action": "set_mode", "mode": "control"})
+    if previous:
+        logging.info("Restored detector state after restart")
+
+# The API starts and supervises the detector unless GESTURE_MANAGE_DETECTOR=0
+# (then run_detector.py is started separately, as before). Extra detector
+# arguments come from GESTURE_DETECTOR_ARGS, e.g. "--preview stream".
+supervisor = None
+if MANAGE_DETECTOR:
+    supervisor = DetectorSupervisor(detector_health.read, detector.send, on_ready=restore_detector)
+
+OFFLINE_STATUS = {"recording": False, "model_loaded": False}
+# Fields that change on every detector write and would defeat delta pushes.
+VOLATILE_STATUS_KEYS = ("last_update", "pipeline", "tracker", "profiler", "detector")
+MAX_STREAM_RATE = 20
+MAX_PREVIEW_RATE = 10
+
+def send_command(cmd):
+    try:
+        return detector.send(cmd)
+    except DetectorUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 @app.get("/")
 def home():
@@ -25,97 +88,306 @@ def home():
 
 @app.get("/gestures")
 def get_gestures():
-    if os.path.exists(GESTURE_MAP):
-        mapping = json.load(open(GESTURE_MAP))
-        return mapping
-    return {}
+    return gesture_map.get()
 
 @app.post("/save_gesture")
 def save_gesture(data: dict):
-    name = data["name"]
-    action = data["action"]
-
-    if os.path.exists(GESTURE_MAP):
-        mapping = json.load(open(GESTURE_MAP))
-    else:
-        mapping = {}
-
-    mapping[name] = action
-    json.dump(mapping, open(GESTURE_MAP, "w"))
-
+    if "name" not in data or "action" not in data:
+        raise HTTPException(status_code=400, detail="Could not save gesture: missing name or action")
+    try:
+        mapping = gesture_map.save(data["name"], data["action"], data.get("type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"message": "Gesture saved", "map": mapping}
 
 @app.post("/delete_gesture")
 def delete_gesture(data: dict):
-    name = data["name"]
-    if os.path.exists(GESTURE_MAP):
-        mapping = json.load(open(GESTURE_MAP))
-        if name in mapping:
-            del mapping[name]
-            json.dump(mapping, open(GESTURE_MAP, "w"))
-
+    if "name" not in data:
+        raise HTTPException(status_code=400, detail="Could not delete gesture: missing name")
+    gesture_map.delete(data["name"])
     return {"message": "Gesture deleted"}
 
+def string_list(value):
+    # One name or a list of names; list("rf_50") would split it into letters.
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError("expected a list of names")
+    return value
+
+RETRAIN_OPTIONS = {"full": bool, "select": bool, "candidates": string_list, "latency_budget_ms": float, "folds": int,
+                   "calibrate": bool, "profile": str}
+
 @app.post("/retrain")
-def trigger_retrain():
+def trigger_retrain(data: dict = None):
+    # Training runs in a worker process; poll /retrain/jobs/{id} for progress.
+    # {"full": true} refits from scratch instead of warm-starting;
+    # {"select": true} cross-validates the candidate models first;
+    # {"calibrate": false} skips fitting the unknown-pose rejection layer;
+    # {"profile": name} trains that profile instead of the active one.
+    options = {}
+    for key, value in (data or {}).items():
+        if key not in RETRAIN_OPTIONS:
+            raise HTTPException(status_code=400, detail=f"Unknown option: {key}")
+        try:
+            options[key] = RETRAIN_OPTIONS[key](value)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Invalid value for {key}")
+
     try:
-        retrain_model()
-        return {"status": "training complete"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+        options["profile"] = get_profile(options.get("profile")).name
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if options.get("candidates"):
+        from model_selection import CANDIDATES
+        unknown = [name for name in options["candidates"] if name not in CANDIDATES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown candidates: {unknown}")
+
+    # Training reads gesture_map.json; make sure recent edits are on disk.
+    gesture_map.flush()
+    job, created = training_jobs.submit(**options)
+    return {
+        "status": "training started" if created else "training already running",
+        "job": training_jobs.describe(job),
+    }
+
+@app.get("/retrain/candidates")
+def list_candidates():
+    # Imported here so the API does not load scikit-learn at startup.
+    from model_selection import CANDIDATES, DEFAULT_CANDIDATE, LATENCY_BUDGET_MS, CV_FOLDS
+    return {
+        "candidates": CANDIDATES,
+        "default": DEFAULT_CANDIDATE,
+        "latency_budget_ms": LATENCY_BUDGET_MS,
+        "folds": CV_FOLDS,
+    }
+
+@app.get("/retrain/jobs")
+def list_retrain_jobs():
+    return training_jobs.list()
+
+@app.get("/retrain/jobs/{job_id}")
+def get_retrain_job(job_id: str):
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.post("/retrain/jobs/{job_id}/cancel")
+def cancel_retrain_job(job_id: str):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return training_jobs.describe(job)
+
+@app.get("/model")
+def get_model_info():
+    profile = get_profile()
+    if os.path.exists(profile.model_info):
+        with open(profile.model_info, "r") as f:
+            return json.load(f)
+    return {"version": 0}
+
+@app.get("/profiles")
+def get_profiles():
+    status = detector_status.read() or {}
+    return {
+        "active": active_profile(),
+        "profiles": [get_profile(name).describe() for name in list_profiles()],
+        "detector": status.get("profile"),
+    }
+
+@app.post("/profiles")
+def add_profile(data: dict):
+    # {"name": ..., "copy_from": ...} starts from another profile's gesture map.
+    try:
+        profile = create_profile(data.get("name"), data.get("copy_from"))
+    except (ValueError, KeyError, FileExistsError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Profile created", "profile": profile.describe()}
+
+@app.post("/profiles/delete")
+def remove_profile(data: dict):
+    with profile_lock:
+        try:
+            delete_profile(data.get("name"))
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Profile deleted"}
+
+@app.post("/profiles/switch")
+def switch_profile(data: dict):
+    # The detector swaps in the profile's mapping and model; a model it used
+    # recently is still loaded, so /status shows the switch in milliseconds
+    # under profile.last_switch.
+    with profile_lock:
+        try:
+            profile = get_profile(data.get("name"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        mapping = gesture_map.switch(profile.gesture_map)
+        set_active_profile(profile.name)
+        try:
+            detector.send({"action": "set_profile", "name": profile.name, "mapping": mapping})
+        except DetectorUnavailable:
+            return {"status": "profile switched; the detector loads it when it starts", "profile": profile.name}
+    return {"status": "profile switch sent", "profile": profile.name}
+
+@app.on_event("startup")
+def start_background():
+    if supervisor is not None:
+        supervisor.start()
+
+@app.on_event("shutdown")
+def shutdown_background():
+    if supervisor is not None:
+        supervisor.stop()
+    training_jobs.shutdown()
+    gesture_map.stop()
+
+def detector_health_report():
+    if supervisor is not None:
+        return supervisor.describe()
+    return dict(liveness(detector_health.read()), managed=False)
+
+def read_status():
+    return dict(detector_status.read() or OFFLINE_STATUS, detector=detector_health_report())
 
 @app.get("/status")
 def get_status():
+    # "detector" says whether the frame loop is alive: heartbeat and last
+    # frame age in seconds, and how far behind real time frames are handled.
+    return read_status()
+
+@app.get("/detector")
+def get_detector():
+    return detector_health_report()
+
+@app.post("/detector/restart")
+def restart_detector():
+    if supervisor is None or not supervisor.restart():
+        raise HTTPException(status_code=409, detail="The detector is not managed by this server")
+    return {"status": "detector restarting"}
+
+def status_delta(previous, current):
+    changes = {}
+    for key, value in current.items():
+        if key in VOLATILE_STATUS_KEYS:
+            continue
+        if key == "confidence":
+            value = round(value or 0.0, 2)
+        if key not in previous or previous[key] != value:
+            changes[key] = value
+    return changes
+
+@app.websocket("/ws/status")
+async def status_stream(websocket: WebSocket, rate: float = 10):
+    # Pushes a full snapshot once, then only the fields that changed,
+    # checking at most `rate` times per second.
+    await websocket.accept()
+    interval = 1.0 / min(max(rate, 1), MAX_STREAM_RATE)
+    sent = {}
     try:
-        if os.path.exists("status.json"):
-            try:
-                with open("status.json", "r") as f:
-                    return json.load(f)
-            except:
-                return {"recording": False, "model_loaded": False}
-        return {"recording": False, "model_loaded": False}
-    except:
-        return {"recording": False, "model_loaded": False}
+        status = read_status()
+        sent = status_delta({}, status)
+        await websocket.send_json({"type": "snapshot", "status": sent})
+        while True:
+            await asyncio.sleep(interval)
+            status = read_status()
+            changes = status_delta(sent, status)
+            removed = [k for k in sent if k not in status]
+            if changes or removed:
+                sent = {k: v for k, v in {**sent, **changes}.items() if k in status}
+                await websocket.send_json({"type": "delta", "changes": changes, "removed": removed})
+    except WebSocketDisconnect:
+        pass
 
 @app.post("/start_recording")
 def start_recording(data: dict):
-    try:
-        cmd = {
-            "action": "start",
-            "name": data["name"]
-        }
-        with open("recording_cmd.json", "w") as f:
-            json.dump(cmd, f)
-            
-        return {"status": "recording command sent"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Could not start recording: {str(e)}")
+    if "name" not in data:
+        raise HTTPException(status_code=400, detail="Could not start recording: missing name")
+    # Poses are augmented (jittered copies) unless "augment" is false;
+    # "mirror": true also adds mirrored ones (default: the gesture's
+    # "mirror" setting, off unless set).
+    send_command({"action": "start", "name": data["name"], "type": data.get("type", "pose"),
+                  "augment": data.get("augment"), "mirror": data.get("mirror")})
+    return {"status": "recording command sent"}
 
 @app.post("/system/start")
 def start_camera():
-    try:
-        with open("recording_cmd.json", "w") as f:
-            json.dump({"action": "start_camera"}, f)
-        return {"status": "camera start command sent"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    send_command({"action": "start_camera"})
+    return {"status": "camera start command sent"}
 
 @app.post("/system/stop")
 def stop_camera():
-    try:
-        with open("recording_cmd.json", "w") as f:
-            json.dump({"action": "stop_camera"}, f)
-        return {"status": "camera stop command sent"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    send_command({"action": "stop_camera"})
+    return {"status": "camera stop command sent"}
 
 @app.post("/system/mode")
 def set_mode(data: dict):
-    try:
-        with open("recording_cmd.json", "w") as f:
-            json.dump({"action": "set_mode", "mode": data.get("mode", "passive")}, f)
-        return {"status": f"mode set to {data.get('mode')}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    send_command({"action": "set_mode", "mode": data.get("mode", "passive")})
+    return {"status": f"mode set to {data.get('mode')}"}
+
+@app.get("/preview.jpg")
+def get_preview():
+    # Latest annotated frame; none while the camera is off or the detector
+    # runs with --preview none.
+    jpeg = detector_preview.read()
+    if jpeg is None:
+        raise HTTPException(status_code=404, detail="No preview available")
+    return Response(jpeg, media_type="image/jpeg", headers={"Cache-Control": "no-store"})
+
+@app.get("/preview.mjpg")
+async def preview_stream(rate: float = 5):
+    # MJPEG for an <img> tag: each new frame is sent once, at most `rate`
+    # per second.
+    interval = 1.0 / min(max(rate, 0.5), MAX_PREVIEW_RATE)
+
+    async def frames():
+        sent = None
+        while True:
+            jpeg = detector_preview.read()
+            if jpeg is not None and jpeg is not sent:
+                sent = jpeg
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                       + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(frames(), media_type="multipart/x-mixed-replace; boundary=frame",
+                             headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Detector metrics are absent (not zero) while the detector is down.
+    return render(detector_metrics.read(), api_registry.snapshot())
+
+@app.get("/profiler")
+def get_profiler():
+    status = detector_status.read() or {}
+    profiler = status.get("profiler") or {"mode": None, "running_for": None, "last_report": None}
+    report = profiler.get("last_report")
+    if report and os.path.exists(report):
+        with open(report, "r") as f:
+            profiler = dict(profiler, report=f.read())
+    return profiler
+
+@app.post("/profiler")
+def start_profiler(data: dict = None):
+    mode = (data or {}).get("mode", "sample")
+    if mode not in PROFILER_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown profiler mode: {mode}")
+    send_command({"action": "profile", "mode": mode, "enable": True})
+    return {"status": f"profiler ({mode}) start command sent"}
+
+@app.post("/profiler/stop")
+def stop_profiler():
+    send_command({"action": "profile", "enable": False})
+    return {"status": "profiler stop command sent"}
 
 app.mount("/", StaticFiles(directory=frontend_path), name="static")
@@ -0,0 +1,130 @@
+# gesture_map.json maps a gesture name to either an action name
+#   {"palm": "pause"}
+# or to an action with firing settings
+#   {"finger up": {"action": "volume_up", "repeat_rate": 5, "cooldown": 0.2}}
+#
+# Settings:
+#   repeat_rate  actions per second while the gesture is held (0 = fire once per hold)
+#   cooldown     minimum seconds between two firings of the same gesture
+#   enter, exit  smoothed-confidence hysteresis thresholds for the gesture
+#   type         "pose" (default, classified frame by frame) or "motion"
+#                (matched over time against its recordings, see sequences.py)
+#   latency      motion only: longest wait in seconds after a motion ends
+#                before it is reported
+#   max_distance motion only: DTW match threshold (calibrated when unset)
+
+from actions import ACTIONS
+
+DEFAULT_SETTINGS = {
+    "repeat_rate": 0.0,
+    "cooldown": 1.0,
+    "enter": 0.7,
+    "exit": 0.5,
+    "latency": 0.3,
+    "max_distance": None,
+}
+
+# Allowed (low, high) for each setting; None means unbounded.
+SETTING_RANGES = {
+    "repeat_rate": (0.0, None),
+    "cooldown": (0.0, None),
+    "enter": (0.0, 1.0),
+    "exit": (0.0, 1.0),
+    "latency": (0.0, None),
+    "max_distance": (0.0, None),
+}
+KINDS = ("pose", "motion")
+
+# Continuous actions repeat while the gesture is held; everything else fires once.
+ACTION_DEFAULTS = {
+    "volume_up": {"repeat_rate": 5.0, "cooldown": 0.2},
+    "volume_down": {"repeat_rate": 5.0, "cooldown": 0.2},
+    "scroll_up": {"repeat_rate": 8.0, "cooldown": 0.1},
+    "scroll_down": {"repeat_rate": 8.0, "cooldown": 0.1},
+    "brightness_up": {"repeat_rate": 2.0, "cooldown": 0.5},
+    "brightness_down": {"repeat_rate": 2.0, "cooldown": 0.5},
+}
+
+
+def action_name(entry):
+    if isinstance(entry, dict):
+        return entry.get("action")
+    return entry
+
+
+def gesture_settings(entry):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(ACTION_DEFAULTS.get(action_name(entry), {}))
+    if isinstance(entry, dict):
+        for key in DEFAULT_SETTINGS:
+            if entry.get(key) is not None:
+                settings[key] = float(entry[key])
+    return settings
+
+
+def gesture_kind(entry):
+    if isinstance(entry, dict) and entry.get("type") == "motion":
+        return "motion"
+    return "pose"
+
+
+def gesture_mirrored(entry):
+    # Mirrored training copies only for gestures that opt in: for "point
+    # left" the mirror image is "point right".
+    return isinstance(entry, dict) and entry.get("mirror") is True
+
+
+def set_action(entry, action, kind=None):
+    # Remapping a gesture keeps any custom settings it already had.
+    if kind is None:
+        kind = gesture_kind(entry)
+    if isinstance(entry, dict) or kind == "motion":
+        entry = dict(entry) if isinstance(entry, dict) else {}
+        entry["action"] = action
+        if kind == "motion":
+            entry["type"] = "motion"
+        else:
+            entry.pop("type", None)
+        return entry
+    return action
+
+
+def validate_entry(name, entry):
+    """Raises ValueError unless `entry` is a valid gesture_map value for `name`."""
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Gesture name must be a non-empty string")
+    action = action_name(entry)
+    if action not in ACTIONS:
+        raise ValueError(f"Gesture '{name}': unknown action {action!r}")
+    if not isinstance(entry, dict):
+        return
+    for key, value in entry.items():
+        if key == "action":
+            continue
+        if key == "type":
+            if value not in KINDS:
+                raise ValueError(f"Gesture '{name}': type must be one of {', '.join(KINDS)}")
+            continue
+        if key == "mirror":
+            if not isinstance(value, bool):
+                raise ValueError(f"Gesture '{name}': mirror must be true or false")
+            continue
+        if key not in SETTING_RANGES:
+            raise ValueError(f"Gesture '{name}': unknown setting '{key}'")
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Gesture '{name}': {key} must be a number")
+        low, high = SETTING_RANGES[key]
+        if value < low or (high is not None and value > high):
+            raise ValueError(f"Gesture '{name}': {key} must be between {low} and {high if high is not None else 'inf'}")
+    settings = gesture_settings(entry)
+    if settings["exit"] > settings["enter"]:
+        raise ValueError(f"Gesture '{name}': exit threshold is above the enter threshold")
+
+
+def validate_mapping(mapping):
+    if not isinstance(mapping, dict):
+        raise ValueError("Gesture map must be an object")
+    for name, entry in mapping.items():
+        validate_entry(name, entry)
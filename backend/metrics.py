@@ -0,0 +1,190 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+
+# In-process counters, gauges and histograms with a Prometheus text export.
+#
+# The detector and the API are separate processes: the detector publishes
+# snapshot() through a shared-memory block (see run_detector.publish_metrics)
+# and main.py renders it, together with its own registry, at /metrics.
+#
+# Set GESTURE_METRICS=0 to disable: every inc/set/observe then returns after
+# a single flag check.
+
+ENABLED = os.environ.get("GESTURE_METRICS", "1") != "0"
+
+# Seconds; suits everything from a 50 us prediction to a slow brightness call.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), **options):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.options = options
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.reset()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, type(self)(self.name, self.help, **self.options))
+        return child
+
+    def samples(self):
+        # [(label dict, value)] with value as produced by value().
+        if not self.labelnames:
+            return [({}, self.value())]
+        return [(dict(zip(self.labelnames, key)), child.value()) for key, child in list(self.children.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def reset(self):
+        self.count = 0.0
+
+    def inc(self, amount=1):
+        if ENABLED:
+            self.count += amount
+
+    def value(self):
+        return self.count
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def reset(self):
+        self.current = 0.0
+
+    def set(self, value):
+        if ENABLED:
+            self.current = value
+
+    def value(self):
+        return self.current
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames, buckets=buckets)
+
+    def reset(self):
+        self.buckets = tuple(self.options["buckets"])
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        if ENABLED:
+            # Unlocked: a lost increment under contention is acceptable here.
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def value(self):
+        return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, fn):
+        # Called before every snapshot, to refresh gauges that are cheaper to
+        # compute on demand than to update on the hot path.
+        self.collectors.append(fn)
+
+    def snapshot(self):
+        for fn in self.collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        return {
+            "time": time.time(),
+            "metrics": [
+                {"name": m.name, "help": m.help, "type": m.kind, "samples": m.samples()}
+                for m in self.metrics.values()
+            ],
+        }
+
+
+def format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render(*snapshots):
+    """Prometheus text exposition format for one or more snapshots."""
+    lines = []
+    for snap in snapshots:
+        if not snap:
+            continue
+        for metric in snap["metrics"]:
+            name = metric["name"]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in metric["samples"]:
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value["buckets"] + ["+Inf"], value["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, {'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {value['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# One registry per process role, so /metrics does not show detector
+# metrics twice (once live from the detector, once as zeros from the API).
+registry = Registry()
+api_registry = Registry()
+
+# Detector hot path.
+FRAMES = registry.counter("gesture_frames_total", "Frames that went through the action stage")
+STAGE_SECONDS = registry.histogram("gesture_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+FRAME_SECONDS = registry.histogram("gesture_frame_seconds", "Capture to display latency of a frame")
+LANDMARK_SECONDS = registry.histogram("gesture_landmark_seconds", "Hand landmark extraction time", ["mode"])
+PREDICT_SECONDS = registry.histogram("gesture_predict_seconds", "Gesture classifier time per frame")
+ACTION_SECONDS = registry.histogram("gesture_action_seconds", "Time to execute a dispatched action", ["action"])
+ACTION_QUEUE_SECONDS = registry.histogram("gesture_action_queue_seconds", "Time an action waited in the executor queue")
+ACTIONS = registry.counter("gesture_actions_total", "Action requests by action", ["action"])
+DROPPED = registry.gauge("gesture_dropped_frames", "Frames dropped by each pipeline queue since the source opened", ["queue"])
+FPS = registry.gauge("gesture_fps", "Frames per second through the pipeline")
+ERRORS = registry.counter("gesture_errors_total", "Errors by where they happened", ["site"])
+REJECTED = registry.counter("gesture_rejected_total", "Hand poses rejected as none of the known gestures", ["reason"])
+
+# API process.
+RETRAIN_JOBS = api_registry.counter("gesture_retrain_jobs_total", "Finished retraining jobs by outcome", ["state"])
+RETRAIN_SECONDS = api_registry.histogram("gesture_retrain_seconds", "Retraining job duration", ["stage"],
+                                     buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+DETECTOR_RESTARTS = api_registry.counter("gesture_detector_restarts_total",
+                                        "Detector restarts by the API's supervisor, by cause", ["reason"])
@@ -0,0 +1,126 @@
+import os
+import argparse
+import datetime
+import numpy as np
+
+from recordings import (list_recordings, load_recording, load_metadata, read_header, read_frames,
+                        encode_header, frame_dtype, RecordingWriter, DATASET_DIR, EXTENSION,
+                        HEADER_SIZE, PARTIAL)
+
+# Converts legacy recordings (sample_N.npy + meta_N.json) into single .glr
+# files, and finalizes .glr.part files left behind by an interrupted
+# recording (so do not run it while the detector is recording). Run from
+# backend/:
+#
+#   python migrate_recordings.py              convert dataset/ in place
+#   python migrate_recordings.py --dry-run    only list what would change
+#   python migrate_recordings.py --keep       move the legacy files to
+#                                             dataset/_legacy/ instead of
+#                                             deleting them
+
+
+def migrate(rec, backup_dir=None):
+    landmarks, timestamps = load_recording(rec)
+    if landmarks.ndim != 2 or len(landmarks) == 0:
+        raise ValueError(f"unexpected shape {landmarks.shape}")
+    meta = load_metadata(rec)
+    meta.pop("timestamps", None)
+    meta["migrated_from"] = os.path.basename(rec["path"])
+    meta.setdefault("created_at", str(datetime.datetime.fromtimestamp(os.path.getmtime(rec["path"]))))
+    meta.setdefault("duration_seconds", float(timestamps[-1] - timestamps[0]))
+
+    sample_id = rec["sample_id"]
+    name = f"legacy_{int(sample_id):04d}" if sample_id.isdigit() else f"legacy_{sample_id}"
+    writer = RecordingWriter(os.path.dirname(rec["path"]), rec["gesture"], landmarks.shape[1],
+                             meta=meta, name=name)
+    try:
+        writer.extend(landmarks, timestamps)
+    except Exception:
+        writer.abort()
+        raise
+    path = writer.close()
+
+    # Only drop the originals once the new file reads back the same.
+    frames = read_frames(path)
+    if not (np.allclose(frames["lm"], landmarks, atol=1e-6) and np.array_equal(frames["t"], timestamps)):
+        del frames
+        os.remove(path)
+        raise ValueError("converted recording does not match the original")
+    del frames
+    for old in (rec["path"], rec.get("meta_path")):
+        if old is None:
+            continue
+        if backup_dir is None:
+            os.remove(old)
+        else:
+            # Folders starting with "_" are not read as gestures.
+            os.renames(old, os.path.join(backup_dir, rec["gesture"], os.path.basename(old)))
+    return path
+
+
+def recover(part_path):
+    # The frames of a .part file are complete up to the last whole frame;
+    # only the header's frame count is stale.
+    width, meta = read_header(part_path)
+    itemsize = frame_dtype(width).itemsize
+    frames = (os.path.getsize(part_path) - HEADER_SIZE) // itemsize
+    meta.update(frames=frames, recovered=True)
+    with open(part_path, "r+b") as f:
+        f.write(encode_header(width, meta))
+        f.truncate(HEADER_SIZE + frames * itemsize)
+    path = part_path[:-len(PARTIAL)]
+    os.replace(part_path, path)
+    return path
+
+
+def find_partial(root):
+    for folder, _, files in os.walk(root):
+        for file in sorted(files):
+            if file.endswith(EXTENSION + PARTIAL):
+                yield os.path.join(folder, file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert dataset recordings to the .glr format")
+    parser.add_argument("--root", default=DATASET_DIR)
+    parser.add_argument("--keep", action="store_true", help="move the legacy files to <root>/_legacy")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--no-recover", action="store_true",
+                        help="leave interrupted recordings (.glr.part) alone")
+    args = parser.parse_args()
+
+    legacy = [rec for rec in list_recordings(args.root) if not rec["path"].endswith(EXTENSION)]
+    partial = [] if args.no_recover else list(find_partial(args.root))
+    print(f"{len(legacy)} legacy recordings, {len(partial)} interrupted recordings under {args.root}")
+
+    converted = recovered = failed = 0
+    for rec in legacy:
+        if args.dry_run:
+            print(f"  would convert {rec['path']}")
+            continue
+        try:
+            path = migrate(rec, os.path.join(args.root, "_legacy") if args.keep else None)
+            converted += 1
+            print(f"  {rec['path']} -> {path}")
+        except Exception as e:
+            failed += 1
+            print(f"  FAILED {rec['path']}: {e}")
+
+    for part_path in partial:
+        if args.dry_run:
+            print(f"  would recover {part_path}")
+            continue
+        try:
+            print(f"  recovered {recover(part_path)}")
+            recovered += 1
+        except Exception as e:
+            failed += 1
+            print(f"  FAILED {part_path}: {e}")
+
+    if not args.dry_run:
+        print(f"Converted {converted}, recovered {recovered}, failed {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.model_selection import GroupKFold, cross_validate
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from inference import GestureClassifier
+
+DEFAULT_CANDIDATE = "rf_100"
+CV_FOLDS = 5
+# p95 single-frame predict_proba cost allowed for the published model.
+LATENCY_BUDGET_MS = 2.0
+LATENCY_SAMPLES = 200
+CANDIDATES = ["rf_50", "rf_100", "rf_200", "hist_gb", "knn", "mlp"]
+
+
+def make_candidate(name, n_jobs=-1):
+    """Unfitted estimator for a candidate name. `n_jobs` is the fitting
+    parallelism of the forests; the others train fast enough on one core."""
+    if name.startswith("rf_"):
+        return RandomForestClassifier(n_estimators=int(name[3:]), random_state=42, n_jobs=n_jobs)
+    if name == "hist_gb":
+        return HistGradientBoostingClassifier(max_iter=100, random_state=42)
+    if name == "knn":
+        return make_pipeline(StandardScaler(), KNeighborsClassifier(n_neighbors=5, weights="distance"))
+    if name == "mlp":
+        return make_pipeline(StandardScaler(), MLPClassifier(hidden_layer_sizes=(64,), max_iter=500, random_state=42))
+    raise ValueError(f"Unknown candidate model: {name}")
+
+
+def measure_latency(model, X, samples=LATENCY_SAMPLES):
+    # Times the detector's path: one frame at a time through GestureClassifier,
+    # which compiles random forests. X is already featurized and featurizing
+    # costs the same for every candidate, so it is left out.
+    classifier = GestureClassifier(model)
+    classifier.features = None
+    rows = np.asarray(X[np.linspace(0, len(X) - 1, min(samples, len(X))).astype(int)])
+    classifier.predict_proba(rows[0])
+    times = []
+    for row in rows:
+        start = time.perf_counter()
+        classifier.predict_proba(row)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "latency_p50_ms": round(float(np.percentile(times, 50)), 4),
+        "latency_p95_ms": round(float(np.percentile(times, 95)), 4),
+    }
+
+
+def evaluate_candidates(X, y, groups, names=None, folds=CV_FOLDS, n_jobs=-1, progress=None, should_stop=None):
+    """Cross-validates each candidate with folds grouped by recording file, so
+    frames of one recording never sit on both sides of a split. Folds run in
+    parallel; the latency of each candidate is measured on its first fold model."""
+    names = names or CANDIDATES
+    n_groups = len(np.unique(groups))
+    if n_groups < 2:
+        raise ValueError("Cross-validation needs at least two recordings")
+    cv = GroupKFold(n_splits=min(folds, n_groups))
+
+    results = []
+    for i, name in enumerate(names):
+        if should_stop is not None and should_stop():
+            break
+        if progress is not None:
+            progress(i / len(names), name)
+        scores = cross_validate(make_candidate(name, n_jobs=1), X, y, groups=groups, cv=cv,
+                                n_jobs=n_jobs, return_estimator=True)
+        result = {
+            "name": name,
+            "accuracy": round(float(scores["test_score"].mean()), 4),
+            "accuracy_std": round(float(scores["test_score"].std()), 4),
+            "fit_s": round(float(scores["fit_time"].mean()), 3),
+        }
+        result.update(measure_latency(scores["estimator"][0], X))
+        results.append(result)
+    return results
+
+
+def select_candidate(results, latency_budget_ms=LATENCY_BUDGET_MS):
+    """Most accurate candidate within the latency budget, or the fastest one
+    if none fits. Ties go to the faster model."""
+    within = [r for r in results if r["latency_p95_ms"] <= latency_budget_ms]
+    if not within:
+        return min(results, key=lambda r: r["latency_p95_ms"])
+    return max(within, key=lambda r: (r["accuracy"], -r["latency_p95_ms"]))
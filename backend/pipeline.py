@@ -0,0 +1,302 @@
+import threading
+import time
+import logging
+from collections import deque
+
+from metrics import STAGE_SECONDS, FRAME_SECONDS, ERRORS
+
+
+class DropOldestQueue:
+    """Bounded queue that never blocks the producer: when full, the oldest
+    item is discarded and counted as dropped. `block=True` turns it into a
+    lossless queue for offline replay, where every frame must be processed.
+    close() wakes every waiting put() and get() and makes them return."""
+
+    def __init__(self, maxsize=1, block=False):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.block = block
+        self.dropped = 0
+        self.unfinished = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        with self.cond:
+            while self.block and len(self.items) >= self.maxsize and not self.closed:
+                self.cond.wait(0.1)
+            if self.closed:
+                return
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+                self.unfinished -= 1
+            self.items.append(item)
+            self.unfinished += 1
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if not self.items or self.closed:
+                return None
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    def task_done(self):
+        # Called by the consumer once a taken item has been fully handed on.
+        with self.cond:
+            self.unfinished -= 1
+
+    def clear(self):
+        with self.cond:
+            self.unfinished -= len(self.items)
+            self.items.clear()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        ms = seconds * 1000.0
+        with self.lock:
+            self.count += 1
+            self.last_ms = ms
+            # exponential moving average so the dashboard sees recent behaviour
+            self.avg_ms = ms if self.count == 1 else self.avg_ms * 0.9 + ms * 0.1
+            self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self, dropped=0):
+        with self.lock:
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "dropped": dropped,
+                "last_ms": round(self.last_ms, 2),
+                "avg_ms": round(self.avg_ms, 2),
+                "max_ms": round(self.max_ms, 2),
+            }
+
+
+class Stage(threading.Thread):
+    """Worker thread that pulls a packet from `inbox`, runs `fn(packet)` and
+    pushes the result (if not None) to `outbox`."""
+
+    def __init__(self, name, fn, inbox, outbox=None):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stats = StageStats(name)
+        self.seconds = STAGE_SECONDS.labels(stage=name)
+        self.errors = ERRORS.labels(site=name)
+        self.running = threading.Event()
+
+    def run(self):
+        self.running.set()
+        while self.running.is_set():
+            packet = self.inbox.get(timeout=0.1)
+            if packet is None:
+                continue
+            t0 = time.perf_counter()
+            try:
+                out = self.fn(packet)
+            except Exception as e:
+                self.stats.errors += 1
+                self.errors.inc()
+                logging.warning(f"[{self.name}] error: {e}")
+                self.inbox.task_done()
+                continue
+            dt = time.perf_counter() - t0
+            packet.setdefault("latency", {})[self.name] = dt
+            self.stats.record(dt)
+            self.seconds.observe(dt)
+            if out is not None and self.outbox is not None:
+                self.outbox.put(out)
+            self.inbox.task_done()
+
+    def stop(self):
+        self.running.clear()
+
+
+class CaptureStage(threading.Thread):
+    """Reads packets as fast as the source delivers them and keeps only the
+    newest one in `outbox` (maxsize 1), so downstream never sees stale frames.
+
+    `read_fn` returns a packet dict, None on a failed read, and raises
+    StopIteration when a finite source (video file, replay) runs out."""
+
+    def __init__(self, read_fn, outbox, name="capture", source=0):
+        super().__init__(name=name, daemon=True)
+        self.read_fn = read_fn
+        self.source = source
+        self.outbox = outbox
+        self.stats = StageStats(name)
+        self.seconds = STAGE_SECONDS.labels(stage=name)
+        self.errors = ERRORS.labels(site=name)
+        self.running = threading.Event()
+        self.finished = threading.Event()
+        self.seq = 0
+
+    def run(self):
+        self.running.set()
+        while self.running.is_set():
+            t0 = time.perf_counter()
+            try:
+                packet = self.read_fn()
+            except StopIteration:
+                self.finished.set()
+                break
+            except Exception as e:
+                logging.warning(f"[{self.name}] read failed: {e}")
+                packet = None
+            # A failed read and a read that raised count once each.
+            if packet is None:
+                self.stats.errors += 1
+                self.errors.inc()
+                time.sleep(0.1)
+                continue
+            dt = time.perf_counter() - t0
+            self.stats.record(dt)
+            self.seconds.observe(dt)
+            self.seq += 1
+            packet.update({
+                "source": self.source,
+                "seq": self.seq,
+                "captured_at": time.time(),
+                "t0": time.perf_counter(),
+                "latency": {self.name: dt},
+            })
+            self.outbox.put(packet)
+
+    def stop(self):
+        self.running.clear()
+
+
+class Branch:
+    """Capture and inference for one source: each source gets its own
+    threads, so hand detection for several cameras runs in parallel
+    (MediaPipe and OpenCV release the GIL while they work)."""
+
+    def __init__(self, index, read_fn, infer_fn, outbox, lossless=False):
+        self.index = index
+        self.frames = DropOldestQueue(1, block=lossless)
+        self.capture = CaptureStage(read_fn, self.frames, source=index)
+        self.infer = Stage("inference", infer_fn, self.frames, outbox)
+
+    def stats(self, elapsed):
+        return {
+            "fps": round(self.capture.stats.count / elapsed, 1) if elapsed > 0 else 0.0,
+            "capture": self.capture.stats.snapshot(self.frames.dropped),
+            "inference": self.infer.stats.snapshot(),
+        }
+
+
+def merge_snapshots(snapshots):
+    # One StageStats.snapshot() for stages that run once per source.
+    if len(snapshots) == 1:
+        return snapshots[0]
+    count = sum(s["count"] for s in snapshots)
+    return {
+        "count": count,
+        "errors": sum(s["errors"] for s in snapshots),
+        "dropped": sum(s["dropped"] for s in snapshots),
+        "last_ms": max(s["last_ms"] for s in snapshots),
+        "avg_ms": round(sum(s["avg_ms"] * s["count"] for s in snapshots) / count, 2) if count else 0.0,
+        "max_ms": max(s["max_ms"] for s in snapshots),
+    }
+
+
+class Pipeline:
+    """capture -> inference -> action/IO, joined by drop-oldest queues.
+
+    `read_fn` may be a list with one read function per source: every source
+    gets its own capture and inference threads (a Branch) and all of them
+    feed the single action stage, which sees one merged stream of packets
+    tagged with "source" (the index in that list).
+
+    The last queue (`display`) is drained by the caller on the main thread,
+    because GUI calls like cv2.imshow must stay there. `lossless=True` makes
+    capture and inference wait for the next stage instead of dropping, which
+    is what offline replay and benchmarks want."""
+
+    def __init__(self, read_fn, infer_fn, act_fn, queue_size=1, lossless=False):
+        read_fns = read_fn if isinstance(read_fn, (list, tuple)) else [read_fn]
+        self.inferred = DropOldestQueue(queue_size * len(read_fns), block=lossless)
+        self.display = DropOldestQueue(len(read_fns), block=lossless)
+
+        self.branches = [Branch(i, fn, infer_fn, self.inferred, lossless) for i, fn in enumerate(read_fns)]
+        self.act = Stage("action", act_fn, self.inferred, self.display)
+        self.started_at = None
+        self.end_to_end = StageStats("end_to_end")
+
+    def stages(self):
+        for branch in self.branches:
+            yield branch.capture
+            yield branch.infer
+        yield self.act
+
+    def start(self):
+        self.started_at = time.time()
+        for stage in reversed(list(self.stages())):
+            stage.start()
+
+    def queues(self):
+        for branch in self.branches:
+            yield branch.frames
+        yield self.inferred
+        yield self.display
+
+    def stop(self):
+        for stage in self.stages():
+            stage.stop()
+        # A lossless queue would keep its producer waiting for a consumer
+        # that has just stopped.
+        for queue in self.queues():
+            queue.close()
+        for stage in self.stages():
+            stage.join(timeout=1.0)
+
+    def finished(self):
+        # True once every source is exhausted and every stage has drained.
+        return (all(b.capture.finished.is_set() and b.frames.unfinished == 0 for b in self.branches)
+                and self.inferred.unfinished == 0 and not len(self.display))
+
+    def get_output(self, timeout=None):
+        packet = self.display.get(timeout=timeout)
+        if packet is not None:
+            dt = time.perf_counter() - packet["t0"]
+            self.end_to_end.record(dt)
+            FRAME_SECONDS.observe(dt)
+        return packet
+
+    def stats(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        sources = [b.stats(elapsed) for b in self.branches]
+        inference = merge_snapshots([s["inference"] for s in sources])
+        inference["dropped"] = self.inferred.dropped
+        return {
+            "fps": round(sum(s["fps"] for s in sources), 1),
+            "capture": merge_snapshots([s["capture"] for s in sources]),
+            "inference": inference,
+            "action": self.act.stats.snapshot(self.display.dropped),
+            "end_to_end": self.end_to_end.snapshot(),
+            "sources": sources,
+        }
@@ -0,0 +1,159 @@
+import time
+import logging
+import threading
+import cv2
+
+from features import as_points, HAND_CONNECTIONS
+
+# The action stage does not draw: it lists what to draw in packet["overlay"]
+# and hands the packet on. The Preview thread keeps only the newest packet
+# per source and renders at most PREVIEW_FPS of them, so frames nobody will
+# look at are never drawn on. Rendered frames go to the local window (shown
+# from the main thread, where OpenCV's GUI calls must stay) and, at
+# STREAM_FPS, as JPEG into a shared-memory block that main.py serves as
+# /preview.jpg and /preview.mjpg.
+#
+# Modes: "window" (local window and stream), "stream" (stream only, no
+# display needed) and "none" (headless: nothing is drawn or encoded).
+MODES = ("window", "stream", "none")
+PREVIEW_FPS = 15
+STREAM_FPS = 5
+STREAM_WIDTH = 640
+JPEG_QUALITY = 70
+
+
+def render(frame, overlay):
+    h, w = frame.shape[:2]
+    for op, *args in overlay:
+        if op == "hands":
+            for lm in args[0]:
+                points = (as_points(lm)[:, :2] * (w, h)).astype(int)
+                for a, b in HAND_CONNECTIONS:
+                    cv2.line(frame, tuple(points[a]), tuple(points[b]), (255, 255, 255), 2)
+                for x, y in points:
+                    cv2.circle(frame, (int(x), int(y)), 3, (0, 0, 255), -1)
+        elif op == "text":
+            text, org, scale, color, thickness = args
+            cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+        elif op == "circle":
+            center, radius, color = args
+            cv2.circle(frame, center, radius, color, -1)
+        elif op == "progress":
+            progress, = args
+            bar_width = 400
+            cv2.rectangle(frame, (50, 400), (50 + bar_width, 420), (50, 50, 50), -1)
+            cv2.rectangle(frame, (50, 400), (50 + int(bar_width * progress), 420), (0, 255, 0), -1)
+    return frame
+
+
+def encode_jpeg(frame, width=STREAM_WIDTH, quality=JPEG_QUALITY):
+    h, w = frame.shape[:2]
+    if w > width:
+        frame = cv2.resize(frame, (width, int(h * width / w)), interpolation=cv2.INTER_AREA)
+    ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return data.tobytes() if ok else None
+
+
+class Preview(threading.Thread):
+    """Renders the newest packet of every source at a capped rate.
+
+    submit() is called by the main loop for every output packet and only
+    swaps a reference. The JPEG stream shows `stream_source` (the first
+    source by default)."""
+
+    def __init__(self, mode="window", block=None, fps=PREVIEW_FPS, stream_fps=STREAM_FPS, stream_source=0):
+        super().__init__(name="preview", daemon=True)
+        self.mode = mode
+        self.block = block if mode != "none" else None
+        # Without a window only the stream shows what is rendered, so
+        # nothing is rendered faster than it is published.
+        self.interval = 1.0 / (fps if mode == "window" else min(fps, stream_fps))
+        self.stream_interval = 1.0 / stream_fps
+        self.stream_source = stream_source
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.rendered = {}
+        self.running = True
+        # Bumped by clear(), so a frame rendered from before is dropped.
+        self.epoch = 0
+        self.last_stream = 0.0
+        self.last_shown = 0.0
+        self.frames = 0
+
+    @property
+    def enabled(self):
+        return self.mode != "none"
+
+    def submit(self, packet):
+        if not self.enabled or packet["frame"] is None:
+            return
+        with self.cond:
+            self.pending[packet["source"]] = packet
+            self.cond.notify()
+
+    def run(self):
+        next_due = time.perf_counter()
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                packets, self.pending, epoch = self.pending, {}, self.epoch
+            for source, packet in packets.items():
+                try:
+                    frame = render(packet["frame"], packet.get("overlay") or ())
+                    self.frames += 1
+                    if self.mode == "window":
+                        with self.cond:
+                            if epoch == self.epoch:
+                                self.rendered[source] = frame
+                    if source == self.stream_source:
+                        self.publish(frame, epoch)
+                except Exception as e:
+                    logging.warning(f"Preview render failed: {e}")
+            # Anything submitted meanwhile waits for the next slot.
+            next_due = max(next_due + self.interval, time.perf_counter())
+            time.sleep(max(0.0, next_due - time.perf_counter()))
+
+    def publish(self, frame, epoch):
+        now = time.perf_counter()
+        if self.block is None or now - self.last_stream < self.stream_interval * 0.9:
+            return
+        self.last_stream = now
+        data = encode_jpeg(frame)
+        with self.cond:
+            if data is not None and epoch == self.epoch:
+                self.block.write_bytes(data)
+
+    def show(self, window_name):
+        """Main thread: shows frames rendered since the last call and pumps
+        the GUI. Returns the key pressed, or -1."""
+        if self.mode != "window":
+            return -1
+        with self.cond:
+            rendered, self.rendered = self.rendered, {}
+        for source, frame in rendered.items():
+            cv2.imshow(window_name(source), frame)
+        now = time.perf_counter()
+        if not rendered and now - self.last_shown < self.interval:
+            return -1
+        self.last_shown = now
+        return cv2.waitKey(1)
+
+    def clear(self):
+        # Camera stopped: nothing stale is shown or served.
+        with self.cond:
+            self.epoch += 1
+            self.pending.clear()
+            self.rendered.clear()
+            if self.block is not None:
+                self.block.write_bytes(b"")
+        if self.mode == "window":
+            cv2.destroyAllWindows()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.join(timeout=1.0)
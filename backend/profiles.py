@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import shutil
+
+from recordings import DATASET_DIR
+
+# Named gesture profiles, one per person sharing the machine. Each has its
+# own dataset, gesture map and trained model:
+#
+#   default        gesture_map.json, model.pkl, model.json and dataset/ in
+#                  backend/, where they were before profiles existed
+#   <name>         the same files under user_profiles/<name>/
+#
+# user_profiles/active.json records the active profile and the most
+# recently used ones, so a restarted API or detector comes back on the same
+# profile and can warm up the models it is likely to switch to.
+PROFILES_DIR = "user_profiles"
+ACTIVE_FILE = os.path.join(PROFILES_DIR, "active.json")
+DEFAULT_PROFILE = "default"
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,39}$")
+RECENT_PROFILES = 8
+
+
+class Profile:
+    def __init__(self, name):
+        self.name = name
+        self.root = "" if name == DEFAULT_PROFILE else os.path.join(PROFILES_DIR, name)
+        self.gesture_map = os.path.join(self.root, "gesture_map.json")
+        self.model = os.path.join(self.root, "model.pkl")
+        self.model_info = os.path.join(self.root, "model.json")
+        self.dataset = os.path.join(self.root, DATASET_DIR)
+
+    def exists(self):
+        return self.name == DEFAULT_PROFILE or os.path.isdir(self.root)
+
+    def describe(self):
+        info = {}
+        if os.path.exists(self.model_info):
+            try:
+                with open(self.model_info, "r") as f:
+                    info = json.load(f)
+            except Exception:
+                pass
+        gestures = 0
+        if os.path.exists(self.gesture_map):
+            try:
+                with open(self.gesture_map, "r") as f:
+                    gestures = len(json.load(f))
+            except Exception:
+                pass
+        return {"name": self.name, "gestures": gestures, "trained": os.path.exists(self.model),
+                "model_version": info.get("version")}
+
+
+def validate_name(name):
+    if not isinstance(name, str) or not NAME_PATTERN.match(name):
+        raise ValueError("Profile names are 1-40 letters, digits, '-' or '_'")
+    return name
+
+
+def get_profile(name=None):
+    """The named profile, or the active one. Raises ValueError for an
+    invalid name and KeyError for one that does not exist."""
+    profile = Profile(validate_name(name) if name is not None else active_profile())
+    if not profile.exists():
+        raise KeyError(f"No profile named {profile.name}")
+    return profile
+
+
+def list_profiles():
+    names = [DEFAULT_PROFILE]
+    if os.path.isdir(PROFILES_DIR):
+        names += sorted(name for name in os.listdir(PROFILES_DIR)
+                        if name != DEFAULT_PROFILE and NAME_PATTERN.match(name)
+                        and os.path.isdir(os.path.join(PROFILES_DIR, name)))
+    return names
+
+
+def create_profile(name, copy_from=None):
+    """Creates an empty profile, or one starting from a copy of another
+    profile's gesture map (recordings and model are not copied)."""
+    profile = Profile(validate_name(name))
+    if profile.exists():
+        raise FileExistsError(f"Profile {name} already exists")
+    source = get_profile(copy_from) if copy_from is not None else None
+    os.makedirs(profile.dataset)
+    if source is not None and os.path.exists(source.gesture_map):
+        shutil.copyfile(source.gesture_map, profile.gesture_map)
+    return profile
+
+
+def delete_profile(name):
+    profile = get_profile(name)
+    if profile.name == DEFAULT_PROFILE:
+        raise ValueError("The default profile cannot be deleted")
+    if profile.name == active_profile():
+        raise ValueError("The active profile cannot be deleted")
+    shutil.rmtree(profile.root)
+    state = read_state()
+    state["recent"] = [n for n in state["recent"] if n != profile.name]
+    write_state(state)
+
+
+def read_state():
+    try:
+        with open(ACTIVE_FILE, "r") as f:
+            state = json.load(f)
+        return {"active": state.get("active") or DEFAULT_PROFILE, "recent": list(state.get("recent") or [])}
+    except (OSError, ValueError):
+        return {"active": DEFAULT_PROFILE, "recent": []}
+
+
+def write_state(state):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    tmp = ACTIVE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, ACTIVE_FILE)
+
+
+def active_profile():
+    name = read_state()["active"]
+    # Deleted or renamed by hand: fall back to the default profile.
+    return name if NAME_PATTERN.match(name) and Profile(name).exists() else DEFAULT_PROFILE
+
+
+def recent_profiles():
+    """Most recently used first, the active profile included."""
+    state = read_state()
+    names = []
+    for n in [state["active"]] + state["recent"]:
+        if n not in names and NAME_PATTERN.match(n) and Profile(n).exists():
+            names.append(n)
+    return names
+
+
+def set_active_profile(name):
+    state = read_state()
+    recent = []
+    for n in [name, state["active"]] + state["recent"]:
+        if n not in recent:
+            recent.append(n)
+    write_state({"active": name, "recent": recent[:RECENT_PROFILES]})
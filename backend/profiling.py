@@ -0,0 +1,180 @@
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = "profiles"
+MODES = ("cprofile", "sample")
+# From 3.12 cProfile runs on sys.monitoring: only one profiler may be active,
+# and once enabled it sees every thread.
+SHARED_CPROFILE = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    """On-demand profiling of the detector, switched on and off over IPC.
+
+    cprofile  deterministic profile of the pipeline stage functions; each
+              stage thread gets its own cProfile.Profile (cProfile only sees
+              the thread that enabled it) and they are merged on stop. On
+              3.12+ a single profile is enabled for the whole process
+              instead, so it also covers everything outside the stages
+    sample    a background thread records every thread's stack each
+              `interval` seconds; low overhead, sees all threads
+
+    When off, a wrapped stage function costs one attribute check per call.
+    stop() writes a text report to profiles/ and returns its path."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.mode = None
+        self.started_at = None
+        self.profiles = {}
+        self.samples = Counter()
+        self.leaves = Counter()
+        self.sampler = None
+        self.last_report = None
+        self.lock = threading.Lock()
+
+    def wrap(self, fn):
+        def call(*args):
+            if self.mode != "cprofile" or SHARED_CPROFILE:
+                return fn(*args)
+            profile = self.profiles.get(threading.get_ident())
+            if profile is None:
+                with self.lock:
+                    profile = self.profiles.setdefault(threading.get_ident(), cProfile.Profile())
+            return profile.runcall(fn, *args)
+        return call
+
+    def start(self, mode="sample"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        if self.mode is not None:
+            self.stop()
+        self.profiles = {}
+        self.samples = Counter()
+        self.leaves = Counter()
+        self.started_at = time.time()
+        if mode == "cprofile" and SHARED_CPROFILE:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler (a debugger, say) is already active.
+                raise ValueError(f"Could not start cProfile: {e}")
+            self.profiles[None] = profile
+        self.mode = mode
+        if mode == "sample":
+            self.sampler = threading.Thread(target=self.sample_loop, name="profiler", daemon=True)
+            self.sampler.start()
+
+    def sample_loop(self):
+        me = threading.get_ident()
+        while self.mode == "sample":
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = traceback.extract_stack(frame)
+                if not stack:
+                    continue
+                leaf = stack[-1]
+                self.leaves[f"{leaf.filename}:{leaf.lineno} {leaf.name}"] += 1
+                for entry in {f"{f.filename}:{f.name}" for f in stack}:
+                    self.samples[entry] += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        mode, self.mode = self.mode, None
+        if mode is None:
+            return self.last_report
+        if self.sampler is not None:
+            self.sampler.join(timeout=1.0)
+            self.sampler = None
+
+        duration = time.time() - self.started_at
+        out = io.StringIO()
+        out.write(f"mode: {mode}\nduration: {duration:.1f}s\n\n")
+        if mode == "cprofile":
+            if SHARED_CPROFILE and None in self.profiles:
+                self.profiles[None].disable()
+            # A thread that started a call but never finished one has no stats.
+            profiles = []
+            for profile in self.profiles.values():
+                profile.create_stats()
+                if profile.stats:
+                    profiles.append(profile)
+            if profiles:
+                stats = pstats.Stats(profiles[0], stream=out)
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                stats.sort_stats("cumulative").print_stats(40)
+            else:
+                out.write("no stage calls recorded\n")
+        else:
+            total = max(sum(self.leaves.values()), 1)
+            out.write("self (leaf) samples:\n")
+            for name, count in self.leaves.most_common(30):
+                out.write(f"{count:8d} {100 * count / total:5.1f}%  {name}\n")
+            out.write("\ninclusive samples:\n")
+            for name, count in self.samples.most_common(30):
+                out.write(f"{count:8d} {100 * count / total:5.1f}%  {name}\n")
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{mode}.txt")
+        with open(path, "w") as f:
+            f.write(out.getvalue())
+        self.last_report = path
+        return path
+
+    def status(self):
+        return {
+            "mode": self.mode,
+            "running_for": round(time.time() - self.started_at, 1) if self.mode else None,
+            "last_report": self.last_report,
+        }
+
+
+class StartupTimer:
+    """Startup breakdown. step() times one piece of initialization (several
+    may run in parallel, so they need not add up); milestone() records when,
+    counted from `t0`, something first happened, e.g. the first frame."""
+
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.steps = {}
+        self.milestones = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.steps[name] = {"start": round(start - self.t0, 3), "seconds": round(end - start, 3)}
+
+    def milestone(self, name):
+        with self.lock:
+            self.milestones.setdefault(name, round(time.perf_counter() - self.t0, 3))
+
+    def report(self):
+        with self.lock:
+            return {"steps": dict(self.steps), "milestones": dict(self.milestones)}
+
+    def format(self):
+        report = self.report()
+        lines = ["Startup (seconds since launch):"]
+        for name, step in sorted(report["steps"].items(), key=lambda item: item[1]["start"]):
+            lines.append(f"  {name:<16} {step['start']:7.3f} -> {step['start'] + step['seconds']:7.3f}"
+                         f"  ({step['seconds']:.3f})")
+        for name, at in sorted(report["milestones"].items(), key=lambda item: item[1]):
+            lines.append(f"  {name:<16} {at:7.3f}")
+        return "\n".join(lines)
@@ -0,0 +1,133 @@
+import os
+import time
+import numpy as np
+
+from features import as_points, featurize
+from recordings import RecordingWriter, DATASET_DIR
+
+# Poses are captured at the full frame rate, keeping only frames that differ
+# from every frame kept so far, and then multiplied by augmentation. Motions
+# are sampled at a fixed interval and stored as captured, since their timing
+# is what the templates match.
+POSE_FRAMES = 40
+MOTION_FRAMES = 60
+# RMS distance between two poses, in palm lengths (wrist to middle knuckle),
+# below which the newer frame is dropped as a duplicate.
+DEDUPE_DISTANCE = 0.01
+DEDUPE_SPEC = {"version": 1, "normalize": True}
+# A pose held very still may never yield POSE_FRAMES distinct frames; the
+# recording is then saved with what it has after this long.
+MAX_POSE_SECONDS = 10.0
+
+# Augmented copies per captured pose frame. Every copy is rotated, scaled
+# and shifted a little around the wrist. With `mirror`, odd copies are also
+# mirrored so the model sees the gesture made with the other hand; that is
+# off by default, because for some poses (point left / point right) the
+# mirror image is a different gesture.
+AUGMENT_COPIES = 2
+MAX_ROTATION = np.radians(10)
+MAX_SCALE = 0.08
+MAX_SHIFT = 0.04
+
+
+def augment(rows, copies=AUGMENT_COPIES, mirror=False, rng=None):
+    """Returns `copies` jittered variants of every raw landmark row, as one
+    (len(rows) * copies, width) array in copy-major order."""
+    rng = rng if rng is not None else np.random.default_rng()
+    rows = np.asarray(rows, dtype=np.float32)
+    width = rows.shape[-1]
+    points = np.tile(as_points(rows), (copies, 1, 1))
+    n = len(points)
+
+    if mirror:
+        flip = np.repeat(np.arange(copies) % 2 == 1, len(rows))
+        points[flip, :, 0] = 1.0 - points[flip, :, 0]
+
+    angle = rng.uniform(-MAX_ROTATION, MAX_ROTATION, n)
+    scale = rng.uniform(1 - MAX_SCALE, 1 + MAX_SCALE, n)
+    shift = rng.uniform(-MAX_SHIFT, MAX_SHIFT, (n, 1, 2))
+    cos, sin = (np.cos(angle) * scale)[:, None], (np.sin(angle) * scale)[:, None]
+
+    wrist = points[:, :1, :2]
+    x, y = points[..., 0] - wrist[..., 0], points[..., 1] - wrist[..., 1]
+    points[..., 0] = cos * x - sin * y
+    points[..., 1] = sin * x + cos * y
+    points[..., :2] += wrist + shift
+    points[..., 2] *= scale[:, None]
+
+    dims = width // points.shape[1]
+    return points[..., :dims].reshape(n, width).astype(np.float32)
+
+
+class RecordingSession:
+    """One recording in progress, fed every frame that has a hand.
+
+    Frames go straight to a RecordingWriter as they are kept; finish() adds
+    the augmented copies in one batch and closes the file. The metadata
+    records how many frames were captured (they come first), augmented and
+    dropped as duplicates."""
+
+    def __init__(self, gesture, kind="pose", interval=0.0, source=None, root=DATASET_DIR,
+                 augment=True, mirror=False):
+        self.gesture = gesture
+        self.kind = kind
+        self.interval = interval if kind == "motion" else 0.0
+        self.target = MOTION_FRAMES if kind == "motion" else POSE_FRAMES
+        self.folder = os.path.join(root, gesture)
+        self.source = source
+        self.augment = augment and kind != "motion"
+        self.mirror = mirror
+        self.writer = None
+        self.rows = []
+        self.times = []
+        self.poses = None
+        self.duplicates = 0
+        self.started_at = time.time()
+        self.last_time = None
+
+    @property
+    def frames(self):
+        return len(self.rows)
+
+    def add(self, lm, t):
+        """Offers one frame; returns True if it was kept."""
+        if self.last_time is not None and t - self.last_time < self.interval:
+            return False
+        lm = np.asarray(lm, dtype=np.float32).ravel()
+
+        if self.kind != "motion":
+            pose = featurize(lm, DEDUPE_SPEC)
+            if self.poses is None:
+                self.poses = np.empty((self.target, len(pose)), dtype=np.float32)
+            elif np.sqrt(np.mean((self.poses[:self.frames] - pose) ** 2, axis=1)).min() < DEDUPE_DISTANCE:
+                self.duplicates += 1
+                return False
+            self.poses[self.frames] = pose
+
+        if self.writer is None:
+            self.writer = RecordingWriter(self.folder, self.gesture, len(lm), meta={
+                "kind": self.kind, "interval": self.interval or None, "source": self.source})
+        self.writer.append(lm, t)
+        self.rows.append(lm)
+        self.times.append(t)
+        self.last_time = t
+        return True
+
+    def done(self):
+        if self.frames >= self.target:
+            return True
+        return self.kind != "motion" and self.frames > 0 and time.time() - self.started_at > MAX_POSE_SECONDS
+
+    def finish(self):
+        """Writes the augmented copies and closes the recording; returns its path."""
+        augmented = 0
+        if self.augment and self.rows:
+            copies = augment(self.rows, mirror=self.mirror)
+            self.writer.extend(copies, np.tile(self.times, len(copies) // len(self.rows)))
+            augmented = len(copies)
+        return self.writer.close(captured=self.frames, augmented=augmented, duplicates=self.duplicates,
+                                 duration_seconds=time.time() - self.started_at)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import uuid
+import struct
+import datetime
+import numpy as np
+
+DATASET_DIR = "dataset"
+DEFAULT_INTERVAL = 0.25
+
+# Recording file (.glr): a fixed-size header followed by fixed-size frames.
+#
+#   0     magic b"GLR1", format version, landmark values per frame, JSON length
+#   16    metadata JSON (gesture, kind, created_at, frames, duration...),
+#         padded to HEADER_SIZE so it can be rewritten in place
+#   1024  frames: float64 timestamp + float32 landmark row each
+#
+# Frames are only ever appended, and the frame count is taken from the file
+# size, so a recording that was cut short is still readable.
+MAGIC = b"GLR1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIII")
+HEADER_SIZE = 1024
+EXTENSION = ".glr"
+PARTIAL = ".part"
+
+
+def frame_dtype(width):
+    return np.dtype([("t", "<f8"), ("lm", "<f4", (width,))])
+
+
+def encode_header(width, meta):
+    payload = json.dumps(meta).encode("utf-8")
+    if HEADER.size + len(payload) > HEADER_SIZE:
+        raise ValueError(f"Recording metadata too large ({len(payload)} bytes)")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, width, len(payload)) + payload
+    return header + b" " * (HEADER_SIZE - len(header))
+
+
+def read_header(path):
+    """Returns (width, metadata) of a .glr file."""
+    with open(path, "rb") as f:
+        head = f.read(HEADER_SIZE)
+    if len(head) < HEADER.size:
+        raise ValueError(f"{path} is not a recording")
+    magic, version, width, length = HEADER.unpack_from(head)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} recording")
+    return width, json.loads(head[HEADER.size:HEADER.size + length].decode("utf-8"))
+
+
+def read_frames(path, width=None):
+    """Memory-maps the frames of a .glr file as a structured array with "t"
+    and "lm" fields; nothing is read until the fields are used."""
+    if width is None:
+        width, _ = read_header(path)
+    dtype = frame_dtype(width)
+    count = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if count <= 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def new_recording_id():
+    return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+class RecordingWriter:
+    """Streams one recording to disk a frame at a time.
+
+    Frames are written to `<path>.part` as they arrive; close() fills in the
+    final metadata and renames the file, so readers never pick up a
+    recording that is still in progress."""
+
+    def __init__(self, folder, gesture, width, meta=None, name=None):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"rec_{name or new_recording_id()}{EXTENSION}")
+        self.part_path = self.path + PARTIAL
+        self.width = width
+        self.dtype = frame_dtype(width)
+        self.meta = dict(meta or {}, gesture=gesture)
+        self.meta.setdefault("created_at", str(datetime.datetime.now()))
+        self.frames = 0
+        self.started_at = time.time()
+        self.file = open(self.part_path, "wb")
+        self.file.write(encode_header(width, self.meta))
+
+    def append(self, lm, t):
+        self.extend(np.asarray(lm).reshape(1, -1), [t])
+
+    def extend(self, landmarks, timestamps):
+        frames = np.empty(len(timestamps), dtype=self.dtype)
+        frames["t"] = timestamps
+        frames["lm"] = landmarks
+        self.file.write(frames.tobytes())
+        self.file.flush()
+        self.frames += len(frames)
+
+    def close(self, **meta):
+        self.meta.update(meta)
+        self.meta["frames"] = self.frames
+        self.meta.setdefault("duration_seconds", time.time() - self.started_at)
+        self.file.seek(0)
+        self.file.write(encode_header(self.width, self.meta))
+        self.file.close()
+        os.replace(self.part_path, self.path)
+        return self.path
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+def list_recordings(root=DATASET_DIR, gestures=None):
+    # One entry per rec_*.glr file, and per legacy sample_N.npy with the
+    # matching meta_N.json if it exists.
+    recordings = []
+    if not os.path.isdir(root):
+        return recordings
+
+    for gesture in sorted(os.listdir(root)):
+        folder = os.path.join(root, gesture)
+        if not os.path.isdir(folder) or gesture.startswith("_"):
+            continue
+        if gestures is not None and gesture not in gestures:
+            continue
+
+        for file in sorted(os.listdir(folder)):
+            if file.startswith("rec_") and file.endswith(EXTENSION):
+                recordings.append({
+                    "gesture": gesture,
+                    "sample_id": file[len("rec_"):-len(EXTENSION)],
+                    "path": os.path.join(folder, file),
+                    "meta_path": None,
+                })
+                continue
+            if not (file.startswith("sample_") and file.endswith(".npy")):
+                continue
+            sample_id = file[len("sample_"):-len(".npy")]
+            meta_path = os.path.join(folder, f"meta_{sample_id}.json")
+            recordings.append({
+                "gesture": gesture,
+                "sample_id": sample_id,
+                "path": os.path.join(folder, file),
+                "meta_path": meta_path if os.path.exists(meta_path) else None,
+            })
+    return recordings
+
+
+def load_timestamps(rec, frames):
+    # Recorded timestamps when available, otherwise the recorder's fixed interval.
+    if rec.get("meta_path"):
+        try:
+            with open(rec["meta_path"], "r") as f:
+                timestamps = json.load(f).get("timestamps", [])
+            if len(timestamps) == frames:
+                return np.asarray(timestamps, dtype=np.float64)
+        except Exception as e:
+            print(f"Error loading {rec['meta_path']}: {e}")
+    return np.arange(frames, dtype=np.float64) * DEFAULT_INTERVAL
+
+
+def load_recording(rec, augmented=True):
+    """Returns (landmarks, timestamps). For .glr files both are views on a
+    memory map of the file. `augmented=False` leaves out the augmented
+    copies that follow the captured frames (see recording_session.py)."""
+    if rec["path"].endswith(EXTENSION):
+        width, meta = read_header(rec["path"])
+        frames = read_frames(rec["path"], width)
+        if not augmented and meta.get("captured") is not None:
+            frames = frames[:meta["captured"]]
+        return frames["lm"], frames["t"]
+    landmarks = np.load(rec["path"])
+    return landmarks, load_timestamps(rec, len(landmarks))
+
+
+def load_metadata(rec):
+    if rec["path"].endswith(EXTENSION):
+        return read_header(rec["path"])[1]
+    if rec.get("meta_path"):
+        with open(rec["meta_path"], "r") as f:
+            return json.load(f)
+    return {"gesture": rec["gesture"]}
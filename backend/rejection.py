@@ -0,0 +1,205 @@
+import numpy as np
+
+# Open-set rejection for the gesture classifier. Fitted by retrain.py from
+# held-out recordings and pickled with the model as `model.rejection_`; the
+# detector only needs numpy to apply it.
+#
+# A frame is rejected as an unknown pose when either
+#   - its calibrated confidence is below the predicted gesture's threshold, or
+#   - its features are further from that gesture's centroid than the
+#     gesture's held-out frames ever were (plus a margin).
+
+CALIBRATION_FOLDS = 3
+# Fraction of correctly classified held-out frames each threshold keeps.
+KEEP_RATE = 0.95
+MIN_THRESHOLD = 0.2
+MAX_THRESHOLD = 0.9
+# Radius = this quantile of held-out distances to the centroid, times the margin.
+RADIUS_QUANTILE = 0.99
+RADIUS_MARGIN = 1.25
+# Smoothing of raw vote fractions, so a forest's zero votes stay finite.
+EPSILON = 1e-3
+TEMPERATURES = np.logspace(-1, 1, 41)
+
+
+class RejectionModel:
+    """Calibration and unknown-pose check for one trained model.
+
+    `temperature` rescales the model's probabilities (fitted to minimize
+    held-out log loss), `thresholds` is the minimum calibrated confidence
+    per class, and `centroids`/`radii` describe where each class sits in
+    standardized feature space."""
+
+    def __init__(self, classes, temperature, thresholds, center, scale, centroids, radii):
+        self.classes = list(classes)
+        self.temperature = float(temperature)
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.radii = np.asarray(radii, dtype=np.float64)
+
+    def calibrate(self, probs):
+        return calibrate(probs, self.temperature)
+
+    def distance(self, x, index):
+        # RMS distance in standardized units, so it does not grow with the
+        # number of features.
+        z = (x - self.center) / self.scale - self.centroids[index]
+        return float(np.sqrt(np.mean(z * z)))
+
+    def check(self, x, probs):
+        """Returns None if the pose is accepted, otherwise why it was not
+        ("confidence" or "distance"). `probs` are calibrated."""
+        best = int(np.argmax(probs))
+        if probs[best] < self.thresholds[best]:
+            return "confidence"
+        if self.distance(x, best) > self.radii[best]:
+            return "distance"
+        return None
+
+    def rejects(self, X, probs):
+        """check() for a batch: boolean mask of the rows rejected."""
+        best = probs.argmax(axis=1)
+        confidence = probs[np.arange(len(probs)), best]
+        z = (X - self.center) / self.scale - self.centroids[best]
+        return (confidence < self.thresholds[best]) | (np.sqrt(np.mean(z * z, axis=1)) > self.radii[best])
+
+    def summary(self):
+        return {
+            "temperature": round(self.temperature, 3),
+            "thresholds": {str(c): round(float(t), 3) for c, t in zip(self.classes, self.thresholds)},
+            "radii": {str(c): round(float(r), 3) if np.isfinite(r) else None
+                      for c, r in zip(self.classes, self.radii)},
+        }
+
+
+def calibrate(probs, temperature):
+    # Works on one probability vector or a matrix of them (one row each).
+    probs = np.power(np.asarray(probs, dtype=np.float64) + EPSILON, 1.0 / temperature)
+    return probs / probs.sum(axis=-1, keepdims=True)
+
+
+def fit_temperature(probs, labels):
+    rows = np.arange(len(labels))
+    losses = [-np.mean(np.log(calibrate(probs, t)[rows, labels])) for t in TEMPERATURES]
+    return float(TEMPERATURES[int(np.argmin(losses))])
+
+
+def standardize(X):
+    center = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale < 1e-6] = 1.0
+    return center, scale
+
+
+def class_centroids(Z, labels, n_classes):
+    centroids = np.zeros((n_classes, Z.shape[1]))
+    present = np.zeros(n_classes, dtype=bool)
+    for k in range(n_classes):
+        rows = labels == k
+        if rows.any():
+            centroids[k] = Z[rows].mean(axis=0)
+            present[k] = True
+    return centroids, present
+
+
+def fit_rejection(make_model, X, y, groups, classes, folds=CALIBRATION_FOLDS, should_stop=None, progress=None):
+    """Fits a RejectionModel for a model trained on (X, y). `make_model`
+    returns a fresh unfitted estimator of the same kind; one is fitted per
+    fold (grouped by recording), and its predictions and distances on the
+    held-out recordings set the temperature, thresholds and radii. Returns
+    (RejectionModel, report) or (None, reason) when there are too few
+    recordings."""
+    from sklearn.model_selection import GroupKFold
+
+    classes = [str(c) for c in classes]
+    labels = np.searchsorted(classes, np.asarray(y).astype(str))
+    n_groups = len(np.unique(groups))
+    if n_groups < 2:
+        return None, "needs at least two recordings"
+
+    X = np.asarray(X, dtype=np.float64)
+    n, k = len(X), len(classes)
+    probs = np.zeros((n, k))
+    # Held-out distance to the centroid of the true class (sets the radii)
+    # and of the predicted class (what the detector will check).
+    distances = np.full(n, np.nan)
+    predicted_distances = np.zeros(n)
+    splits = list(GroupKFold(n_splits=min(folds, n_groups)).split(X, labels, groups))
+    for i, (train, test) in enumerate(splits):
+        if should_stop is not None and should_stop():
+            return None, "cancelled"
+        if progress is not None:
+            progress(i / len(splits), f"fold {i + 1}/{len(splits)}")
+        model = make_model()
+        model.fit(X[train], np.asarray(y)[train])
+        # A fold may miss a class entirely; its column stays zero.
+        columns = np.searchsorted(classes, [str(c) for c in model.classes_])
+        fold_probs = np.zeros((len(test), k))
+        fold_probs[:, columns] = model.predict_proba(X[test])
+        probs[test] = fold_probs
+
+        center, scale = standardize(X[train])
+        centroids, present = class_centroids((X[train] - center) / scale, labels[train], k)
+        z = (X[test] - center) / scale
+        known = present[labels[test]]
+        distances[test[known]] = np.sqrt(np.mean((z[known] - centroids[labels[test[known]]]) ** 2, axis=1))
+        predicted_distances[test] = np.sqrt(np.mean((z - centroids[fold_probs.argmax(axis=1)]) ** 2, axis=1))
+
+    temperature = fit_temperature(probs, labels)
+    calibrated = calibrate(probs, temperature)
+    predicted = calibrated.argmax(axis=1)
+    confidence = calibrated.max(axis=1)
+
+    center, scale = standardize(X)
+    Z = (X - center) / scale
+    centroids, _ = class_centroids(Z, labels, k)
+
+    thresholds = np.full(k, MIN_THRESHOLD)
+    radii = np.full(k, np.inf)
+    for c in range(k):
+        correct = (labels == c) & (predicted == c)
+        if correct.any():
+            thresholds[c] = np.quantile(confidence[correct], 1 - KEEP_RATE)
+        seen = (labels == c) & ~np.isnan(distances)
+        if not seen.any():
+            # A gesture with a single recording is never held out; fall back
+            # to its training frames, with twice the margin.
+            own = Z[labels == c] - centroids[c]
+            radii[c] = np.quantile(np.sqrt(np.mean(own * own, axis=1)), RADIUS_QUANTILE) * RADIUS_MARGIN * 2
+        else:
+            radii[c] = np.quantile(distances[seen], RADIUS_QUANTILE) * RADIUS_MARGIN
+    thresholds = np.clip(thresholds, MIN_THRESHOLD, MAX_THRESHOLD)
+
+    rejection = RejectionModel(classes, temperature, thresholds, center, scale, centroids, radii)
+
+    # How often known poses from held-out recordings would now be rejected.
+    rejected = (confidence < thresholds[predicted]) | (predicted_distances > radii[predicted])
+    accepted = ~rejected
+    report = dict(
+        rejection.summary(),
+        heldout_accuracy=round(float(np.mean(predicted == labels)), 4),
+        heldout_rejected=round(float(np.mean(rejected)), 4),
+        accepted_accuracy=round(float(np.mean(predicted[accepted] == labels[accepted])), 4) if accepted.any() else None,
+    )
+    return rejection, report
+
+
+def refresh_rejection(rejection, X, y, report=None):
+    """The rejection layer of a warm-started model: temperature, thresholds
+    and radii are kept, the standardization and centroids are refitted on
+    the current rows (cheap, no model is fitted). `report` is the previous
+    fit's report. Returns (RejectionModel, report)."""
+    classes = rejection.classes
+    labels = np.searchsorted(classes, np.asarray(y).astype(str))
+    X = np.asarray(X, dtype=np.float64)
+    center, scale = standardize(X)
+    centroids, present = class_centroids((X - center) / scale, labels, len(classes))
+    # A class without rows keeps its old centroid, moved from the old
+    # standardization into the new one.
+    old = rejection.centroids[~present] * rejection.scale + rejection.center
+    centroids[~present] = (old - center) / scale
+    refreshed = RejectionModel(classes, rejection.temperature, rejection.thresholds, center, scale, centroids,
+                               rejection.radii)
+    return refreshed, dict(report or {}, **refreshed.summary(), refreshed=True)
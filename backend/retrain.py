@@ -3,46 +3,248 @@ import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 import joblib
 import json
+import datetime
+import time
 
-def retrain_model():
-    X = []
-    y = []
+from feature_store import FeatureStore
+from features import DEFAULT_FEATURES
+from mapping import gesture_kind
+from profiles import get_profile
+from model_selection import (DEFAULT_CANDIDATE, CV_FOLDS, LATENCY_BUDGET_MS,
+                             make_candidate, evaluate_candidates, select_candidate)
+from rejection import fit_rejection, refresh_rejection
 
-    if not os.path.exists("dataset"):
+MODEL_PATH = "model.pkl"
+MODEL_INFO_PATH = "model.json"
+# Trees are grown in batches so progress can be reported and a cancel
+# request is honoured between batches.
+TREE_BATCH = 10
+# Trees added per warm-start retrain, and the size at which the forest is
+# refitted from scratch instead of growing further.
+WARM_START_TREES = 20
+MAX_ESTIMATORS = 200
+
+
+class TrainingCancelled(Exception):
+    pass
+
+
+def read_model_info(path=MODEL_INFO_PATH):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return {"version": 0}
+
+
+def atomic_write(path, write_fn):
+    # Write next to the target, then rename over it: readers only ever see
+    # the old file or the complete new one.
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        write_fn(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def publish_model(model, info, path=MODEL_PATH, info_path=MODEL_INFO_PATH):
+    version = read_model_info(info_path).get("version", 0) + 1
+    model.version_ = version
+    info = dict(info, version=version, created_at=str(datetime.datetime.now()))
+
+    atomic_write(path, lambda tmp: joblib.dump(model, tmp))
+
+    def write_info(tmp):
+        with open(tmp, "w") as f:
+            json.dump(info, f)
+
+    atomic_write(info_path, write_info)
+    return info
+
+
+def load_previous_model(path=MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        print(f"Could not load previous model: {e}")
+        return None
+
+
+def retrain_model(progress=None, should_stop=None, full=False, select=False, candidates=None,
+                  latency_budget_ms=LATENCY_BUDGET_MS, folds=CV_FOLDS, n_jobs=-1, calibrate=True, profile=None):
+    # `profile` names the gesture profile to train (profiles.py); the active one by default.
+    profile = get_profile(profile)
+    def report(stage, fraction, message=""):
+        if progress is not None:
+            progress(stage, fraction, message)
+
+    def check_cancel():
+        if should_stop is not None and should_stop():
+            raise TrainingCancelled()
+
+    # Seconds per stage, returned with the model info (and exported by the
+    # API as gesture_retrain_seconds).
+    timings = {}
+    clock = [time.perf_counter()]
+
+    def lap(stage):
+        now = time.perf_counter()
+        timings[stage] = round(now - clock[0], 3)
+        clock[0] = now
+
+    if not os.path.exists(profile.dataset):
         print("No dataset folder found.")
         return
 
     valid_gestures = set()
-    if os.path.exists("gesture_map.json"):
+    if os.path.exists(profile.gesture_map):
         try:
-            with open("gesture_map.json", "r") as f:
-                 valid_gestures = set(json.load(f).keys())
+            with open(profile.gesture_map, "r") as f:
+                 # Motion gestures are matched as sequences (sequences.py), not classified.
+                 valid_gestures = {name for name, entry in json.load(f).items() if gesture_kind(entry) == "pose"}
         except:
              pass
 
-    for gesture in os.listdir("dataset"):
-        if gesture not in valid_gestures:
-            print(f"Skipping {gesture} (not in map)")
-            continue
-
-        folder = f"dataset/{gesture}"
+    store = FeatureStore(profile.dataset, DEFAULT_FEATURES)
+    changes = store.update(lambda fraction, name: report("loading", fraction, name))
+    print(f"Feature store: +{changes['files_added']} files, +{changes['rows_added']} rows"
+          + (" (rebuilt)" if changes["rebuilt"] else ""))
+    check_cancel()
 
-        for file in os.listdir(folder):
-            try:
-                data = np.load(f"{folder}/{file}")
-                for sample in data:
-                    X.append(sample)
-                    y.append(gesture)
-            except Exception as e:
-                print(f"Error loading {file}: {e}")
-
-    if not X:
+    X, y, groups = store.load(valid_gestures)
+    lap("load")
+    if len(X) == 0:
         print("No data to train on.")
         return
 
-    print(f"Training on {len(X)} samples...")
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X,y)
+    classes = sorted(str(c) for c in set(y))
+    info = read_model_info(profile.model_info)
+    previous = None if full else load_previous_model(profile.model)
+    fingerprint = {"store_rows": store.index["rows"], "rows": int(len(X)), "classes": classes,
+                   "features": store.spec}
+
+    # Warm start only works when the class set is unchanged: new trees are
+    # added to the existing forest, fitted on all current rows. A new gesture,
+    # a changed recording or an oversized forest falls back to a full refit.
+    warm = (
+        previous is not None
+        and isinstance(previous, RandomForestClassifier)
+        and not changes["rebuilt"]
+        and [str(c) for c in previous.classes_] == classes
+        and getattr(previous, "feature_spec_", None) == store.spec
+        and previous.n_features_in_ == X.shape[1]
+        and info.get("store_rows", -1) <= store.index["rows"]
+    )
+    unchanged = (
+        previous is not None
+        and not changes["rebuilt"]
+        and info.get("classes") == classes
+        and info.get("features") == store.spec
+        and info.get("store_rows") == store.index["rows"]
+        and info.get("rows") == len(X)
+        and (not calibrate or getattr(previous, "rejection_", None) is not None)
+    )
+    if unchanged and not select:
+        print("Model is up to date.")
+        return dict(info, skipped=True, timings=timings)
+    if warm and previous.n_estimators + WARM_START_TREES > MAX_ESTIMATORS:
+        warm = False
+
+    # Candidate selection is opt-in (it fits every candidate once per fold);
+    # otherwise the candidate picked last time is refitted.
+    candidate = info.get("candidate", DEFAULT_CANDIDATE)
+    evaluation = info.get("evaluation")
+    if select:
+        warm = False
+        print(f"Evaluating candidates on {len(X)} samples...")
+        evaluation = evaluate_candidates(
+            X, y, groups, candidates, folds=folds, n_jobs=n_jobs,
+            progress=lambda fraction, name: report("evaluating", fraction, name),
+            should_stop=should_stop,
+        )
+        check_cancel()
+        candidate = select_candidate(evaluation, latency_budget_ms)["name"]
+        for result in evaluation:
+            print(f"  {result['name']:>8}: acc {result['accuracy']:.3f}  p95 {result['latency_p95_ms']:.3f} ms")
+        print(f"Selected {candidate} (budget {latency_budget_ms} ms)")
+        lap("evaluate")
+
+    if warm:
+        model = previous
+        model.warm_start = True
+        model.n_jobs = n_jobs
+        target = model.n_estimators + WARM_START_TREES
+        print(f"Warm start: adding {WARM_START_TREES} trees on {len(X)} samples...")
+    else:
+        model = make_candidate(candidate, n_jobs=n_jobs)
+        print(f"Training {candidate} on {len(X)} samples...")
+
+    if isinstance(model, RandomForestClassifier):
+        if not warm:
+            target = model.n_estimators
+            model.set_params(n_estimators=0, warm_start=True)
+        start = model.n_estimators
+        # Batches of TREE_BATCH, the last one ending exactly on the target.
+        steps = list(range(start + TREE_BATCH, target, TREE_BATCH)) + ([target] if target > start else [])
+        for n_trees in steps:
+            check_cancel()
+            report("training", (n_trees - start) / (target - start), f"{n_trees}/{target} trees")
+            model.n_estimators = n_trees
+            model.fit(X,y)
+        model.warm_start = False
+        # Prediction runs one frame at a time; worker threads only add overhead.
+        model.n_jobs = None
+    else:
+        report("training", 0.0, candidate)
+        model.fit(X,y)
+
+    check_cancel()
+    lap("train")
+    model.feature_spec_ = store.spec
 
-    joblib.dump(model,"model.pkl")
-    print("Model saved")
+    # Calibration and unknown-pose rejection, fitted on held-out recordings
+    # (see rejection.py). Without it the detector uses raw probabilities.
+    # Refitting it fits the model once per fold, which would cost a warm
+    # start far more than the new trees did; a warm start (same classes)
+    # keeps the previous layer and only refreshes its centroids.
+    previous_rejection = getattr(previous, "rejection_", None) if warm else None
+    rejection = model.rejection_ = None
+    if calibrate and previous_rejection is not None and previous_rejection.classes == classes:
+        model.rejection_, rejection = refresh_rejection(previous_rejection, X, y, info.get("rejection"))
+        print("Rejection layer: kept from the previous model, centroids refreshed")
+        lap("calibrate")
+    elif calibrate:
+        model.rejection_, rejection = fit_rejection(
+            lambda: make_candidate(candidate, n_jobs=n_jobs), X, y, groups, model.classes_,
+            should_stop=should_stop, progress=lambda fraction, message: report("calibrating", fraction, message),
+        )
+        check_cancel()
+        if model.rejection_ is None:
+            print(f"No rejection layer: {rejection}")
+            rejection = None
+        else:
+            print(f"Rejection layer: temperature {rejection['temperature']}, "
+                  f"{rejection['heldout_rejected']:.1%} of held-out frames rejected")
+        lap("calibrate")
+    report("publishing", 1.0)
+    info = publish_model(model, dict(
+        fingerprint,
+        samples=int(len(X)),
+        candidate=candidate,
+        trees=getattr(model, "n_estimators", None),
+        warm_start=warm,
+        evaluation=evaluation,
+        latency_budget_ms=latency_budget_ms if select else info.get("latency_budget_ms"),
+        rejection=rejection,
+        profile=profile.name,
+    ), profile.model, profile.model_info)
+    lap("publish")
+    info["timings"] = timings
+    print(f"Model saved (version {info['version']})")
+    return info
@@ -1,382 +1,868 @@
-import cv2
-import mediapipe as mp
+import sys
+import time
+from profiling import Profiler, StartupTimer
+
+# Startup is timed from here, so the breakdown includes the imports.
+startup = StartupTimer()
+
 import numpy as np
 import os
-import joblib
 import json
-import time
 import datetime
-from actions import perform_action
-from gesture_model import extract_landmarks
+import signal
+import threading
+import argparse
+from actions import ActionExecutor, make_backend
+from pipeline import Pipeline
+from frame_source import make_source
+from inference import ModelCache
+from profiles import Profile, DEFAULT_PROFILE, get_profile, recent_profiles
+from hand_tracker import HandTracker
+from mapping import action_name, gesture_kind, gesture_mirrored
+from smoothing import GestureEngine
+from sequences import SequenceRecognizer, build_templates, SEQ_RATE
+from recording_session import RecordingSession
+from preview import Preview, MODES as PREVIEW_MODES, PREVIEW_FPS
+from ipc import (CommandListener, StatusBlock, METRICS_BLOCK_NAME, PREVIEW_BLOCK_NAME, PREVIEW_BLOCK_SIZE,
+                 HEALTH_BLOCK_NAME, HEALTH_BLOCK_SIZE)
+import metrics
 import logging
 from collections import deque
 
-logging.basicConfig(filename='detector_debug.log', level=logging.INFO, 
+# mediapipe and joblib (which unpickles scikit-learn) are imported where they
+# are first used: together they take longer to load than everything else.
+startup.milestone("imports")
+
+logging.basicConfig(filename='detector_debug.log', level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 RECORDING = False
 CURRENT_GESTURE = None
+CONTROL_ACTIVE = False
 GESTURE_MAP = {}
 model = None
-samples = []
+classifier = None
+# The active gesture profile (profiles.py) and the warmed-up models of the
+# ones used last, so switching back to one does not touch the disk.
+PROFILE = Profile(DEFAULT_PROFILE)
+MODEL_CACHE_SIZE = 3
+model_cache = ModelCache(MODEL_CACHE_SIZE)
+# (path, mtime) of the model file loaded last; a change triggers a reload.
+model_stamp = None
+last_switch = None
+session = None
 action_log = deque(maxlen=5)
 
-mp_hands = mp.solutions.hands
-mp_draw = mp.solutions.drawing_utils
+pipeline = None
+executor = None
+status_block = None
+metrics_block = None
+health_block = None
+preview = None
+# False when running headless: the action stage then records no overlay.
+DRAW = True
+profiler = Profiler()
+status_lock = threading.Lock()
+last_status_time = 0
+# Wall-clock times for the health record (see write_health): when the
+# sources opened, and when the last frame left the action stage and how
+# long after its capture that was.
+camera_since = None
+last_frame_at = None
+last_frame_lag = None
+
+REC_KIND = "pose"
+# Per-recording options from the start command (augment, mirror).
+REC_OPTIONS = {}
+
+# One HandTracker per source slot, each with its own MediaPipe graph.
+MAX_HANDS = 1
+ADAPTIVE = True
+trackers = {}
+tracker_lock = threading.Lock()
+source_names = []
+# Per (source, hand) gesture state, see HandStream.
+streams = {}
+templates = []
+
+
+class HandStream:
+    """Everything the action stage tracks for one hand of one source: pose
+    smoothing, motion matching and what it last reported. Hands are told
+    apart by handedness when more than one is tracked."""
+
+    def __init__(self, source, hand):
+        self.source = source
+        self.hand = hand
+        self.engine = GestureEngine(GESTURE_MAP)
+        self.sequencer = SequenceRecognizer(templates, GESTURE_MAP)
+        self.present = False
+        self.gesture = None
+        self.confidence = 0.0
+
+    def source_name(self):
+        return source_names[self.source] if self.source < len(source_names) else str(self.source)
+
+    def tag(self):
+        parts = []
+        if len(source_names) > 1:
+            parts.append(self.source_name())
+        if MAX_HANDS > 1 and self.hand:
+            parts.append(self.hand)
+        return " ".join(parts)
+
+
+def stream_for(source, slot, hand):
+    stream = streams.get((source, slot))
+    if stream is None:
+        stream = streams[(source, slot)] = HandStream(source, hand)
+    stream.hand = hand or stream.hand
+    return stream
+
+def hand_slots(hands):
+    # A single tracked hand keeps one stream even if its label flickers.
+    if MAX_HANDS == 1:
+        return [0] * len(hands)
+    slots = []
+    for i, hand in enumerate(hands):
+        slots.append(hand["hand"] if hand["hand"] and hand["hand"] not in slots else i)
+    return slots
+
+def tracker_for(source):
+    # Usually created by start_detector while the sources open, otherwise on
+    # the source's first frame; kept across camera restarts.
+    tracker = trackers.get(source)
+    if tracker is None:
+        with tracker_lock:
+            tracker = trackers.get(source)
+            if tracker is None:
+                tracker = trackers[source] = new_tracker()
+    return tracker
+
+def new_tracker():
+    import mediapipe as mp
+    hands = mp.solutions.hands.Hands(max_num_hands=MAX_HANDS)
+    # The graph does most of its setup on the first frame; do it now on a
+    # blank one.
+    hands.process(np.zeros((240, 320, 3), dtype=np.uint8))
+    return HandTracker(hands, adaptive=ADAPTIVE, max_hands=MAX_HANDS)
+
+def tracker_counts():
+    counts = {}
+    for tracker in list(trackers.values()):
+        for mode, n in tracker.counts.items():
+            counts[mode] = counts.get(mode, 0) + n
+    return counts
 
 def load_mapping():
-    global GESTURE_MAP
+    # Read once at startup; the API pushes later changes (set_mapping).
     try:
-        if os.path.exists("gesture_map.json"):
-            with open("gesture_map.json", "r") as f:
-                GESTURE_MAP = json.load(f)
-            print(f"Mapping loaded: {len(GESTURE_MAP)} gestures")
+        if os.path.exists(PROFILE.gesture_map):
+            with open(PROFILE.gesture_map, "r") as f:
+                set_mapping(json.load(f))
+            return
     except Exception as e:
         print(f"Error loading mapping: {e}")
+    load_templates()
+
+def set_mapping(mapping):
+    global GESTURE_MAP
+    GESTURE_MAP = mapping
+    for stream in list(streams.values()):
+        stream.engine.set_mapping(GESTURE_MAP)
+    print(f"Mapping loaded: {len(GESTURE_MAP)} gestures")
+    load_templates()
+
+def load_templates():
+    # Motion templates come from the recordings, so they are rebuilt whenever
+    # the mapping or the model (i.e. the dataset) changes.
+    global templates
+    try:
+        templates = build_templates(GESTURE_MAP, PROFILE.dataset)
+        for stream in list(streams.values()):
+            stream.sequencer.set_templates(templates, GESTURE_MAP)
+        print(f"Motion templates loaded: {len(templates)}")
+    except Exception as e:
+        print(f"Error loading motion templates: {e}")
+
+def model_file():
+    path = PROFILE.model
+    return path, os.path.getmtime(path) if os.path.exists(path) else None
 
 def load_model():
-    global model
+    # Returns True if the model came from the cache.
+    global model, classifier, model_stamp
     try:
-        if os.path.exists("model.pkl"):
-            model = joblib.load("model.pkl")
-            print("Model loaded")
-        else:
+        stamp = model_file()
+        current, cached = model_cache.get(PROFILE.name, PROFILE.model)
+        model_stamp = stamp
+        if current is None:
             model = None
+            classifier = None
             print("Model file not found")
+            return False
+        classifier = current
+        model = current.model
+        version = getattr(model, "version_", None)
+        print("Model loaded" + (f" v{version}" if version else "")
+              + (" (compiled forest)" if classifier.forest is not None else "")
+              + (" from cache" if cached else ""))
+        return cached
+    except PermissionError as e:
+        # Windows: retrain is still renaming a new version over the file;
+        # the next reload check tries again.
+        print(f"Model file busy: {e}")
     except Exception as e:
         print(f"Error loading model: {e}")
         model = None
+        classifier = None
+    return False
+
+def warm_profiles():
+    # Models of the profiles used just before this one, ready to switch to.
+    for name in recent_profiles()[1:model_cache.capacity]:
+        try:
+            model_cache.get(name, get_profile(name).model)
+        except Exception as e:
+            print(f"Could not warm up profile {name}: {e}")
+
+def switch_profile(name, mapping=None):
+    """Makes `name` the active profile: its mapping (sent along by the API,
+    or read from its file), templates and model. A model still in the cache
+    is swapped in without touching the disk."""
+    global RECORDING, PROFILE, model, classifier, last_switch
+    start = time.perf_counter()
+    profile = get_profile(name)
+    if RECORDING:
+        # The recording belonged to the previous profile.
+        print("Recording stopped: profile switched")
+        RECORDING = False
+    # Nothing is classified against the old model with the new mapping.
+    classifier = None
+    PROFILE = profile
+    if mapping is None:
+        load_mapping()
+    else:
+        set_mapping(mapping)
+    cached = load_model()
+    for stream in list(streams.values()):
+        stream.engine.reset()
+    last_switch = {"ms": round((time.perf_counter() - start) * 1000, 2), "cached": cached}
+    print(f"Profile {profile.name} active ({last_switch['ms']:.1f} ms"
+          + (", model from cache)" if last_switch["cached"] else ")"))
+
+def write_status(current_gesture=None, confidence=0.0, camera_on=True, force=False):
+    global last_status_time
+    if not force and time.time() - last_status_time <= 0.2:
+        return
+    status = {
+        "recording": RECORDING,
+        "current_gesture": current_gesture,
+        "confidence": float(confidence),
+        "model_loaded": model is not None,
+        "model_version": getattr(model, "version_", None),
+        "camera_on": camera_on,
+        "control_active": CONTROL_ACTIVE,
+        "last_update": str(datetime.datetime.now()),
+        "action_log": list(action_log),
+        "pipeline": pipeline.stats() if pipeline is not None and camera_on else None,
+        "tracker": tracker_counts() if trackers and camera_on else None,
+        "hands": [
+            {"source": stream.source_name(), "hand": stream.hand, "gesture": stream.gesture,
+             "confidence": round(stream.confidence, 2)}
+            for stream in list(streams.values()) if stream.present
+        ] if camera_on else [],
+        "profiler": profiler.status(),
+        "preview": preview.mode if preview is not None else None,
+        "startup": startup.report(),
+        "profile": {"name": PROFILE.name, "last_switch": last_switch, "model_cache": model_cache.stats()},
+    }
+    if status_block is None:
+        return
+    try:
+        with status_lock:
+            status_block.write(status)
+        last_status_time = time.time()
+    except Exception as e:
+        metrics.ERRORS.labels(site="status").inc()
+        logging.warning(f"Could not write status: {e}")
+
+def write_health(camera_on):
+    # The main loop's heartbeat, checked by the API's supervisor (supervisor.py).
+    if health_block is None:
+        return
+    try:
+        health_block.write({
+            "pid": os.getpid(),
+            "heartbeat": time.time(),
+            "camera_on": camera_on,
+            "camera_since": camera_since if camera_on else None,
+            "last_frame_at": last_frame_at if camera_on else None,
+            "lag_ms": round(last_frame_lag * 1000, 1) if camera_on and last_frame_lag is not None else None,
+            "control_active": CONTROL_ACTIVE,
+        })
+    except Exception as e:
+        logging.warning(f"Could not write health: {e}")
+
+def perform_action(action):
+    # Queued; the executor thread makes the (possibly slow) OS call.
+    metrics.ACTIONS.labels(action=action).inc()
+    if executor is not None:
+        executor.submit(action)
+
+def collect_pipeline_metrics():
+    if pipeline is None:
+        return
+    stats = pipeline.stats()
+    metrics.FPS.set(stats["fps"])
+    for queue in ("capture", "inference", "action"):
+        metrics.DROPPED.labels(queue=queue).set(stats[queue]["dropped"])
+
+metrics.registry.add_collector(collect_pipeline_metrics)
+
+def publish_metrics():
+    if metrics_block is None or not metrics.ENABLED:
+        return
+    try:
+        metrics_block.write(metrics.registry.snapshot())
+    except Exception as e:
+        logging.warning(f"Could not publish metrics: {e}")
+
+def log_action(name, stream=None):
+    entry = {
+        "name": name,
+        "time": str(datetime.datetime.now().strftime("%H:%M:%S")),
+        "timestamp": time.time()
+    }
+    if stream is not None:
+        entry["source"] = stream.source_name()
+        entry["hand"] = stream.hand
+    action_log.append(entry)
+
+def draw(packet, *op):
+    # Only recorded here; the preview thread renders it (see preview.py).
+    if DRAW and packet["frame"] is not None:
+        packet.setdefault("overlay", []).append(op)
+
+def draw_hand(packet):
+    if packet["hands"]:
+        draw(packet, "hands", [hand["lm"] for hand in packet["hands"]])
+
+def draw_text(packet, text, org, scale, color, thickness):
+    draw(packet, "text", text, org, scale, color, thickness)
+
+def infer_frame(packet):
+    # Inference stage (one per source): hand landmarks + gesture
+    # classification for every hand. Replay sources already carry "lm" and
+    # skip MediaPipe entirely.
+    packet["track"] = None
+    packet["classes"] = None
+    found = []
+    if packet.get("lm") is not None:
+        found = [(packet["lm"], packet.get("hand"))]
+    elif packet["frame"] is not None:
+        t0 = time.perf_counter()
+        found, packet["track"] = tracker_for(packet["source"]).process(packet["frame"])
+        metrics.LANDMARK_SECONDS.labels(mode=packet["track"]).observe(time.perf_counter() - t0)
+    packet["hands"] = [{"lm": lm, "hand": label, "gesture": None, "confidence": 0.0, "probs": None,
+                        "rejected": None} for lm, label in found]
+    # Recording only uses one hand: the first one found.
+    packet["lm"] = found[0][0] if found else None
+
+    current = classifier
+    if current is not None and not RECORDING:
+        packet["classes"] = current.classes
+        for hand in packet["hands"]:
+            try:
+                t0 = time.perf_counter()
+                probs, rejected = current.predict(hand["lm"])
+                metrics.PREDICT_SECONDS.observe(time.perf_counter() - t0)
+                if rejected:
+                    # Not one of the trained gestures: never reaches the engine.
+                    metrics.REJECTED.labels(reason=rejected).inc()
+                    hand["rejected"] = rejected
+                    continue
+                best = int(np.argmax(probs))
+                hand["probs"] = probs
+                hand["gesture"] = current.classes[best]
+                hand["confidence"] = float(probs[best])
+            except Exception as e:
+                metrics.ERRORS.labels(site="predict").inc()
+                logging.warning(f"Prediction failed: {e}")
+    return packet
+
+def handle_recording(packet):
+    global RECORDING, session
+    lm = packet["lm"]
+    if lm is None:
+        return
+
+    draw_hand(packet)
+
+    if session is not None and (session.gesture != CURRENT_GESTURE or session.kind != REC_KIND
+                                or os.path.dirname(session.folder) != PROFILE.dataset):
+        # A new recording was started before the previous one finished.
+        session.abort()
+        session = None
+    if session is None:
+        # Motion gestures are sampled at the sequence rate so they can be
+        # replayed as templates; poses use every distinct frame.
+        session = RecordingSession(CURRENT_GESTURE, REC_KIND, interval=1.0 / SEQ_RATE,
+                                   source=source_names[0] if source_names else None, root=PROFILE.dataset,
+                                   **REC_OPTIONS)
+
+    now = time.time()
+    if session.add(lm, now):
+        draw(packet, "circle", (50, 50), 20, (0, 255, 0))
+    draw(packet, "progress", min(session.frames / session.target, 1.0))
+
+    text = f"RECORDING: {CURRENT_GESTURE} ({session.frames}/{session.target})"
+    if session.kind != "motion" and now - (session.last_time or now) > 1.0:
+        # Held so still that every frame is a duplicate of one already kept.
+        text += " - move your hand a little"
+    draw_text(packet, text, (50, 380), 0.7, (0, 255, 0), 2)
+
+    if session.done():
+        path = session.finish()
+        meta = session.writer.meta
+        print(f"Recording Saved for {CURRENT_GESTURE} ({meta['captured']} frames + {meta['augmented']} augmented, "
+              f"{meta['duplicates']} duplicates dropped, {meta['duration_seconds']:.2f}s): {path}")
+
+        RECORDING = False
+        session = None
+
+def detect_motion(packet, stream, lm):
+    # Motion gestures (and the built-in swipes) are matched over time on the
+    # landmark stream; pose classification is skipped for a frame that
+    # completes one.
+    now = packet.get("source_time") or packet.get("captured_at") or time.time()
+    detections = stream.sequencer.push(lm, now)
+    if not detections:
+        return False
+
+    gesture, distance, start, end = min(detections, key=lambda d: d[1])
+    action = stream.sequencer.action_for(gesture)
+    tag = stream.tag()
+    print(f"Motion: {gesture}" + (f" [{tag}]" if tag else "") + f" ({end - start:.2f}s, distance {distance:.2f})")
+    if CONTROL_ACTIVE and action:
+        perform_action(action)
+        log_action(f"{action} ({gesture})", stream)
+    draw_text(packet, gesture.upper(), (200, 200), 2, (0, 255, 0), 3)
+    stream.gesture, stream.confidence = gesture, 1.0
+    write_status(gesture, 1.0, force=True)
+    return True
+
+def handle_hand(packet, stream, hand, now, row):
+    # `hand` is None when this stream's hand is not in the frame.
+    stream.present = hand is not None
+    stream.gesture, stream.confidence = None, 0.0
+    if detect_motion(packet, stream, hand["lm"] if hand else None):
+        stream.engine.reset()
+        return
 
-def start_detector():
-    global RECORDING, CURRENT_GESTURE, samples
-    
-    print("Detector started... Waiting for command.")
-    
-    load_mapping()
-    load_model()
-    
-    last_map_update = os.path.getmtime("gesture_map.json") if os.path.exists("gesture_map.json") else 0
-    last_model_update = os.path.getmtime("model.pkl") if os.path.exists("model.pkl") else 0
+    if classifier is None:
+        return
+
+    if hand is None or hand["rejected"]:
+        # No hand, or an unknown pose: let the smoothed confidence decay so
+        # held gestures release. Nothing fires.
+        stream.engine.update(classifier.classes, None, now)
+        if hand is not None:
+            tag = stream.tag()
+            draw_text(packet, (f"[{tag}] " if tag else "") + "Unknown pose", (20, 50 + 40 * row), 1, (0, 0, 255), 2)
+        return
+
+    gesture, confidence, fire = stream.engine.update(packet["classes"], hand["probs"], now)
+    if gesture is None or gesture not in GESTURE_MAP:
+        return
+
+    stream.gesture, stream.confidence = gesture, confidence
+    action = action_name(GESTURE_MAP.get(gesture))
+    tag = stream.tag()
+    display_text = (f"[{tag}] " if tag else "") + f"Gesture: {gesture} ({confidence:.2f})"
+    color = (0, 255, 255)
+
+    if CONTROL_ACTIVE and action and stream.engine.active == gesture:
+        display_text += f" -> {action}"
+        color = (0, 255, 0)
+        if fire:
+            perform_action(fire)
+            log_action(fire, stream)
+    elif not CONTROL_ACTIVE:
+        display_text += " (Passive)"
+
+    draw_text(packet, display_text, (20, 50 + 40 * row), 1, color, 2)
+
+def handle_frame(packet):
+    # Action/IO stage: recording, motion gestures, action dispatch, status and
+    # overlay. Packets from every source arrive here as one stream.
+    global last_frame_at, last_frame_lag
+    metrics.FRAMES.inc()
+    last_frame_at = time.time()
+    last_frame_lag = last_frame_at - packet["captured_at"]
+    if "first_frame" not in startup.milestones:
+        startup.milestone("first_frame")
+    if RECORDING and CURRENT_GESTURE:
+        # Recordings come from the first source only.
+        if packet["source"] == 0:
+            handle_recording(packet)
+        return packet
+
+    draw_hand(packet)
+    now = time.time()
+    seen = set()
+    for row, (slot, hand) in enumerate(zip(hand_slots(packet["hands"]), packet["hands"])):
+        stream = stream_for(packet["source"], slot, hand["hand"])
+        seen.add(stream)
+        handle_hand(packet, stream, hand, now, row)
+    for stream in list(streams.values()):
+        if stream.source == packet["source"] and stream not in seen:
+            handle_hand(packet, stream, None, now, 0)
+
+    best = max((st for st in streams.values() if st.gesture), key=lambda st: st.confidence, default=None)
+    if best is None:
+        write_status()
+    else:
+        if "first_gesture" not in startup.milestones:
+            startup.milestone("first_gesture")
+            print(f"First gesture {startup.milestones['first_gesture']:.2f}s after launch")
+        write_status(best.gesture if best.confidence > 0.6 else None, best.confidence)
+    return packet
+
+def start_pipeline(sources, lossless=False):
+    global pipeline, source_names
+    if not isinstance(sources, (list, tuple)):
+        sources = [sources]
+    source_names = []
+    for i, src in enumerate(sources):
+        name = getattr(src, "spec", src.name)
+        source_names.append(f"{name}#{i}" if name in source_names else name)
+    streams.clear()
+    pipeline = Pipeline([src.read_packet for src in sources], profiler.wrap(infer_frame),
+                        profiler.wrap(handle_frame), lossless=lossless)
+    pipeline.start()
+    logging.info(f"Pipeline started ({len(sources)} source(s), up to {MAX_HANDS} hand(s) each).")
+
+def stop_pipeline():
+    global pipeline
+    if pipeline is not None:
+        pipeline.stop()
+        logging.info(f"Pipeline stopped: {pipeline.stats()}")
+        pipeline = None
+
+def start_executor(action_backend=None):
+    global executor
+    executor = ActionExecutor(make_backend(action_backend))
+    executor.start()
+
+def preload(tasks, parallel=True):
+    """Runs the (name, function) startup tasks, each timed as a startup step.
+    In parallel they run on background threads, and the returned function
+    waits for them; errors are raised from there."""
+    errors = []
+
+    def run(name, fn):
+        try:
+            with startup.step(name):
+                fn()
+        except Exception as e:
+            errors.append(e)
+
+    threads = []
+    for name, fn in tasks:
+        if parallel:
+            threads.append(threading.Thread(target=run, args=(name, fn), name=f"preload-{name}", daemon=True))
+            threads[-1].start()
+        else:
+            run(name, fn)
+
+    def wait():
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+    return wait
+
+def start_detector(source_spec="camera", realtime=True, autostart=False, adaptive=True, action_backend=None,
+                   max_hands=1, parallel_startup=True, preview_mode="window", preview_fps=PREVIEW_FPS,
+                   model_cache_size=MODEL_CACHE_SIZE):
+    # `source_spec` is one spec or a list of them; all sources run at once.
+    global RECORDING, CURRENT_GESTURE, CONTROL_ACTIVE, MAX_HANDS, ADAPTIVE, DRAW, PROFILE, executor, \
+        status_block, metrics_block, health_block, preview, model_cache
+
+    try:
+        commands = CommandListener()
+    except ValueError as e:
+        print(f"ERROR: {e}. Set it to the same value as the server's, or let the server start the detector.")
+        return
+    except OSError as e:
+        print(f"ERROR: Could not open command channel ({e}). Is another detector running?")
+        return
+    commands.start()
+    status_block = StatusBlock(create=True)
+    metrics_block = StatusBlock(METRICS_BLOCK_NAME, create=True)
+    health_block = StatusBlock(HEALTH_BLOCK_NAME, create=True, size=HEALTH_BLOCK_SIZE)
+    DRAW = preview_mode != "none"
+    preview_block = StatusBlock(PREVIEW_BLOCK_NAME, create=True, size=PREVIEW_BLOCK_SIZE) if DRAW else None
+    preview = Preview(preview_mode, preview_block, fps=preview_fps)
+    preview.start()
+
+    specs = [source_spec] if isinstance(source_spec, str) else list(source_spec)
+    MAX_HANDS = max_hands
+    ADAPTIVE = adaptive
+    trackers.clear()
+    PROFILE = get_profile()
+    model_cache = ModelCache(model_cache_size)
+
+    # Everything that does not need a frame is loaded while the sources open:
+    # the model (warmed up with one prediction), mapping and motion
+    # templates, a MediaPipe graph per camera/video source and the action
+    # backend. Frames that arrive first are tracked but not classified. The
+    # models of recently used profiles are warmed up for fast switching.
+    tasks = [("model", load_model), ("mapping", load_mapping),
+             ("actions", lambda: start_executor(action_backend))]
+    if model_cache.capacity > 1:
+        tasks.append(("profiles", warm_profiles))
+    tasks += [(f"hands:{i}", lambda i=i: tracker_for(i))
+              for i, spec in enumerate(specs) if spec.split(":")[0] != "replay"]
+    preloaded = preload(tasks, parallel=parallel_startup)
+
+    print(f"Detector started (profile {PROFILE.name})... Waiting for command.")
 
     CAMERA_ON = False
-    CONTROL_ACTIVE = False
-    
-    cap = None
+    shutdown = False
+
+    sources = None
     last_check_time = 0
-    last_status_time = 0
     check_interval = 0.5
-    
-    REC_INTERVAL = 0.25
-    REC_LIMIT = 60
-    last_sample_time = 0
-
-    history_x = deque(maxlen=10)
-    last_swipe_time = 0
-    SWIPE_COOLDOWN = 1.0
-    SWIPE_THRESH = 0.3
-
-    hands = mp_hands.Hands(max_num_hands=1)
-
-    def open_camera():
-        logging.info("Attempting to open Camera 0 (DSHOW)...")
-        cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        if cap.isOpened():
-            logging.info("Camera 0 (DSHOW) opened successfully.")
-            return cap
-        
-        logging.info("Retrying Camera 0 (Default)...")
-        cap = cv2.VideoCapture(0)
-        if cap.isOpened():
-            logging.info("Camera 0 (Default) opened successfully.")
-            return cap
-
-        logging.info("Attempting to open Camera 1...")
-        cap = cv2.VideoCapture(1)
-        if cap.isOpened():
-            logging.info("Camera 1 opened successfully.")
-            return cap
-            
-        logging.error("Failed to open any camera.")
-        return None
-
-    while True:
-        current_time = time.time()
-        if current_time - last_check_time > check_interval:
-            last_check_time = current_time
-            
-            if os.path.exists("recording_cmd.json"):
-                try:
-                    with open("recording_cmd.json", "r") as f:
-                        cmd = json.load(f)
-                    os.remove("recording_cmd.json")
-                    
-                    action = cmd.get("action")
-                    if action == "start_camera":
-                        logging.info("Received command: START_CAMERA")
-                        CAMERA_ON = True
-                        if cap is None or not cap.isOpened():
-                            cap = open_camera()
-                            if cap is None:
-                                logging.error("Could not open camera on START command.")
-                                print("ERROR: Could not open any camera.")
-                                CAMERA_ON = False
-                            else:
-                                print("Camera Started")
-                        
-                    elif action == "stop_camera":
-                        logging.info("Received command: STOP_CAMERA")
+
+    def open_sources():
+        global camera_since
+        opened = []
+        for spec in specs:
+            src = make_source(spec, realtime=realtime)
+            if src.open() and src.is_opened():
+                opened.append(src)
+            else:
+                print(f"ERROR: Could not open source {spec}.")
+                src.release()
+        if not opened:
+            return None
+        for tracker in list(trackers.values()):
+            tracker.reset()
+        # Offline sources replayed at full speed should not lose frames, nor
+        # see any before the model is ready.
+        lossless = not realtime and all(src.name != "camera" for src in opened)
+        if lossless:
+            preloaded()
+        start_pipeline(opened, lossless=lossless)
+        camera_since = time.time()
+        return opened
+
+    def sources_open():
+        return sources is not None and all(src.is_opened() for src in sources)
+
+    def close_sources():
+        stop_pipeline()
+        for src in sources or []:
+            src.release()
+        preview.clear()
+
+    def window_name(index):
+        if len(source_names) <= 1:
+            return "CAMERA WINDOW"
+        return f"CAMERA WINDOW - {source_names[index]}"
+
+    def handle_command(cmd):
+        global RECORDING, CURRENT_GESTURE, CONTROL_ACTIVE, REC_KIND, REC_OPTIONS
+        nonlocal CAMERA_ON, sources, shutdown
+
+        action = cmd.get("action")
+        if action == "start_camera":
+            logging.info("Received command: START_CAMERA")
+            CAMERA_ON = True
+            if not sources_open():
+                sources = open_sources()
+                if sources is None:
+                    logging.error("Could not open camera on START command.")
+                    print("ERROR: Could not open any camera.")
+                    CAMERA_ON = False
+                else:
+                    print("Camera Started")
+
+        elif action == "stop_camera":
+            logging.info("Received command: STOP_CAMERA")
+            CAMERA_ON = False
+            close_sources()
+            sources = None
+            print("Camera Stopped")
+
+        elif action == "shutdown":
+            logging.info("Received command: SHUTDOWN")
+            shutdown = True
+
+        elif action == "set_mapping":
+            set_mapping(cmd.get("mapping") or {})
+
+        elif action == "set_profile":
+            switch_profile(cmd.get("name"), cmd.get("mapping"))
+
+        elif action == "set_mode":
+            mode = cmd.get("mode")
+            CONTROL_ACTIVE = (mode == "control")
+            print(f"Control Mode: {CONTROL_ACTIVE}")
+
+        elif action == "profile":
+            if cmd.get("enable", True):
+                profiler.start(cmd.get("mode") or "sample")
+                print(f"Profiler started ({profiler.mode})")
+            else:
+                report = profiler.stop()
+                print(f"Profiler stopped: {report}")
+            write_status(camera_on=CAMERA_ON, force=True)
+
+        elif action == "start":
+            if not CAMERA_ON:
+                print("Auto-starting camera for recording...")
+                CAMERA_ON = True
+                if not sources_open():
+                    sources = open_sources()
+                    if sources is None:
+                        print("ERROR: Camera failed to auto-start!")
                         CAMERA_ON = False
-                        if cap is not None:
-                            cap.release()
-                            cap = None
-                        cv2.destroyAllWindows()
-                        print("Camera Stopped")
-                        
-                    elif action == "set_mode":
-                        mode = cmd.get("mode")
-                        CONTROL_ACTIVE = (mode == "control")
-                        print(f"Control Mode: {CONTROL_ACTIVE}")
-                        
-                    elif action == "start":
-                        if not CAMERA_ON:
-                            print("Auto-starting camera for recording...")
-                            CAMERA_ON = True
-                            if cap is None or not cap.isOpened():
-                                cap = open_camera()
-                                time.sleep(1.0)
-                                if cap is None or not cap.isOpened():
-                                    print("ERROR: Camera failed to auto-start!")
-                                    CAMERA_ON = False
-                                else:
-                                    print("Camera auto-started successfully.")
-                        
-                        if CAMERA_ON:
-                            RECORDING = True
-                            CURRENT_GESTURE = cmd.get("name")
-                            print(f"Command received: Start recording {CURRENT_GESTURE}")
-                        else:
-                            print("Recording aborted due to camera failure.")
+                    else:
+                        print("Camera auto-started successfully.")
 
-                except Exception as e:
-                    print(f"Error reading command: {e}")
+            if CAMERA_ON:
+                RECORDING = True
+                CURRENT_GESTURE = cmd.get("name")
+                REC_KIND = cmd.get("type") or gesture_kind(GESTURE_MAP.get(CURRENT_GESTURE))
+                REC_OPTIONS = {"mirror": gesture_mirrored(GESTURE_MAP.get(CURRENT_GESTURE))}
+                REC_OPTIONS.update({key: bool(cmd[key]) for key in ("augment", "mirror") if cmd.get(key) is not None})
+                print(f"Command received: Start recording {CURRENT_GESTURE}")
+            else:
+                print("Recording aborted due to camera failure.")
+
+        write_status(camera_on=CAMERA_ON, force=True)
 
+    pending = None
+    try:
+        if autostart:
+            with startup.step("open_sources"):
+                sources = open_sources()
+            CAMERA_ON = sources is not None
             if not CAMERA_ON:
-                try:
-                    status = {
-                        "recording": False,
-                        "current_gesture": None,
-                        "confidence": 0.0,
-                        "model_loaded": model is not None,
-                        "camera_on": False,
-                        "control_active": CONTROL_ACTIVE,
-                        "last_update": str(datetime.datetime.now()),
-                        "action_log": list(action_log)
-                    }
-                    with open("status.json", "w") as f:
-                        json.dump(status, f)
-                except:
-                    pass
-            
-            try:
-                if os.path.exists("gesture_map.json"):
-                    mtime = os.path.getmtime("gesture_map.json")
-                    if mtime > last_map_update:
-                        load_mapping()
-                        last_map_update = mtime
-                        
-                if os.path.exists("model.pkl"):
-                    mtime = os.path.getmtime("model.pkl")
-                    if mtime > last_model_update:
-                        load_model()
-                        last_model_update = mtime
-            except:
-                pass
-
-        if CAMERA_ON and cap is not None:
-            ret, frame = cap.read()
-            if not ret:
-                print("Error: Failed to read frame from camera.")
-                time.sleep(0.1)
-                continue
-
-            lm = None
-            results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            if results.multi_hand_landmarks:
-                 lm_list = []
-                 for point in results.multi_hand_landmarks[0].landmark:
-                     lm_list.extend([point.x, point.y])
-                 lm = np.array(lm_list)
-
-            if RECORDING and CURRENT_GESTURE:
-                if lm is not None:
-                    mp_draw.draw_landmarks(frame, results.multi_hand_landmarks[0], mp_hands.HAND_CONNECTIONS)
-                    
-                    if not hasattr(start_detector, "rec_start_time"):
-                        start_detector.rec_start_time = time.time()
-                        start_detector.timestamps = []
-                        last_sample_time = 0
-                    
-                    current_time = time.time()
-                    if current_time - last_sample_time >= REC_INTERVAL:
-                        samples.append(lm)
-                        last_sample_time = current_time
-                        start_detector.timestamps.append(current_time)
-                        
-                        cv2.circle(frame, (50, 50), 20, (0, 255, 0), -1) 
-
-                    progress = len(samples) / REC_LIMIT
-                    bar_width = 400
-                    cv2.rectangle(frame, (50, 400), (50 + bar_width, 420), (50, 50, 50), -1)
-                    cv2.rectangle(frame, (50, 400), (50 + int(bar_width * progress), 420), (0, 255, 0), -1)
-
-                    cv2.putText(frame, f"RECORDING: {CURRENT_GESTURE} ({len(samples)}/{REC_LIMIT})", (50,380),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    
-                    if len(samples) >= REC_LIMIT:
-                        path = f"dataset/{CURRENT_GESTURE}"
-                        os.makedirs(path, exist_ok=True)
-                        
-                        sample_id = len([f for f in os.listdir(path) if f.endswith('.npy')])
-                        np.save(f"{path}/sample_{sample_id}.npy", np.array(samples))
-                        
-                        duration = time.time() - start_detector.rec_start_time
-                        meta = {
-                            "gesture": CURRENT_GESTURE,
-                            "frames": len(samples),
-                            "duration_seconds": duration,
-                            "timestamps": start_detector.timestamps,
-                            "created_at": str(datetime.datetime.now())
-                        }
-                        with open(f"{path}/meta_{sample_id}.json", "w") as f:
-                            json.dump(meta, f)
-
-                        print(f"Recording Saved for {CURRENT_GESTURE} (Duration: {duration:.2f}s)")
-                        
-                        RECORDING = False
-                        samples = []
-                        if hasattr(start_detector, "rec_start_time"):
-                            del start_detector.rec_start_time
-                            del start_detector.timestamps
-            
-            elif model is not None and lm is not None:
-                if results.multi_hand_landmarks:
-                    mp_draw.draw_landmarks(frame, results.multi_hand_landmarks[0], mp_hands.HAND_CONNECTIONS)
-                    
-                    wrist_x = results.multi_hand_landmarks[0].landmark[0].x
-                    history_x.append(wrist_x)
-                    
-                    swipe_detected = False
-                    if len(history_x) >= 10 and (time.time() - last_swipe_time > SWIPE_COOLDOWN):
-                        delta = history_x[-1] - history_x[0]
-                        
-                        if delta < -SWIPE_THRESH:
-                            print("Swipe Left -> Next Tab")
-                            perform_action("next_tab")
-                            action_log.append({
-                                "name": "next_tab (Swipe)",
-                                "time": str(datetime.datetime.now().strftime("%H:%M:%S")),
-                                "timestamp": time.time()
-                            })
-                            last_swipe_time = time.time()
-                            history_x.clear()
-                            swipe_detected = True
-                            cv2.putText(frame, "SWIPE LEFT", (200, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 3)
-
-                        elif delta > SWIPE_THRESH:
-                            print("Swipe Right -> Prev Tab")
-                            perform_action("prev_tab")
-                            action_log.append({
-                                "name": "prev_tab (Swipe)",
-                                "time": str(datetime.datetime.now().strftime("%H:%M:%S")),
-                                "timestamp": time.time()
-                            })
-                            last_swipe_time = time.time()
-                            history_x.clear()
-                            swipe_detected = True
-                            cv2.putText(frame, "SWIPE RIGHT", (200, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 3)
-
-                        try:
-                             status = {
-                                "recording": RECORDING,
-                                "current_gesture": "Swipe Left" if delta < 0 else "Swipe Right", 
-                                "confidence": 1.0,
-                                "model_loaded": True,
-                                "camera_on": True,
-                                "control_active": CONTROL_ACTIVE,
-                                "last_update": str(datetime.datetime.now()),
-                                "action_log": list(action_log)
-                            }
-                             with open("status.json", "w") as f:
-                                json.dump(status, f)
-                             last_status_time = time.time()
-                        except:
-                            pass
-
-                    if swipe_detected:
-                         cv2.imshow("CAMERA WINDOW", frame)
-                         if cv2.waitKey(1) == 27: break
-                         continue
+                print(f"ERROR: Could not open any of {', '.join(specs)}.")
+                return
+        preloaded()
+        startup.milestone("ready")
+        print(startup.format())
 
+        while True:
+            # Commands arrive over the IPC channel and are handled right away.
+            cmd = pending or commands.get()
+            pending = None
+            while cmd is not None:
                 try:
-                    gesture = model.predict([lm])[0]
-                    probs = model.predict_proba([lm])[0]
-                    confidence = max(probs)
-                    
-                    if gesture in GESTURE_MAP:
-                        action = GESTURE_MAP.get(gesture)
-                        
-                        display_text = f"Gesture: {gesture} ({confidence:.2f})"
-                        color = (0, 255, 255)
-                        
-                        try:
-                            status = {
-                                "recording": RECORDING,
-                                "current_gesture": gesture if confidence > 0.6 else None, 
-                                "confidence": float(confidence),
-                                "model_loaded": True,
-                                "camera_on": True,
-                                "control_active": CONTROL_ACTIVE,
-                                "last_update": str(datetime.datetime.now()),
-                                "action_log": list(action_log)
-                            }
-
-                            if time.time() - last_status_time > 0.2: 
-                                 with open("status.json", "w") as f:
-                                    json.dump(status, f)
-                                 last_status_time = time.time()
-                        except:
-                            pass
-                        
-                        if CONTROL_ACTIVE and action and not RECORDING and confidence > 0.7:
-                            display_text += f" -> {action}"
-                            color = (0, 255, 0)
-                            perform_action(action)
-                            action_log.append({
-                                "name": action,
-                                "time": str(datetime.datetime.now().strftime("%H:%M:%S")),
-                                "timestamp": time.time()
-                            })
-                        elif not CONTROL_ACTIVE:
-                            display_text += " (Passive)"
-                        
-                        cv2.putText(frame, display_text, (20,50),
-                                    cv2.FONT_HERSHEY_SIMPLEX,1,color,2)
-                    else:
-                        pass
+                    handle_command(cmd)
+                except Exception as e:
+                    print(f"Error handling command {cmd}: {e}")
+                cmd = commands.get()
+            if shutdown:
+                break
+
+            current_time = time.time()
+            if current_time - last_check_time > check_interval:
+                last_check_time = current_time
+                write_health(CAMERA_ON)
+                publish_metrics()
 
+                if not CAMERA_ON:
+                    write_status(camera_on=False, force=True)
+
+                try:
+                    if model_file() != model_stamp:
+                        load_model()
+                        load_templates()
                 except Exception as e:
-                    pass
+                    metrics.ERRORS.labels(site="reload").inc()
+                    logging.warning(f"Reload check failed: {e}")
+
+            if CAMERA_ON and pipeline is not None:
+                if pipeline.finished():
+                    print(f"Source {', '.join(source_names)} finished: {pipeline.stats()}")
+                    CAMERA_ON = False
+                    close_sources()
+                    sources = None
+                    if autostart:
+                        break
+                    continue
+
+                # Drained even when headless; the preview only takes the
+                # newest packet of each source.
+                packet = pipeline.get_output(timeout=0.02)
+                if packet is not None:
+                    preview.submit(packet)
+                if preview.show(window_name) == 27:
+                    break
+            else:
+                # Idle: wait on the command queue instead of sleeping blindly.
+                pending = commands.get(timeout=0.1)
+    finally:
+        close_sources()
+        if session is not None:
+            # Unfinished recordings are not kept.
+            session.abort()
+        commands.close()
+        if executor is not None:
+            executor.stop()
+            executor = None
+        status_block.close()
+        status_block = None
+        metrics_block.close()
+        metrics_block = None
+        health_block.close()
+        health_block = None
+        preview.stop()
+        if preview_block is not None:
+            preview_block.close()
+        if profiler.mode is not None:
+            profiler.stop()
 
-            cv2.imshow("CAMERA WINDOW", frame)
-            if cv2.waitKey(1) == 27:
-                break
-        else:
-            time.sleep(0.1)
 
-    if cap is not None:
-        cap.release()
-    cv2.destroyAllWindows()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gesture detector")
+    parser.add_argument("--source", nargs="+", default=["camera"],
+                        help="camera[:index], video:<file>, images:<folder> or replay:<dataset dir>; "
+                             "several sources run side by side")
+    parser.add_argument("--fast", action="store_true",
+                        help="replay files as fast as possible instead of at recorded speed")
+    parser.add_argument("--autostart", action="store_true",
+                        help="open the source immediately instead of waiting for the dashboard")
+    parser.add_argument("--actions", choices=["pyautogui", "fake"], default=None,
+                        help="action backend; 'fake' only logs actions (default: $GESTURE_ACTION_BACKEND or pyautogui)")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="run hand detection on every full frame (no ROI tracking or frame skipping)")
+    parser.add_argument("--hands", type=int, default=1,
+                        help="hands tracked per source (default 1)")
+    parser.add_argument("--preview", choices=PREVIEW_MODES, default="window",
+                        help="'window' shows an annotated window and serves it to the dashboard, 'stream' only "
+                             "serves it (no display needed), 'none' runs headless without drawing anything")
+    parser.add_argument("--preview-fps", type=float, default=PREVIEW_FPS,
+                        help=f"most frames rendered per second for the preview (default {PREVIEW_FPS})")
+    parser.add_argument("--model-cache", type=int, default=MODEL_CACHE_SIZE,
+                        help=f"warmed-up models of recently used profiles kept in memory (default {MODEL_CACHE_SIZE})")
+    parser.add_argument("--sequential-startup", action="store_true",
+                        help="load the model, mapping and hand tracker before opening the source, "
+                             "one after the other (to compare against the default parallel startup)")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    start_detector()
+    args = parse_args()
+    # A terminated detector (e.g. by the API's supervisor) still cleans up.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    start_detector(args.source, realtime=not args.fast, autostart=args.autostart,
+                   adaptive=not args.no_adaptive, action_backend=args.actions, max_hands=args.hands,
+                   parallel_startup=not args.sequential_startup, preview_mode=args.preview,
+                   preview_fps=args.preview_fps, model_cache_size=args.model_cache)
@@ -0,0 +1,284 @@
+import numpy as np
+from collections import deque
+
+from features import as_points, featurize, WRIST
+from mapping import action_name, gesture_settings, gesture_kind
+from recordings import list_recordings, load_recording
+
+# Motion gestures are matched against recorded templates with SPRING
+# (streaming subsequence DTW): every template keeps one DTW column that is
+# advanced by one stream frame at a time, so a frame costs O(template length)
+# per template and a match may start anywhere in the stream. One stream
+# frame covers at most two template frames, so a template needs at least
+# half its length in stream frames: a single jump of the wrist is never a
+# whole gesture.
+
+SEQ_RATE = 15.0
+# Wrist speeds (frame widths per second) are squashed with tanh(v / V_SCALE),
+# so any fast swipe looks like the template and slow drift does not.
+V_SCALE = 0.5
+POSE_WEIGHT = 0.3
+# Hand pose part of a frame vector: direction (2) + finger joint angles (15).
+POSE_FEATURES = {"version": 1, "normalize": True, "rotate": True, "z": False, "distances": False, "angles": True}
+POSE_DIMS = 17
+# Template frames at the start/end of a recording slower than this are trimmed.
+STILL_SPEED = 0.2
+DEFAULT_MAX_DISTANCE = 0.35
+MIN_TEMPLATE_FRAMES = 3
+# A match must also move the wrist, within twice the template's duration:
+# at least MIN_SWIPE_TRAVEL frame widths for the built-in swipes (the old
+# hard-coded threshold), and TRAVEL_FRACTION of its recording's own net
+# movement for a recorded template.
+MIN_SWIPE_TRAVEL = 0.3
+TRAVEL_FRACTION = 0.5
+# Wrist positions kept to measure that movement.
+HISTORY_SECONDS = 10.0
+
+# Replaces the old hard-coded wrist swipe; a gesture_map entry with the same
+# name overrides these.
+BUILTIN_MOTIONS = {
+    "swipe left": {"action": "next_tab", "type": "motion"},
+    "swipe right": {"action": "prev_tab", "type": "motion"},
+}
+
+
+def frame_vectors(landmarks, timestamps):
+    """Raw landmark rows sampled at `timestamps` -> one vector per frame:
+    squashed wrist velocity (2) followed by the pose features."""
+    points = as_points(landmarks)
+    wrist = points[:, WRIST, :2]
+    dt = np.diff(timestamps, prepend=timestamps[0] - 1.0 / SEQ_RATE)[:, None]
+    velocity = np.diff(wrist, axis=0, prepend=wrist[:1]) / np.maximum(dt, 1e-3)
+    pose = featurize(landmarks, POSE_FEATURES)[:, -POSE_DIMS:] * POSE_WEIGHT
+    return np.hstack([np.tanh(velocity / V_SCALE), pose]).astype(np.float32)
+
+
+def resample(landmarks, timestamps, rate=SEQ_RATE):
+    # Nearest recorded frame at a fixed rate, so templates and the live stream
+    # advance in the same time steps.
+    grid = np.arange(timestamps[0], timestamps[-1] + 1e-9, 1.0 / rate)
+    idx = np.clip(np.searchsorted(timestamps, grid), 0, len(timestamps) - 1)
+    return landmarks[idx], grid
+
+
+def moving_span(vectors):
+    # (first, last + 1) of the frames faster than STILL_SPEED.
+    speed = np.abs(vectors[:, :2]).max(axis=1)
+    moving = np.nonzero(speed > np.tanh(STILL_SPEED / V_SCALE))[0]
+    if len(moving) == 0:
+        return 0, 0
+    return moving[0], moving[-1] + 1
+
+
+def net_travel(landmarks, first, end):
+    # Wrist displacement over frames first..end-1, from the frame before
+    # `first` (each frame's velocity is measured from the one before it).
+    wrist = as_points(landmarks)[:, WRIST, :2]
+    return float(np.linalg.norm(wrist[end - 1] - wrist[max(first - 1, 0)]))
+
+
+class Template:
+    def __init__(self, gesture, vectors, weights=None, max_distance=DEFAULT_MAX_DISTANCE, source=None,
+                 min_travel=0.0):
+        self.gesture = gesture
+        # Recording the template was built from (None for the built-ins).
+        self.source = source
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.weights = np.ones(self.vectors.shape[1], dtype=np.float32) if weights is None else weights
+        self.max_distance = max_distance
+        # Net wrist displacement (frame widths) a match needs, within
+        # `travel_window` seconds of its end.
+        self.min_travel = min_travel
+        self.travel_window = 2.0 * len(self.vectors) / SEQ_RATE
+
+    def __len__(self):
+        return len(self.vectors)
+
+
+def builtin_templates():
+    # Wrist moving sideways faster than the old threshold (0.3 frame widths
+    # within about 10 camera frames); the hand pose is ignored.
+    templates = []
+    for name, direction in (("swipe left", -1.0), ("swipe right", 1.0)):
+        vectors = np.zeros((5, 2 + POSE_DIMS), dtype=np.float32)
+        vectors[:, 0] = np.tanh(direction * 0.9 / V_SCALE)
+        weights = np.zeros(vectors.shape[1], dtype=np.float32)
+        weights[:2] = 1.0
+        templates.append(Template(name, vectors, weights, min_travel=MIN_SWIPE_TRAVEL))
+    return templates
+
+
+def motion_gestures(gesture_map):
+    gestures = dict(BUILTIN_MOTIONS)
+    gestures.update({name: entry for name, entry in (gesture_map or {}).items()
+                     if gesture_kind(entry) == "motion"})
+    return gestures
+
+
+def build_templates(gesture_map, root="dataset"):
+    """One template per recording of every motion gesture in the map, plus
+    the built-in swipes. Without a max_distance setting, a gesture's threshold
+    is calibrated from how well its own recordings match each other."""
+    gestures = motion_gestures(gesture_map)
+    templates = [t for t in builtin_templates() if t.gesture in gestures and t.gesture not in (gesture_map or {})]
+
+    recorded = {}
+    for rec in list_recordings(root, gestures=set(gestures)):
+        try:
+            landmarks, timestamps = load_recording(rec, augmented=False)
+            landmarks, timestamps = resample(landmarks, timestamps)
+            vectors = frame_vectors(landmarks, timestamps)
+            first, end = moving_span(vectors)
+            vectors = vectors[first:end]
+            travel = net_travel(landmarks, first, end) if end > first else 0.0
+        except Exception as e:
+            print(f"Skipping motion template {rec['path']}: {e}")
+            continue
+        if len(vectors) >= MIN_TEMPLATE_FRAMES:
+            recorded.setdefault(rec["gesture"], []).append((rec["path"], vectors, travel))
+
+    for gesture, sources in recorded.items():
+        max_distance = gesture_settings(gestures[gesture]).get("max_distance")
+        if max_distance is None:
+            max_distance = calibrate([vectors for _, vectors, _ in sources])
+        templates.extend(Template(gesture, vectors, max_distance=max_distance, source=path,
+                                  min_travel=TRAVEL_FRACTION * travel)
+                         for path, vectors, travel in sources)
+    return templates
+
+
+def calibrate(sequences):
+    # 1.5x the worst match between two recordings of the same gesture.
+    if len(sequences) < 2:
+        return DEFAULT_MAX_DISTANCE
+    worst = 0.0
+    for i, template in enumerate(sequences):
+        for j, other in enumerate(sequences):
+            if i != j:
+                worst = max(worst, best_match(Template("", template), other))
+    return max(DEFAULT_MAX_DISTANCE, 1.5 * worst)
+
+
+def best_match(template, stream):
+    state = SpringState(template)
+    return min(state.step(vector, float(t))[0] for t, vector in enumerate(stream)) / len(template)
+
+
+class SpringState:
+    """One SPRING DTW column for one template: d[i] is the best cost of
+    aligning template[:i] with a stream subsequence ending now, s[i] the
+    stream time that subsequence started."""
+
+    def __init__(self, template):
+        self.template = template
+        self.reset()
+
+    def reset(self):
+        m = len(self.template)
+        self.d = np.full(m + 1, np.inf)
+        self.d[0] = 0.0
+        self.s = np.zeros(m + 1)
+        self.candidate = None
+
+    def step(self, vector, t):
+        template = self.template
+        cost = np.sqrt((((template.vectors - vector) ** 2) * template.weights).sum(axis=1))
+        d, s = self.d, self.s
+        new_d = np.empty_like(d)
+        new_s = np.empty_like(s)
+        # Row 0 is free at every stream frame, so a match can start anywhere
+        # (with this frame as its first).
+        d[0], s[0] = 0.0, t
+        new_d[0], new_s[0] = 0.0, t
+        for i in range(1, len(d)):
+            # Advance both, stay on this template frame, or advance the
+            # template by two. Never the template alone: that let one stream
+            # frame run through a whole template.
+            best, start = d[i - 1], s[i - 1]
+            if d[i] < best:
+                best, start = d[i], s[i]
+            if i >= 2 and d[i - 2] < best:
+                best, start = d[i - 2], s[i - 2]
+            new_d[i] = cost[i - 1] + best
+            new_s[i] = start
+        self.d, self.s = new_d, new_s
+        return new_d[-1], new_s[-1]
+
+
+class SequenceRecognizer:
+    """Feeds live landmarks to every template and reports finished motion
+    gestures.
+
+    A match is reported once no longer overlapping alignment could still beat
+    it (SPRING's rule) or once the gesture's `latency` budget has passed since
+    the match ended, whichever comes first. After a report the gesture is
+    muted for its `cooldown`. Losing the hand resets every template."""
+
+    def __init__(self, templates=None, gesture_map=None, rate=SEQ_RATE):
+        self.rate = rate
+        self.states = []
+        self.wrists = deque(maxlen=int(HISTORY_SECONDS * rate))
+        self.gesture_map = {}
+        self.last_fired = {}
+        self.set_templates(templates or [], gesture_map)
+
+    def set_templates(self, templates, gesture_map=None):
+        self.gesture_map = motion_gestures(gesture_map)
+        self.states = [SpringState(t) for t in templates]
+        self.reset()
+
+    def reset(self):
+        self.last_t = None
+        self.last_lm = None
+        self.wrists.clear()
+        for state in self.states:
+            state.reset()
+
+    def push(self, lm, t):
+        """Feed one frame (None when no hand). Returns a list of
+        (gesture, distance, start_time, end_time) detections."""
+        if lm is None:
+            if self.last_t is not None:
+                self.reset()
+            return []
+        if not self.states:
+            return []
+        if self.last_t is not None and t - self.last_t < 1.0 / self.rate * 0.9:
+            return []
+
+        self.wrists.append((t, as_points(lm)[WRIST, :2]))
+        if self.last_lm is None:
+            self.last_t, self.last_lm = t, lm
+            return []
+        vector = frame_vectors(np.stack([self.last_lm, lm]), np.array([self.last_t, t]))[1]
+        self.last_t, self.last_lm = t, lm
+
+        detections = []
+        for state in self.states:
+            template = state.template
+            cost, start = state.step(vector, t)
+            limit = template.max_distance * len(template)
+            if cost <= limit and (state.candidate is None or cost < state.candidate[0]) \
+                    and self.travel(t - template.travel_window) >= template.min_travel:
+                state.candidate = (cost, start, t)
+            if state.candidate is None:
+                continue
+
+            best, c_start, c_end = state.candidate
+            settings = gesture_settings(self.gesture_map.get(template.gesture))
+            beaten_impossible = all(d >= best or s > c_end for d, s in zip(state.d[1:], state.s[1:]))
+            if beaten_impossible or t - c_end >= settings["latency"]:
+                state.d[1:][state.s[1:] <= c_end] = np.inf
+                state.candidate = None
+                if t - self.last_fired.get(template.gesture, -1e9) >= settings["cooldown"]:
+                    self.last_fired[template.gesture] = t
+                    detections.append((template.gesture, best / len(template), c_start, c_end))
+        return detections
+
+    def travel(self, since):
+        # Largest net wrist displacement from a frame after `since` to now.
+        now = self.wrists[-1][1]
+        return max(float(np.linalg.norm(now - wrist)) for t, wrist in self.wrists if t >= since)
+
+    def action_for(self, gesture):
+        return action_name(self.gesture_map.get(gesture))
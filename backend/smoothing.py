@@ -0,0 +1,121 @@
+from collections import deque
+import numpy as np
+
+from mapping import action_name, gesture_settings
+
+
+class ProbabilitySmoother:
+    """Smooths per-frame class probabilities, either with an exponential
+    moving average or as a majority vote over the last `window` frames.
+    Frames without a hand count as all-zero, so confidence decays instead
+    of sticking at the last seen value."""
+
+    def __init__(self, n_classes, method="ema", alpha=0.4, window=5):
+        self.n_classes = n_classes
+        self.method = method
+        self.alpha = alpha
+        self.ema = np.zeros(n_classes)
+        self.votes = deque(maxlen=window)
+
+    def reset(self):
+        self.ema[:] = 0
+        self.votes.clear()
+
+    def update(self, probs):
+        if self.method == "vote":
+            self.votes.append(-1 if probs is None else int(np.argmax(probs)))
+            counts = np.zeros(self.n_classes)
+            for vote in self.votes:
+                if vote >= 0:
+                    counts[vote] += 1
+            return counts / self.votes.maxlen
+
+        if probs is None:
+            self.ema *= (1 - self.alpha)
+        else:
+            self.ema += self.alpha * (np.asarray(probs) - self.ema)
+        return self.ema
+
+
+class GestureEngine:
+    """Sits between the classifier and perform_action.
+
+    A gesture becomes active once its smoothed confidence crosses its `enter`
+    threshold and stays active until it drops below `exit`. An active
+    gesture fires its action on entry, then every 1/repeat_rate seconds while
+    held (or never again if repeat_rate is 0), and never twice within its
+    cooldown. Settings come from gesture_map.json via mapping.gesture_settings."""
+
+    def __init__(self, gesture_map=None, method="ema", alpha=0.4, window=5):
+        self.gesture_map = gesture_map or {}
+        self.method = method
+        self.alpha = alpha
+        self.window = window
+        self.classes = None
+        self.smoother = None
+        self.active = None
+        self.last_fired = {}
+        self.next_repeat = 0.0
+
+    def set_mapping(self, gesture_map):
+        self.gesture_map = gesture_map or {}
+
+    def reset(self):
+        self.active = None
+        if self.smoother is not None:
+            self.smoother.reset()
+
+    def update(self, classes, probs, now):
+        """Feed one frame. `probs` is None when no hand was seen. Returns
+        (gesture, confidence, action_to_fire_or_None)."""
+        if classes is None:
+            self.reset()
+            return None, 0.0, None
+
+        if self.classes is None or list(self.classes) != list(classes):
+            # Model was (re)loaded with a different class set.
+            self.classes = list(classes)
+            self.smoother = ProbabilitySmoother(len(self.classes), self.method, self.alpha, self.window)
+            self.active = None
+
+        smoothed = self.smoother.update(probs)
+        best = int(np.argmax(smoothed))
+        best_gesture = self.classes[best]
+        best_conf = float(smoothed[best])
+
+        if self.active is not None:
+            active_idx = self.classes.index(self.active)
+            exit_level = gesture_settings(self.gesture_map.get(self.active))["exit"]
+            if smoothed[active_idx] < exit_level or (best_gesture != self.active and best_conf >= self.enter_level(best_gesture)):
+                self.active = None
+
+        fire = None
+        if self.active is None and best_conf >= self.enter_level(best_gesture):
+            self.active = best_gesture
+            fire = self.try_fire(best_gesture, now, entering=True)
+        elif self.active is not None:
+            fire = self.try_fire(self.active, now, entering=False)
+
+        if self.active is not None:
+            return self.active, float(smoothed[self.classes.index(self.active)]), fire
+        return best_gesture, best_conf, None
+
+    def enter_level(self, gesture):
+        return gesture_settings(self.gesture_map.get(gesture))["enter"]
+
+    def try_fire(self, gesture, now, entering):
+        entry = self.gesture_map.get(gesture)
+        action = action_name(entry)
+        if not action:
+            return None
+        settings = gesture_settings(entry)
+
+        if now - self.last_fired.get(gesture, -1e9) < settings["cooldown"]:
+            return None
+        if not entering and (settings["repeat_rate"] <= 0 or now < self.next_repeat):
+            return None
+
+        self.last_fired[gesture] = now
+        if settings["repeat_rate"] > 0:
+            self.next_repeat = now + max(1.0 / settings["repeat_rate"], settings["cooldown"])
+        return action
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import shlex
+import logging
+import threading
+import subprocess
+
+from metrics import DETECTOR_RESTARTS
+
+# The detector writes a small health record (see run_detector.write_health)
+# from its main loop every half second: its pid, the loop's wall-clock
+# heartbeat, when the camera opened, when the last frame got through the
+# action stage and how far behind real time that frame was. The supervisor
+# restarts the detector when
+#   - the process exits with an error,
+#   - the heartbeat is older than HEARTBEAT_TIMEOUT (the main loop hangs),
+#   - the camera is on but no frame arrived for FRAME_TIMEOUT (a camera
+#     read that never returns), or
+#   - no heartbeat at all arrived within STARTUP_GRACE of spawning it.
+# Restarts back off exponentially, from BACKOFF_START to BACKOFF_MAX; a
+# detector that stayed up for STABLE_AFTER resets the backoff.
+HEARTBEAT_TIMEOUT = 5.0
+FRAME_TIMEOUT = 5.0
+STARTUP_GRACE = 30.0
+BACKOFF_START = 1.0
+BACKOFF_MAX = 30.0
+STABLE_AFTER = 60.0
+CHECK_INTERVAL = 0.5
+STOP_TIMEOUT = 5.0
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def detector_command(args=None):
+    if args is None:
+        args = shlex.split(os.environ.get("GESTURE_DETECTOR_ARGS", ""))
+    return [sys.executable, os.path.join(BACKEND_DIR, "run_detector.py")] + list(args)
+
+
+def liveness(health, now=None):
+    """Ages (seconds) and lag from a health record, as the status reports them."""
+    if health is None:
+        return {"alive": False, "pid": None, "heartbeat_age": None, "frame_age": None, "lag_ms": None,
+                "camera_on": False}
+    now = time.time() if now is None else now
+    heartbeat_age = now - health["heartbeat"]
+    frame_age = None
+    if health.get("camera_on"):
+        frame_age = now - max(health.get("last_frame_at") or 0, health.get("camera_since") or 0)
+    return {
+        "alive": heartbeat_age <= HEARTBEAT_TIMEOUT,
+        "pid": health.get("pid"),
+        "heartbeat_age": round(heartbeat_age, 3),
+        "frame_age": round(frame_age, 3) if frame_age is not None else None,
+        "lag_ms": health.get("lag_ms"),
+        "camera_on": bool(health.get("camera_on")),
+    }
+
+
+class DetectorSupervisor(threading.Thread):
+    """Runs run_detector.py as a child process of the API and keeps it alive.
+
+    `read_health` returns the latest health record (or None), `send` sends
+    an IPC command (used for a clean shutdown) and `on_ready(previous)` is
+    called once a (re)started detector sends its first heartbeat, with the
+    last health record of the one before, so the API can restore the camera
+    and mode. A detector that is already running when the API starts, e.g.
+    one started by hand, is monitored but left alone."""
+
+    def __init__(self, read_health, send, on_ready=None, command=None):
+        super().__init__(name="detector-supervisor", daemon=True)
+        self.read_health = read_health
+        self.send = send
+        self.on_ready = on_ready
+        self.command = command or detector_command()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = True
+        self.proc = None
+        # Every detector spawned here, so a dead one's last heartbeat is not
+        # taken for someone else's detector.
+        self.pids = set()
+        self.state = "starting"
+        self.spawned_at = None
+        self.ready_at = None
+        self.restart_at = time.time()
+        self.backoff = BACKOFF_START
+        self.restarts = 0
+        self.last_exit = None
+        self.health = None
+        self.previous = None
+
+    def run(self):
+        while self.running:
+            try:
+                with self.lock:
+                    self.check()
+            except Exception as e:
+                logging.error(f"Detector supervision failed: {e}")
+            self.wake.wait(CHECK_INTERVAL)
+            self.wake.clear()
+
+    def check(self):
+        now = time.time()
+        health = self.read_health()
+        if self.proc is None:
+            if health is not None and health.get("pid") not in self.pids and liveness(health, now)["alive"]:
+                # Someone else's detector; take over only once it is gone.
+                self.state = "external"
+                self.health = health
+                return
+            if self.state in ("stopped", "stopping") or now < self.restart_at:
+                return
+            self.spawn()
+            return
+
+        code = self.proc.poll()
+        if code is not None:
+            if code == 0:
+                # Closed on purpose (Esc in its window); restarted on request.
+                logging.info("Detector exited")
+                self.proc = None
+                self.state = "stopped"
+                self.last_exit = {"reason": "exited", "code": 0, "at": now}
+            else:
+                self.fail("exit", f"exited with code {code}", code)
+            return
+
+        if health is None or health.get("pid") != self.proc.pid:
+            if now - self.spawned_at > STARTUP_GRACE:
+                self.fail("startup", f"no heartbeat {STARTUP_GRACE:.0f}s after start")
+            return
+
+        self.health = health
+        if self.state == "starting":
+            self.state = "running"
+            self.ready_at = now
+            logging.info(f"Detector running (pid {self.proc.pid}, started in {now - self.spawned_at:.1f}s)")
+            if self.on_ready is not None:
+                try:
+                    self.on_ready(self.previous)
+                except Exception as e:
+                    logging.warning(f"Could not restore detector state: {e}")
+
+        live = liveness(health, now)
+        if live["heartbeat_age"] > HEARTBEAT_TIMEOUT:
+            self.fail("heartbeat", f"no heartbeat for {live['heartbeat_age']:.1f}s")
+        elif live["frame_age"] is not None and live["frame_age"] > FRAME_TIMEOUT:
+            self.fail("stalled", f"no frame for {live['frame_age']:.1f}s")
+        elif self.ready_at is not None and now - self.ready_at > STABLE_AFTER:
+            self.backoff = BACKOFF_START
+
+    def spawn(self):
+        logging.info(f"Starting detector: {' '.join(self.command)}")
+        self.proc = subprocess.Popen(self.command, cwd=BACKEND_DIR)
+        self.pids.add(self.proc.pid)
+        self.state = "starting"
+        self.spawned_at = time.time()
+        self.ready_at = None
+
+    def fail(self, reason, message, code=None):
+        logging.error(f"Detector {message}; restarting in {self.backoff:.0f}s")
+        print(f"Detector {message}; restarting in {self.backoff:.0f}s")
+        DETECTOR_RESTARTS.labels(reason=reason).inc()
+        self.kill()
+        self.previous = self.health
+        self.last_exit = {"reason": reason, "message": message, "code": code, "at": time.time()}
+        self.restarts += 1
+        self.state = "backoff"
+        self.restart_at = time.time() + self.backoff
+        self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+
+    def kill(self):
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                logging.error(f"Detector (pid {self.proc.pid}) did not die")
+        self.proc = None
+
+    def restart(self):
+        """Restarts now, without backoff; also starts a stopped detector."""
+        with self.lock:
+            if self.state == "external":
+                return False
+            self.previous = self.health or self.previous
+            self.shutdown_child()
+            self.last_exit = {"reason": "requested", "code": None, "at": time.time()}
+            self.restarts += 1
+            DETECTOR_RESTARTS.labels(reason="requested").inc()
+            self.state = "backoff"
+            self.restart_at = time.time()
+            self.backoff = BACKOFF_START
+        self.wake.set()
+        return True
+
+    def shutdown_child(self):
+        # Asked to stop first, so it releases the camera and shared memory.
+        if self.proc is None:
+            return
+        try:
+            self.send({"action": "shutdown"})
+            self.proc.wait(timeout=STOP_TIMEOUT)
+        except Exception:
+            pass
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                pass
+        self.kill()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.state = "stopping"
+            self.shutdown_child()
+            self.state = "stopped"
+        self.wake.set()
+
+    def describe(self):
+        # No lock: a restart may hold it for seconds, and /status must not wait.
+        now = time.time()
+        state, proc = self.state, self.proc
+        health = self.health if state in ("running", "external") else None
+        return dict(liveness(health, now), **{
+            "managed": True,
+            "state": state,
+            "pid": proc.pid if proc is not None else (health or {}).get("pid"),
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+            "uptime": round(now - self.spawned_at, 1) if proc is not None else None,
+            "restart_in": round(max(0.0, self.restart_at - now), 1) if state == "backoff" else None,
+        })
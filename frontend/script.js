@@ -3,10 +3,13 @@ const API_URL = "http://127.0.0.1:8000";
 let lastAction = null;
 let activityLog = [];
 let isToggling = false;
+let currentStatus = {};
+let statusSocket = null;
+let pollingTimer = null;
 
 document.addEventListener("DOMContentLoaded", () => {
     fetchGestures();
-    startStatusPolling();
+    startStatusStream();
 });
 
 async function fetchGestures() {
@@ -26,7 +29,8 @@ async function fetchGestures() {
             return;
         }
 
-        for (const [name, action] of Object.entries(data)) {
+        for (const [name, entry] of Object.entries(data)) {
+            const action = typeof entry === "object" && entry !== null ? entry.action : entry;
             const item = document.createElement("div");
             item.className = "gesture-item neon-border-hover";
             item.innerHTML = `
@@ -42,6 +46,10 @@ async function fetchGestures() {
     }
 }
 
+function gestureType() {
+    return document.getElementById("gmotion").checked ? "motion" : "pose";
+}
+
 async function startRecording() {
     const name = document.getElementById("gname").value;
     const btn = document.querySelector("#addGestureModal button[onclick='startRecording()']");
@@ -59,7 +67,7 @@ async function startRecording() {
         const response = await fetch(`${API_URL}/start_recording`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ name: name })
+            body: JSON.stringify({ name: name, type: gestureType() })
         });
 
         if (response.ok) {
@@ -91,7 +99,7 @@ async function saveGestureMappings() {
         const response = await fetch(`${API_URL}/save_gesture`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ name: name, action: action })
+            body: JSON.stringify({ name: name, action: action, type: gestureType() })
         });
 
         if (response.ok) {
@@ -103,6 +111,7 @@ async function saveGestureMappings() {
             modal.hide();
 
             document.getElementById("gname").value = "";
+            document.getElementById("gmotion").checked = false;
         } else {
             showToast("Failed to save gesture.", "error");
         }
@@ -131,16 +140,37 @@ async function retrainModel() {
     showToast("Starting training...", "info");
     try {
         const res = await fetch(`${API_URL}/retrain`, { method: "POST" });
-        if (res.ok) {
-            showToast("Training complete!", "success");
-        } else {
+        if (!res.ok) {
             showToast("Training failed.", "error");
+            return;
         }
+        const data = await res.json();
+        watchTrainingJob(data.job.id);
     } catch (e) {
         showToast("Error connecting to backend.", "error");
     }
 }
 
+function watchTrainingJob(jobId) {
+    const timer = setInterval(async () => {
+        try {
+            const res = await fetch(`${API_URL}/retrain/jobs/${jobId}`);
+            const job = await res.json();
+            if (job.state === "done") {
+                clearInterval(timer);
+                const version = job.result ? ` (model v${job.result.version})` : "";
+                showToast(`Training complete!${version}`, "success");
+            } else if (job.state === "failed" || job.state === "cancelled") {
+                clearInterval(timer);
+                showToast(`Training ${job.state}.`, "error");
+            }
+        } catch (e) {
+            clearInterval(timer);
+            showToast("Lost contact with training job.", "error");
+        }
+    }, 1000);
+}
+
 async function toggleSystem() {
     const btn = document.getElementById("powerBtn");
     const isRunning = btn.classList.contains("active");
@@ -199,8 +229,49 @@ function updateControlUI(active) {
     }
 }
 
+function startStatusStream() {
+    if (!("WebSocket" in window)) {
+        startStatusPolling();
+        return;
+    }
+
+    statusSocket = new WebSocket(`${API_URL.replace(/^http/, "ws")}/ws/status`);
+
+    statusSocket.onopen = () => {
+        stopStatusPolling();
+    };
+
+    statusSocket.onmessage = (event) => {
+        const msg = JSON.parse(event.data);
+        if (msg.type === "snapshot") {
+            currentStatus = msg.status;
+        } else if (msg.type === "delta") {
+            Object.assign(currentStatus, msg.changes);
+            (msg.removed || []).forEach(key => delete currentStatus[key]);
+        }
+        updateDashboard(currentStatus);
+        updateSystemStatus(true, currentStatus.camera_on);
+    };
+
+    statusSocket.onclose = () => {
+        statusSocket = null;
+        updateSystemStatus(false, false);
+        // Fall back to polling until the stream can be reopened.
+        startStatusPolling();
+        setTimeout(startStatusStream, 3000);
+    };
+}
+
+function stopStatusPolling() {
+    if (pollingTimer) {
+        clearInterval(pollingTimer);
+        pollingTimer = null;
+    }
+}
+
 function startStatusPolling() {
-    setInterval(async () => {
+    if (pollingTimer) return;
+    pollingTimer = setInterval(async () => {
         try {
             const res = await fetch(`${API_URL}/status`);
             if (res.ok) {
@@ -296,6 +367,8 @@ function updateDashboard(status) {
         recEl.style.color = "var(--text-primary)";
     }
 
+    updatePreview(status.camera_on && status.preview && status.preview !== "none");
+
     if (status.action_log && Array.isArray(status.action_log)) {
         updateActivityLog(status.action_log);
     }
@@ -309,6 +382,19 @@ function updateDashboard(status) {
     }
 }
 
+function updatePreview(show) {
+    // The MJPEG stream stays open only while it is shown.
+    const row = document.getElementById("previewRow");
+    const img = document.getElementById("previewImage");
+    if (show && !img.getAttribute("src")) {
+        img.src = `${API_URL}/preview.mjpg`;
+        row.style.display = "";
+    } else if (!show && img.getAttribute("src")) {
+        img.removeAttribute("src");
+        row.style.display = "none";
+    }
+}
+
 function updateActivityLog(logs) {
     const logEl = document.getElementById("activityLog");
 